@@ -2,22 +2,25 @@
 
 from __future__ import absolute_import
 
-# TODO: look at multi-threading to speed up translation (probably can't do that with text file)
-
 import argparse
+import glob
 import logging
 import pprint
 import os
+import re
 import sys
-from google.cloud.translate import Client
+import time
 
 # sys.path extension is to support running module under Terminal
 module_path = os.path.realpath(__file__).rsplit('/', 2)[0]
 sys.path.extend([module_path])
 
-from translate.translate_base import (
-    CREDS, GoogleTranslate, TranslateDocx, TranslateExcel, TranslateHtml, TranslatePptx, TranslateText
-)
+from translate.translate_base import CREDS, MAX_THREADS, GoogleTranslate, TranslateBatch, make_client
+from translate.estimate import CostEstimate
+from translate.formats import STREAMING, TRANSLATOR, file_translators
+from translate.metrics import Metrics
+from translate.rate_limit import RETRIES, RateLimiter
+from translate.translation_memory import MEMORY_EXTENSIONS, TranslationMemory, is_memory_file, language_history
 
 if not sys.warnoptions:
     import warnings
@@ -27,8 +30,8 @@ pp = pprint.PrettyPrinter(indent=4)
 
 
 class ListLanguages(object):
-    def __init__(self):
-        self.client = Client.from_service_account_json(CREDS)
+    def __init__(self, endpoint=None):
+        self.client = make_client(CREDS, endpoint)
         self.print_response(self.request_languages())
 
     def request_languages(self):
@@ -47,74 +50,271 @@ def parse_args(args, info):
                     'API.  Formats supported: %s.' % info,
         epilog='Requires credentials for Google Cloud to be saved.'
     )
-    parser.add_argument('file', help='file to be translated')
-    parser.add_argument('target_lang', help='target language per ISO 639-1')
+    parser.add_argument('file', help='file to be translated, or a directory or quoted glob pattern for a batch')
+    parser.add_argument('target_lang', help='target language per ISO 639-1 (comma-separated for several)')
     # parser.add_argument('-a', '--auth', dest='creds', help='Google Cloud API credentials file')
+    parser.add_argument('--chars_per_minute', type=int,
+                        help='keep the characters sent to the cloud within a quota of N per minute')
+    parser.add_argument('--budget', type=int,
+                        help='estimate the characters to be billed first, and refuse the job if they are over N')
     parser.add_argument('-c', '--condense', dest='condense', default=False, action='store_true',
                         help='condense runs in paragraph')
     parser.add_argument('-d', '--dest', dest='target', help='translation output filename')
+    parser.add_argument('--endpoint',
+                        help='URL of the translation API, such as a translate.fake_server for load tests')
+    parser.add_argument('--import', dest='import_history',
+                        help='JSON history file to import into the translation memory given with -r (for several '
+                             'languages, the file of each, e.g. history_fr.json for history.json)')
     # TODO: prefer to make -l behave like -h so it does not require the positional arguments
     parser.add_argument('-l', '--list_langs', default=False, action='store_true',
                         help='print list of all available languages')
-    # parser.add_argument('-m', '--threads', dest='threads', type=int, default='1',
-    #                     help='use N threads to access cloud')
+    parser.add_argument('-m', '--threads', dest='threads', type=int, default='1',
+                        help='use N threads to access cloud (at most %d)' % MAX_THREADS)
     parser.add_argument('-n', '--preview', dest='online', default=True, action='store_false',
-                        help='offline preview mode')
+                        help='offline preview mode, with an estimate of the cost and time for each file')
+    parser.add_argument('--normalize', default=False, action='store_true',
+                        help='replace numbers, dates, URLs and e-mail addresses with placeholders while translating')
+    parser.add_argument('--previous',
+                        help='previous version of the file: its translation (e.g. my_document_v1_fr.docx) is kept '
+                             'for the segments that have not changed')
     parser.add_argument('-p', '--progress', dest='show', type=int, default='0', help='show N chars of each string')
     parser.add_argument('-q', '--quiet', action='count', default=0, help='decrease logging level')
-    parser.add_argument('-r', '--reuse', dest='history', help='filename (for reuse of translation strings)')
+    parser.add_argument('--report',
+                        help='write a JSON report of the time in each phase, request latencies and bytes written')
+    parser.add_argument('-r', '--reuse', dest='history',
+                        help='filename (for reuse of translation strings): JSON, or .db for a translation memory')
+    parser.add_argument('--requests_per_second', type=float,
+                        help='keep the requests sent to the cloud within a quota of N per second')
+    parser.add_argument('--retries', type=int,
+                        help='retry a request refused for its rate, or failed by the server, N times (default %d)' % (
+                            RETRIES))
+    parser.add_argument('--stream', default=False, action='store_true',
+                        help='translate .html, .txt and .xlsx files as they are read, with bounded memory')
+    parser.add_argument('--server',
+                        help='send the job to a daemon started with "translate serve", at its URL or socket path')
     parser.add_argument('-s', '--source', dest='source_lang', help='source language per ISO 639-1')
     parser.add_argument('-v', '--verbose', action='count', default=0, help='increase logging level')
+    parser.add_argument('-w', '--workers', dest='processes', type=int, default='1',
+                        help='load and save a batch of files in N processes, overlapped with translation')
+    parser.add_argument('--xml', default=False, action='store_true',
+                        help='translate the text inside .docx and .xlsx files directly, leaving the rest unchanged')
     parser.add_argument('-x', '--xcheck', dest='cross_check', default=False, action='store_true',
                         help='translate back again for checking')
     return parser.parse_args(args)
 
 
 def main(arg_list=None):
-    TRANSLATOR = {
-        'docx': TranslateDocx,
-        'html': TranslateHtml,
-        'pptx': TranslatePptx,
-        'txt': TranslateText,
-        'xlsx': TranslateExcel,
-    }
+    arg_list = sys.argv[1:] if arg_list is None else arg_list
+    if arg_list[:1] == ['serve']:
+        from translate.server import main as serve
+        return serve(arg_list[1:])
 
+    start = time.perf_counter()
     logging.basicConfig(level=logging.WARNING)
     log = logging.getLogger(__name__)
     args = parse_args(arg_list, ', '.join(sorted(TRANSLATOR.keys())))
+    translators = file_translators(args.stream, args.xml)
+    batch = None
     if os.path.isfile(os.path.realpath(args.file)):
         args.filepath, args.filename = os.path.split(os.path.realpath(args.file))
     else:
-        # TODO: handle error better
-        warnings.warn("Not a valid path to a file '%s'" % args.file)
-        return "invalid file"
+        batch = find_files(args.file, translators, args.target_lang.split(',') + [args.source_lang])
+        if not batch:
+            # TODO: handle error better
+            warnings.warn("Not a valid path to a file '%s'" % args.file)
+            return "invalid file"
 
     log.setLevel(max(1, logging.WARNING + (args.quiet - args.verbose) * 10))
 
+    if args.previous and (batch or not os.path.isfile(args.previous)):
+        warnings.warn("--previous must be the previous version of a single file, not '%s'" % args.previous)
+        return "invalid previous"
+
     # placeholder for creds changes
 
-    if args.list_langs:
-        ListLanguages()
+    if args.server:
+        # the translators belong to the daemon, and it runs each file as a job of its own
+        local = [option for (option, given) in [
+            ('-l', args.list_langs), ('-n', not args.online), ('-r', args.history), ('--previous', args.previous),
+            ('--budget', args.budget is not None), ('--import', args.import_history), ('--report', args.report),
+            ('-m', args.threads != 1), ('-w', args.processes != 1), ('-p', args.show), ('--normalize', args.normalize),
+            ('--retries', args.retries is not None), ('--endpoint', args.endpoint),
+            ('--chars_per_minute', args.chars_per_minute), ('--requests_per_second', args.requests_per_second),
+            ('-d with a batch', batch and args.target),
+        ] if given]
+        if local:
+            warnings.warn('%s cannot be sent to a daemon: give the translator options to "translate serve", '
+                          'or translate without --server' % ', '.join(local))
+            return "invalid server job"
+        return send_jobs(args, batch or [(args.filepath, args.filename)])
+
+    elif args.list_langs:
+        ListLanguages(args.endpoint)
 
     else:
-        # placeholder for multi-threading - need to limit value of threads
+        if args.import_history:
+            if not is_memory_file(args.history):
+                warnings.warn("--import needs a translation memory (%s) to be given with -r" % (
+                    ', '.join(MEMORY_EXTENSIONS)
+                ))
+                return "invalid history"
+            # a JSON history holds one language pair, so several languages are imported from one file each, named
+            # as a run into those languages saves them with -r (e.g. history_fr.json and history_ja.json)
+            target_langs = args.target_lang.split(',')
+            imports = [(lang, language_history(args.import_history, lang) if len(target_langs) > 1
+                        else args.import_history) for lang in target_langs]
+            missing = [json_file for (_, json_file) in imports if not os.path.isfile(json_file)]
+            if missing:
+                warnings.warn("No JSON history to import: '%s'" % "', '".join(missing))
+                return "invalid history"
+            for lang, json_file in imports:
+                memory = TranslationMemory(args.history, args.source_lang, lang)
+                print('imported %d segments into %s (%s-%s)' % (
+                    memory.import_json(json_file), args.history, args.source_lang, lang
+                ))
+                memory.close()
 
         bf_kwargs = {key: value for (key, value) in vars(args).items()
-                     if key in ['source_lang', 'online', 'history', 'show']}
-        babelfish = GoogleTranslate(CREDS, args.target_lang, **bf_kwargs)
+                     if key in ['source_lang', 'online', 'history', 'show', 'threads']}
+        for option in ('retries', 'endpoint'):
+            if getattr(args, option) is not None:
+                bf_kwargs[option] = getattr(args, option)
+        if args.normalize:
+            bf_kwargs['normalize'] = True
+        if args.report:
+            # one set of metrics for the whole job, whatever the number of languages
+            bf_kwargs['metrics'] = Metrics()
+        if args.chars_per_minute or args.requests_per_second:
+            # the quota belongs to the project, so every target language shares one limiter
+            bf_kwargs['limiter'] = RateLimiter(args.chars_per_minute, args.requests_per_second)
+        babelfish = make_translators(args.target_lang, args.history, bf_kwargs)
 
         ft_kwargs = {key: value for (key, value) in vars(args).items()
                      if key in ['condense', 'cross_check']}
 
-        file_format = args.filename.rsplit('.', 1)[1]
-        file_translator = TRANSLATOR[file_format]
-        file_translator(args.filepath, args.filename, babelfish, **ft_kwargs)
+        if not args.online or args.budget is not None:
+            # a preview of each file in turn, so that the estimate is broken down by file
+            estimate = CostEstimate(budget=args.budget)
+            preview = babelfish if not args.online else make_translators(
+                args.target_lang, args.history, dict(bf_kwargs, online=False)
+            )
+            for translator in (preview if isinstance(preview, list) else [preview]):
+                translator.estimate = estimate
+            for (filepath, filename) in batch or [(args.filepath, args.filename)]:
+                document = translators[filename.rsplit('.', 1)[1]](filepath, filename, preview, defer=True,
+                                                                   **ft_kwargs)
+                if args.previous:
+                    # only the segments that have changed are counted
+                    document.revise(os.path.realpath(args.previous))
+                if args.budget is None:
+                    # a plain preview writes its dummy translations, to check the output
+                    document.execute(document.translate)
+                else:
+                    # nothing is written before the job is known to be within budget
+                    document.estimate_cost()
+            print(estimate.report())
+            if estimate.over_budget():
+                warnings.warn('%d characters would be billed, over the budget of %d: the job was refused' % (
+                    estimate.characters, args.budget
+                ))
+                return "over budget"
+
+        if not args.online:
+            if batch and args.budget is None:
+                print('translated %d files:' % len(batch))
+                for (filepath, filename) in batch:
+                    print('    %s' % os.path.join(filepath, filename))
+        elif batch and args.processes > 1:
+            from translate.translate_pipeline import TranslatePipeline
+            files = [(translators[filename.rsplit('.', 1)[1]], filepath, filename) for (filepath, filename) in batch]
+            pipeline = TranslatePipeline(files, babelfish, processes=args.processes, **ft_kwargs)
+            pipeline.execute()
+            print('translated %d files:' % len(pipeline.targets))
+            for job_id in sorted(pipeline.targets):
+                print('    %s' % os.path.join(*batch[job_id]))
+        elif batch:
+            documents = [translators[filename.rsplit('.', 1)[1]](filepath, filename, babelfish, defer=True, **ft_kwargs)
+                         for (filepath, filename) in batch]
+            # streamed files are never held in memory together, so they are translated one after another
+            streamed = [document for document in documents if type(document) in STREAMING.values()]
+            for document in streamed:
+                document.execute(document.translate)
+            TranslateBatch([document for document in documents if document not in streamed], babelfish).execute()
+            print('translated %d files:' % len(documents))
+            for (filepath, filename) in batch:
+                print('    %s' % os.path.join(filepath, filename))
+        else:
+            file_format = args.filename.rsplit('.', 1)[1]
+            file_translator = translators[file_format]
+            if args.previous:
+                document = file_translator(args.filepath, args.filename, babelfish, defer=True, **ft_kwargs)
+                document.revise(os.path.realpath(args.previous))
+                document.execute(document.translate)
+                for revision in document.revisions.values():
+                    print(revision.report())
+            else:
+                file_translator(args.filepath, args.filename, babelfish, **ft_kwargs)
+
+        for translator in (babelfish if isinstance(babelfish, list) else [babelfish]):
+            if hasattr(translator, 'stats'):
+                for lang_pair in translator.stats:
+                    print('statistics for %s translation session', lang_pair)
+                    for stat in translator.stats[lang_pair]:
+                        print('    %s: %s' % (stat, translator.stats[lang_pair][stat]))
+
+        if args.report:
+            metrics = bf_kwargs['metrics']
+            log.info(metrics.report())
+            stats = {lang_pair: dict(translator_stats)
+                     for translator in (babelfish if isinstance(babelfish, list) else [babelfish])
+                     for (lang_pair, translator_stats) in getattr(translator, 'stats', {}).items()}
+            metrics.save(args.report, seconds=time.perf_counter() - start, stats=stats)
+
+
+def send_jobs(args, files):
+    """ Have a translation daemon translate the files, one job after another. """
+    from translate.server import request
+    job = {key: value for (key, value) in vars(args).items()
+           if key in ['target_lang', 'source_lang', 'target', 'condense', 'cross_check', 'stream', 'xml']}
+    print('translated %d files:' % len(files) if len(files) > 1 else 'translated:')
+    for (filepath, filename) in files:
+        status, response = request(args.server, '/document', dict(job, file=os.path.join(filepath, filename)))
+        if status != 200:
+            warnings.warn('Unable to translate %s: %s' % (filename, response.get('error')))
+            return 'failed'
+        for target in response['targets']:
+            print('    %s' % target)
+
+
+def make_translators(target_lang, history, bf_kwargs):
+    """ A translator for the target language, or a list of them for comma-separated languages. """
+    target_langs = target_lang.split(',')
+    if len(target_langs) == 1:
+        return GoogleTranslate(CREDS, target_lang, **bf_kwargs)
+    return [GoogleTranslate(CREDS, lang, **dict(bf_kwargs, history=language_history(history, lang)))
+            for lang in target_langs]
+
+
+def find_files(pattern, extensions, langs):
+    """ List the files in a directory, or matching a glob pattern, that have an extension that can be translated. """
+    if os.path.isdir(pattern):
+        paths = [os.path.join(pattern, name) for name in sorted(os.listdir(pattern))]
+    else:
+        paths = sorted(glob.glob(pattern, recursive=True))
 
-        if hasattr(babelfish, 'stats'):
-            for lang_pair in babelfish.stats:
-                print('statistics for %s translation session', lang_pair)
-                for stat in babelfish.stats[lang_pair]:
-                    print('    %s: %s' % (stat, babelfish.stats[lang_pair][stat]))
+    files = []
+    for path in paths:
+        filepath, filename = os.path.split(os.path.realpath(path))
+        body, _, extn = filename.rpartition('.')
+        # skip the output of earlier runs, such as my_document_fr.docx, into these or any other languages
+        source, _, suffix = body.rpartition('_')
+        earlier_output = any(body.endswith('_%s' % lang) for lang in langs if lang) or bool(
+            source and re.match(r'[a-z]{2,3}(-[A-Za-z]{2,4})?$', suffix)
+            and os.path.isfile(os.path.join(filepath, '%s.%s' % (source, extn)))
+        )
+        if os.path.isfile(path) and extn in extensions and not earlier_output:
+            files.append((filepath, filename))
+    return files
 
 
 def init():
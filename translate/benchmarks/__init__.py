@@ -0,0 +1,6 @@
+"""
+Benchmarks of the Translate* classes on synthetic documents of growing size.
+
+    $ python -m translate.benchmarks --scales 100,1000 --memory --output results.json
+    $ python -m translate.benchmarks --scales 100,1000 --compare results.json
+"""
@@ -0,0 +1,63 @@
+#!/usr/bin/env python
+import argparse
+import json
+import os
+import sys
+import tempfile
+
+from translate.benchmarks import suite
+
+
+def parse_args(args):
+    parser = argparse.ArgumentParser(
+        prog='translate.benchmarks',
+        description='Time each phase of the Translate* classes on generated documents of growing size.',
+    )
+    parser.add_argument('--formats', help='comma-separated formats to run (default: %s)' % ','.join(suite.CLASSES))
+    parser.add_argument('--classes', help='comma-separated classes to run (default: all for each format)')
+    parser.add_argument('--scales', default=','.join(str(scale) for scale in suite.SCALES),
+                        help='comma-separated sizes: paragraphs, rows or lines (default: %(default)s)')
+    parser.add_argument('--backend', choices=['offline', 'fake'], default='offline',
+                        help='translate offline, or send the requests to a local fake server')
+    parser.add_argument('--latency', default='constant:0', help='latency of the fake server, e.g. lognormal:0.3,0.5')
+    parser.add_argument('-m', '--threads', type=int, default=1, help='threads for the requests to the fake server')
+    parser.add_argument('--repeat', type=int, default=3, help='runs of each case, of which the fastest is kept')
+    parser.add_argument('--memory', default=False, action='store_true',
+                        help='measure the peak memory of each phase in one more run, with tracemalloc')
+    parser.add_argument('--workdir', help='directory for the generated documents (default: a temporary one)')
+    parser.add_argument('-o', '--output', help='save the results as JSON')
+    parser.add_argument('--compare', help='JSON results of an earlier run, to report phases that are now slower')
+    parser.add_argument('--threshold', type=float, default=suite.THRESHOLD,
+                        help='report phases this many times slower than in --compare (default: %(default)s)')
+    return parser.parse_args(args)
+
+
+def main(arg_list=None):
+    args = parse_args(arg_list)
+    settings = dict(
+        formats=args.formats.split(',') if args.formats else None,
+        classes=args.classes.split(',') if args.classes else None,
+        scales=[int(scale) for scale in args.scales.split(',')],
+        backend=args.backend, latency=args.latency, threads=args.threads, repeat=args.repeat, memory=args.memory,
+    )
+    if args.workdir:
+        os.makedirs(args.workdir, exist_ok=True)
+        results = suite.run_suite(args.workdir, **settings)
+    else:
+        with tempfile.TemporaryDirectory() as workdir:
+            results = suite.run_suite(workdir, **settings)
+    suite.report(results)
+    if args.output:
+        suite.save(results, args.output)
+
+    if args.compare:
+        with open(args.compare) as f:
+            regressions = suite.compare(json.load(f), results, args.threshold)
+        for (class_name, scale, phase), before, after in regressions:
+            print('slower: %s at scale %d, %s: %.4fs -> %.4fs' % (class_name, scale, phase, before, after))
+        return 1 if regressions else 0
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,169 @@
+# coding: UTF-8
+"""
+Synthetic documents of a given scale, for the benchmarks.
+
+The text is drawn from a small vocabulary with a fixed seed, so the same scale always gives the same document,
+and some sentences repeat (as headings, labels and boilerplate do in real documents) to exercise the dictionary.
+"""
+import html
+import os
+import random
+import zipfile
+
+import lxml.etree
+from docx import Document
+from openpyxl import Workbook
+from pptx import Presentation
+from pptx.util import Inches
+
+WORDS = (
+    'the report shows that quarterly revenue grew in every region while costs fell as the new process was '
+    'adopted by each team and the board agreed to review the plan again next year with our partners'
+).split()
+REPEATED = 0.2  # fraction of sentences taken from a short list of common ones
+SPREADSHEETML = 'http://schemas.openxmlformats.org/spreadsheetml/2006/main'
+RELATIONSHIPS = 'http://schemas.openxmlformats.org/package/2006/relationships'
+SHARED_STRINGS = 'http://schemas.openxmlformats.org/officeDocument/2006/relationships/sharedStrings'
+
+
+class TextSource(object):
+    """ Sentences of a few words each, a fraction of them repeated. """
+    def __init__(self, seed=0):
+        self.random = random.Random(seed)
+        self.common = [self.new_sentence() for _ in range(20)]
+
+    def new_sentence(self, words=None):
+        words = words or self.random.randint(4, 12)
+        return ' '.join(self.random.choice(WORDS) for _ in range(words)).capitalize() + '.'
+
+    def sentence(self, words=None):
+        if self.random.random() < REPEATED:
+            return self.random.choice(self.common)
+        return self.new_sentence(words)
+
+
+def generate_docx(path, scale, runs=4, columns=4, seed=0):
+    """ `scale` paragraphs of `runs` runs each (alternately bold, so they are not condensed), and a table. """
+    text = TextSource(seed)
+    document = Document()
+    for i in range(scale):
+        paragraph = document.add_paragraph()
+        for j in range(runs):
+            paragraph.add_run(text.sentence(4) + ' ').bold = bool(j % 2)
+        if i % 50 == 0:
+            document.add_heading(text.sentence(3), level=2)
+    rows = max(1, scale // 10)
+    table = document.add_table(rows=rows, cols=columns)
+    for row in table.rows:
+        for cell in row.cells:
+            cell.text = text.sentence(3)
+    document.save(path)
+
+
+def generate_pptx(path, scale, shapes=3, paragraphs=3, runs=2, seed=0):
+    """ max(1, scale // 10) slides of `shapes` text boxes, each of `paragraphs` paragraphs of `runs` runs. """
+    text = TextSource(seed)
+    presentation = Presentation()
+    layout = presentation.slide_layouts[6]  # blank
+    for _ in range(max(1, scale // 10)):
+        slide = presentation.slides.add_slide(layout)
+        for k in range(shapes):
+            frame = slide.shapes.add_textbox(Inches(0.5), Inches(0.5 + 2 * k), Inches(9), Inches(1.5)).text_frame
+            for p in range(paragraphs):
+                paragraph = frame.paragraphs[0] if p == 0 else frame.add_paragraph()
+                for j in range(runs):
+                    run = paragraph.add_run()
+                    run.text = text.sentence(4) + ' '
+                    run.font.bold = bool(j % 2)
+    presentation.save(path)
+
+
+def generate_xlsx(path, scale, columns=5, seed=0):
+    """ `scale` rows of `columns` cells, with a number in every other row. """
+    text = TextSource(seed)
+    workbook = Workbook(write_only=True)
+    sheet = workbook.create_sheet('Data')
+    sheet.append(['Heading %d' % c for c in range(columns)])
+    for r in range(scale):
+        sheet.append([text.sentence(3) for _ in range(columns - 1)] + [r if r % 2 else text.sentence(2)])
+    workbook.save(path)
+    share_strings(path)
+
+
+def share_strings(path):
+    """ Move the strings that openpyxl writes inline in the worksheets to a shared strings part, as Excel does. """
+    with zipfile.ZipFile(path) as archive:
+        members = [(info, archive.read(info)) for info in archive.infolist()]
+    index = {}
+    for i, (info, data) in enumerate(members):
+        if info.filename.startswith('xl/worksheets/') and info.filename.endswith('.xml'):
+            worksheet = lxml.etree.fromstring(data)
+            for cell in worksheet.iter('{%s}c' % SPREADSHEETML):
+                if cell.get('t') == 'inlineStr':
+                    inline = cell.find('{%s}is' % SPREADSHEETML)
+                    value = index.setdefault(''.join(inline.itertext()), len(index))
+                    cell.remove(inline)
+                    cell.set('t', 's')
+                    lxml.etree.SubElement(cell, '{%s}v' % SPREADSHEETML).text = str(value)
+            members[i] = (info, lxml.etree.tostring(worksheet, xml_declaration=True, encoding='UTF-8'))
+        elif info.filename == 'xl/_rels/workbook.xml.rels':
+            rels = lxml.etree.fromstring(data)
+            lxml.etree.SubElement(rels, '{%s}Relationship' % RELATIONSHIPS,
+                                  Id='rIdSharedStrings', Type=SHARED_STRINGS, Target='sharedStrings.xml')
+            members[i] = (info, lxml.etree.tostring(rels, xml_declaration=True, encoding='UTF-8'))
+        elif info.filename == '[Content_Types].xml':
+            types = lxml.etree.fromstring(data)
+            lxml.etree.SubElement(types, '{%s}Override' % types.nsmap[None], PartName='/xl/sharedStrings.xml',
+                                  ContentType='application/vnd.openxmlformats-officedocument.spreadsheetml.'
+                                              'sharedStrings+xml')
+            members[i] = (info, lxml.etree.tostring(types, xml_declaration=True, encoding='UTF-8'))
+
+    strings = lxml.etree.Element('{%s}sst' % SPREADSHEETML, nsmap={None: SPREADSHEETML},
+                                 count=str(len(index)), uniqueCount=str(len(index)))
+    for string in index:
+        lxml.etree.SubElement(lxml.etree.SubElement(strings, '{%s}si' % SPREADSHEETML),
+                              '{%s}t' % SPREADSHEETML).text = string
+    with zipfile.ZipFile(path, 'w', zipfile.ZIP_DEFLATED) as archive:
+        for info, data in members:
+            archive.writestr(info, data)
+        archive.writestr('xl/sharedStrings.xml',
+                         lxml.etree.tostring(strings, xml_declaration=True, encoding='UTF-8'))
+
+
+def generate_html(path, scale, seed=0):
+    """ `scale` paragraphs with inline markup, under a heading every 20 paragraphs. """
+    text = TextSource(seed)
+    lines = ['<!DOCTYPE html>', '<html>', '<head><meta charset="utf-8"><title>Benchmark</title></head>', '<body>']
+    for i in range(scale):
+        if i % 20 == 0:
+            lines.append('<h2>%s</h2>' % html.escape(text.sentence(3)))
+        lines.append('<p>%s <b>%s</b> %s</p>' % tuple(html.escape(text.sentence()) for _ in range(3)))
+    lines.extend(['</body>', '</html>'])
+    with open(path, 'w', encoding='utf-8') as f:
+        f.write('\n'.join(lines) + '\n')
+
+
+def generate_txt(path, scale, seed=0):
+    """ `scale` lines, with a blank line after every tenth. """
+    text = TextSource(seed)
+    with open(path, 'w', encoding='utf-8') as f:
+        for i in range(scale):
+            f.write(text.sentence() + ('\n\n' if i % 10 == 9 else '\n'))
+
+
+GENERATORS = {
+    'docx': generate_docx,
+    'pptx': generate_pptx,
+    'xlsx': generate_xlsx,
+    'html': generate_html,
+    'txt': generate_txt,
+}
+
+
+def generate(directory, file_format, scale, seed=0):
+    """ Write a document of the given format and scale, once, and return its filename. """
+    filename = 'bench_%d_%d.%s' % (scale, seed, file_format)
+    path = os.path.join(directory, filename)
+    if not os.path.exists(path):
+        GENERATORS[file_format](path, scale, seed=seed)
+    return filename
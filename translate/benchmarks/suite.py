@@ -0,0 +1,166 @@
+# coding: UTF-8
+import contextlib
+import datetime
+import json
+import os
+import platform
+import sys
+import time
+import tracemalloc
+from collections import OrderedDict
+
+from translate import translate_base
+from translate._constants import __version__
+from translate.benchmarks.generators import generate
+from translate.fake_server import FakeTranslateServer
+
+
+CLASSES = OrderedDict([
+    ('docx', ['TranslateDocx', 'TranslateDocxXml']),
+    ('pptx', ['TranslatePptx']),
+    ('xlsx', ['TranslateExcel', 'TranslateExcelXml', 'TranslateExcelStream']),
+    ('html', ['TranslateHtml', 'TranslateHtmlStream']),
+    ('txt', ['TranslateText', 'TranslateTextStream']),
+])
+SCALES = [100, 1000, 10000]
+THRESHOLD = 1.25  # a phase this many times slower than the baseline is reported as a regression
+NOISE = 0.01  # seconds: phases quicker than this in the baseline are not compared
+
+
+class PhaseTimer(object):
+    """ Record the wall time, and optionally the peak memory traced by tracemalloc, of each phase of a run. """
+    def __init__(self, memory=False):
+        self.memory = memory
+        self.phases = OrderedDict()
+
+    @contextlib.contextmanager
+    def phase(self, name):
+        if self.memory:
+            if hasattr(tracemalloc, 'reset_peak'):
+                tracemalloc.reset_peak()
+            else:
+                tracemalloc.stop()
+                tracemalloc.start()
+        start = time.perf_counter()
+        yield
+        record = self.phases.setdefault(name, {})
+        record['seconds'] = time.perf_counter() - start
+        if self.memory:
+            record['peak_bytes'] = tracemalloc.get_traced_memory()[1]
+
+
+def make_translator(backend, server, threads):
+    """ An offline translator, or one that sends its requests to the fake server. """
+    return translate_base.GoogleTranslate(None, 'fr', source_lang='en', online=backend == 'fake', threads=threads,
+                                          endpoint=server.endpoint)
+
+
+def run_once(class_name, filepath, filename, translator, memory=False):
+    """ Load, extract, translate, write back and save a document, timing each phase, and remove the output. """
+    translate_class = getattr(translate_base, class_name)
+    timer = PhaseTimer(memory)
+    with timer.phase('load'):
+        document = translate_class(filepath, filename, translator, defer=True)
+    if isinstance(document, translate_base.StreamMixin):
+        # the phases of a streamed document are interleaved, a window at a time
+        with timer.phase('stream'):
+            document.translate()
+    else:
+        with timer.phase('extract'):
+            document.segments = []
+            document.extract()
+        lines = document.source_lines()
+        with timer.phase('translate'):
+            translations = document.translate_lines(lines)
+        with timer.phase('write_back'):
+            document.write_back(translations)
+        with timer.phase('save'):
+            document.save()
+    os.remove(os.path.join(filepath, document.target))
+    segments = translator.cloud_requests + translator.dummy_text + translator.dict_hits + translator.empty_strings
+    return timer.phases, segments
+
+
+def run_case(class_name, filepath, filename, backend, server, threads=1, repeat=3, memory=False):
+    """ The fastest of `repeat` runs for each phase, with the peak memory from one more run if `memory`. """
+    phases, segments = OrderedDict(), 0
+    for _ in range(max(1, repeat)):
+        timings, segments = run_once(class_name, filepath, filename, make_translator(backend, server, threads))
+        for name, record in timings.items():
+            phases[name] = min(phases.get(name, record), record, key=lambda each: each['seconds'])
+    if memory:
+        tracemalloc.start()
+        try:
+            peaks, _ = run_once(class_name, filepath, filename, make_translator(backend, server, threads), True)
+        finally:
+            tracemalloc.stop()
+        for name, record in peaks.items():
+            phases[name] = dict(phases[name], peak_bytes=record['peak_bytes'])
+
+    for record in phases.values():
+        record['segments_per_second'] = segments / record['seconds'] if record['seconds'] else None
+    total = sum(record['seconds'] for record in phases.values())
+    return OrderedDict([
+        ('class', class_name), ('format', filename.rsplit('.', 1)[1]),
+        ('input_bytes', os.path.getsize(os.path.join(filepath, filename))), ('segments', segments),
+        ('phases', phases), ('seconds', total), ('segments_per_second', segments / total if total else None),
+    ])
+
+
+def run_suite(workdir, formats=None, classes=None, scales=None, backend='offline', latency='constant:0', threads=1,
+              repeat=3, memory=False, seed=0):
+    """ Generate the documents and benchmark each class on each, returning the results as a dictionary. """
+    results = []
+    with FakeTranslateServer(latency=latency, seed=seed).start() as server:
+        for file_format, class_names in CLASSES.items():
+            if formats and file_format not in formats:
+                continue
+            for scale in scales or SCALES:
+                filename = generate(workdir, file_format, scale, seed)
+                for class_name in class_names:
+                    if classes and class_name not in classes:
+                        continue
+                    result = run_case(class_name, workdir, filename, backend, server, threads, repeat, memory)
+                    result['scale'] = scale
+                    results.append(result)
+    return OrderedDict([
+        ('environment', OrderedDict([
+            ('translate', __version__), ('python', platform.python_version()), ('platform', platform.platform()),
+            ('date', datetime.datetime.now().isoformat(timespec='seconds')),
+        ])),
+        ('settings', OrderedDict([
+            ('backend', backend), ('latency', latency), ('threads', threads), ('repeat', repeat), ('seed', seed),
+        ])),
+        ('results', results),
+    ])
+
+
+def compare(baseline, current, threshold=THRESHOLD, noise=NOISE):
+    """ The phases that are more than `threshold` times slower than in the baseline, as (key, before, after). """
+    before = {(result['class'], result['scale'], phase): record['seconds']
+              for result in baseline['results'] for phase, record in result['phases'].items()}
+    regressions = []
+    for result in current['results']:
+        for phase, record in result['phases'].items():
+            key = (result['class'], result['scale'], phase)
+            if key in before and before[key] >= noise and record['seconds'] > before[key] * threshold:
+                regressions.append((key, before[key], record['seconds']))
+    return regressions
+
+
+def report(results, out=None):
+    out = out or sys.stdout
+    row = '{:<22} {:>6} {:>9} {:<10} {:>9} {:>12} {:>10}'
+    print(row.format('class', 'scale', 'segments', 'phase', 'seconds', 'segments/s', 'peak MB'), file=out)
+    for result in results['results']:
+        for phase, record in result['phases'].items():
+            print(row.format(
+                result['class'], result['scale'], result['segments'], phase, '%.4f' % record['seconds'],
+                '%.0f' % record['segments_per_second'] if record['segments_per_second'] else '-',
+                '%.1f' % (record['peak_bytes'] / 2 ** 20) if 'peak_bytes' in record else '-',
+            ), file=out)
+
+
+def save(results, filename):
+    with open(filename, 'w') as f:
+        json.dump(results, f, indent=2)
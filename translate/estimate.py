@@ -0,0 +1,144 @@
+# coding: UTF-8
+import json
+import math
+import os
+from collections import OrderedDict
+
+from translate.translation_memory import TranslationMemory, is_memory_file
+
+
+REQUEST_LATENCY = 0.5  # seconds for the cloud to answer one batch request, typical of a full batch
+PRICE_PER_MILLION = 20.0  # US dollars per million characters, the list price of Cloud Translation v2
+
+
+class Estimate(object):
+    """ The work needed to translate one file into one language. """
+    def __init__(self, threads=1, limiter=None):
+        self.threads = threads
+        self.limiter = limiter
+        self.segments = 0
+        self.strings = set()
+        self.cached = 0
+        self.characters = 0
+        self.requests = 0
+
+    @property
+    def unique(self):
+        return len(self.strings)
+
+    def network_seconds(self, latency):
+        return math.ceil(self.requests / self.threads) * latency
+
+    def seconds(self, latency):
+        """ Projected wall time: the requests in flight `threads` at a time, but no faster than the quota allows. """
+        quota = self.limiter.duration(self.characters, self.requests) if self.limiter is not None else 0.0
+        return max(self.network_seconds(latency), quota)
+
+
+class CostEstimate(object):
+    """
+    Count what a translation would cost while a preview (online=False) is run, for each file and language pair.
+
+    A translator with this object as its `estimate` reports the lines of each document (see
+    TranslateBase.translate_lines).  Strings found in the translator's history, or already counted for an earlier
+    file, are cached; the others are the characters billed and are grouped into requests as they would be sent.
+    The projected time uses the translator's threads and rate limiter, and a `latency` for each request.
+    """
+    def __init__(self, budget=None, latency=REQUEST_LATENCY, price=PRICE_PER_MILLION):
+        self.budget = budget
+        self.latency = latency
+        self.price = price
+        self.estimates = OrderedDict()
+        self.sent = {}
+        self.histories = {}
+
+    def record(self, filename, translator, lines):
+        """ Count the lines of a file that a translator is about to translate. """
+        language_pair = '%s-%s' % (translator.source_lang, translator.target_lang)
+        key = (filename, language_pair)
+        if key not in self.estimates:
+            self.estimates[key] = Estimate(getattr(translator, 'threads', 1), getattr(translator, 'limiter', None))
+        estimate = self.estimates[key]
+        if hasattr(translator, 'cache_key'):
+            # strings that normalize to the same key are sent once
+            lines = [translator.cache_key(line)[0] for line in lines]
+        strings = [line for line in lines if line]
+        estimate.segments += len(strings)
+
+        new = list(OrderedDict.fromkeys(string for string in strings if string not in estimate.strings))
+        estimate.strings.update(new)
+        sent = self.sent.setdefault(language_pair, set())
+        known = self.history(translator, [string for string in new if string not in sent])
+        billed = [string for string in new if string not in sent and string not in known]
+        sent.update(billed)
+        estimate.cached += len(new) - len(billed)
+        estimate.characters += sum(len(string) for string in billed)
+        estimate.requests += len(list(translator.batches(billed))) if hasattr(translator, 'batches') else len(billed)
+
+    def history(self, translator, strings):
+        """ The strings that are in the translator's history file, which is only read. """
+        filename = getattr(translator, 'history_file', None)
+        if not strings or not filename or not os.path.isfile(filename):
+            return set()
+        key = (filename, translator.source_lang, translator.target_lang)
+        if key not in self.histories:
+            if is_memory_file(filename):
+                self.histories[key] = TranslationMemory(filename, translator.source_lang, translator.target_lang)
+            else:
+                try:
+                    with open(filename, 'r') as f:
+                        self.histories[key] = json.load(f)
+                except (IOError, OSError, ValueError):
+                    self.histories[key] = {}
+        history = self.histories[key]
+        if isinstance(history, TranslationMemory):
+            return set(history.get_many(strings))
+        return {string for string in strings if string in history}
+
+    @property
+    def characters(self):
+        return sum(estimate.characters for estimate in self.estimates.values())
+
+    @property
+    def cost(self):
+        return self.characters * self.price / 10 ** 6
+
+    def seconds(self):
+        """ Projected wall time for all the files, which share the translators' rate limit. """
+        estimates = list(self.estimates.values())
+        network = sum(estimate.network_seconds(self.latency) for estimate in estimates)
+        limiter = next((estimate.limiter for estimate in estimates if estimate.limiter is not None), None)
+        quota = limiter.duration(self.characters, sum(e.requests for e in estimates)) if limiter is not None else 0.0
+        return max(network, quota)
+
+    def over_budget(self):
+        return self.budget is not None and self.characters > self.budget
+
+    def as_dict(self):
+        return {
+            'files': [
+                {'file': filename, 'language_pair': language_pair, 'segments': estimate.segments,
+                 'unique_segments': estimate.unique, 'cached': estimate.cached, 'characters': estimate.characters,
+                 'requests': estimate.requests, 'seconds': estimate.seconds(self.latency)}
+                for (filename, language_pair), estimate in self.estimates.items()
+            ],
+            'characters': self.characters, 'cost': self.cost, 'seconds': self.seconds(), 'budget': self.budget,
+        }
+
+    def report(self):
+        """ A table of the estimate for each file and language pair, with the totals. """
+        row = '    {:<32} {:<9} {:>9} {:>9} {:>9} {:>11} {:>9} {:>9}'
+        lines = ['estimate for translation:',
+                 row.format('file', 'languages', 'segments', 'unique', 'cached', 'characters', 'requests', 'seconds')]
+        for (filename, language_pair), estimate in self.estimates.items():
+            lines.append(row.format(filename, language_pair, estimate.segments, estimate.unique, estimate.cached,
+                                    estimate.characters, estimate.requests, '%.1f' % estimate.seconds(self.latency)))
+        estimates = list(self.estimates.values())
+        lines.append(row.format('total', '', sum(e.segments for e in estimates), sum(e.unique for e in estimates),
+                                sum(e.cached for e in estimates), self.characters,
+                                sum(e.requests for e in estimates), '%.1f' % self.seconds()))
+        lines.append('    cost: $%.2f at $%.2f per million characters' % (self.cost, self.price))
+        if self.budget is not None:
+            lines.append('    budget: %d characters (%s)' % (
+                self.budget, 'exceeded' if self.over_budget() else 'within budget'))
+        return '\n'.join(lines)
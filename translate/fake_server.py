@@ -0,0 +1,210 @@
+# coding: UTF-8
+"""
+A local stand-in for the Cloud Translation v2 endpoint, for load tests without network access.
+
+    $ python -m translate.fake_server --port 8089 --latency lognormal:0.3,0.5 --errors 0.01 --rate-limit 0.05
+    $ python -m translate --endpoint http://127.0.0.1:8089 -m 8 big_document.docx fr
+
+Each string is "translated" as target(string), as in the offline preview.
+"""
+import argparse
+import collections
+import json
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+API_PATH = '/language/translate/v2'
+SEGMENT_LIMIT = 128  # strings per request accepted by the v2 API
+
+
+def latency_distribution(spec):
+    """
+    A function of a random.Random giving the seconds to wait before each response, from a spec such as
+    'constant:0.2', 'uniform:0.1,0.5', 'normal:0.3,0.1', 'lognormal:0.3,0.5' (median, sigma) or 'exponential:0.3'.
+    """
+    name, _, params = spec.partition(':')
+    params = [float(param) for param in params.split(',')] if params else []
+    distributions = {
+        'constant': lambda rng, seconds=0.0: seconds,
+        'uniform': lambda rng, low, high: rng.uniform(low, high),
+        'normal': lambda rng, mean, sd: max(0.0, rng.normalvariate(mean, sd)),
+        'lognormal': lambda rng, median, sigma: median * rng.lognormvariate(0, sigma),
+        'exponential': lambda rng, mean: rng.expovariate(1 / mean),
+    }
+    if name not in distributions:
+        raise ValueError("unknown latency distribution '%s' (use one of %s)" % (name, ', '.join(distributions)))
+    return lambda rng: distributions[name](rng, *params)
+
+
+class FakeTranslateHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    disable_nagle_algorithm = True  # otherwise the body waits for the client to acknowledge the headers
+
+    def do_POST(self):
+        server = self.server
+        body = self.rfile.read(int(self.headers.get('Content-Length', 0)))
+        with server.lock:
+            server.in_flight += 1
+            server.max_in_flight = max(server.max_in_flight, server.in_flight)
+        try:
+            status, response = server.respond(self.path, body)
+        finally:
+            with server.lock:
+                server.in_flight -= 1
+        data = json.dumps(response).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json; charset=UTF-8')
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, *args):
+        if self.server.verbose:
+            BaseHTTPRequestHandler.log_message(self, *args)
+
+
+class FakeTranslateServer(ThreadingHTTPServer):
+    """
+    Answer Translate v2 requests locally, after a random latency and with errors injected at the given rates.
+
+    `errors` is the fraction of requests failed with a 500 or 503, and `rate_limit` the fraction refused with a
+    429; with `requests_per_second`, requests over that rate are refused with a 429 as well.  A request with more
+    than `segment_limit` strings, or `character_limit` characters, is rejected with a 400 as the real API does.
+    The stats (requests, segments, characters, statuses and the most requests in flight) can be read at any time.
+    """
+    daemon_threads = True
+
+    def __init__(self, address=('127.0.0.1', 0), latency='constant:0', errors=0.0, rate_limit=0.0,
+                 requests_per_second=None, segment_limit=SEGMENT_LIMIT, character_limit=None, seed=None,
+                 verbose=False):
+        ThreadingHTTPServer.__init__(self, address, FakeTranslateHandler)
+        self.latency = latency_distribution(latency) if isinstance(latency, str) else latency
+        self.errors = errors
+        self.rate_limit = rate_limit
+        self.requests_per_second = requests_per_second
+        self.segment_limit = segment_limit
+        self.character_limit = character_limit
+        self.random = random.Random(seed)
+        self.verbose = verbose
+        self.lock = threading.Lock()
+        self.recent = collections.deque()
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self.requests = 0
+        self.segments = 0
+        self.characters = 0
+        self.statuses = collections.Counter()
+        self.thread = None
+
+    @property
+    def endpoint(self):
+        return 'http://%s:%d' % self.server_address[:2]
+
+    def respond(self, path, body):
+        """ The status and JSON response for a request, after waiting for its latency. """
+        with self.lock:
+            self.requests += 1
+            draw = self.random.random()
+            server_error = self.random.choice((500, 503))
+            delay = self.latency(self.random)
+            over_rate = self.over_rate()
+        time.sleep(delay)
+
+        if not path.split('?')[0].rstrip('/') == API_PATH:
+            return self.error(404, 'Not Found')
+        try:
+            request = json.loads(body.decode('utf-8'))
+            strings = request['q'] if isinstance(request['q'], list) else [request['q']]
+            target = request['target']
+        except (ValueError, KeyError, TypeError):
+            return self.error(400, 'Invalid JSON payload received.')
+        if over_rate or draw < self.rate_limit:
+            return self.error(429, 'Rate Limit Exceeded', 'rateLimitExceeded')
+        if draw < self.rate_limit + self.errors:
+            return self.error(server_error, 'Backend Error', 'backendError')
+        if len(strings) > self.segment_limit:
+            return self.error(400, 'Too many text segments', 'invalid')
+        characters = sum(len(string) for string in strings)
+        if self.character_limit and characters > self.character_limit:
+            return self.error(400, 'Text too long', 'invalid')
+
+        with self.lock:
+            self.segments += len(strings)
+            self.characters += characters
+            self.statuses[200] += 1
+        translations = [{'translatedText': '%s(%s)' % (target, string)} for string in strings]
+        if not request.get('source'):
+            for translation in translations:
+                translation['detectedSourceLanguage'] = 'en'
+        return 200, {'data': {'translations': translations}}
+
+    def over_rate(self):
+        """ Whether a request now would exceed requests_per_second, counting those of the last second. """
+        if not self.requests_per_second:
+            return False
+        now = time.monotonic()
+        while self.recent and now - self.recent[0] >= 1:
+            self.recent.popleft()
+        if len(self.recent) >= self.requests_per_second:
+            return True
+        self.recent.append(now)
+        return False
+
+    def error(self, status, message, reason=None):
+        with self.lock:
+            self.statuses[status] += 1
+        return status, {'error': {'code': status, 'message': message,
+                                  'errors': [{'message': message, 'domain': 'global', 'reason': reason or 'error'}]}}
+
+    def start(self):
+        """ Serve from a background thread, returning the server for use as `with FakeTranslateServer().start()`. """
+        self.thread = threading.Thread(target=self.serve_forever, daemon=True)
+        self.thread.start()
+        return self
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        if self.thread is not None:
+            self.shutdown()
+        self.server_close()
+
+
+def main(arg_list=None):
+    parser = argparse.ArgumentParser(prog='translate.fake_server',
+                                     description='Local stand-in for the Cloud Translation v2 API, for load tests.')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8089)
+    parser.add_argument('--latency', default='constant:0',
+                        help='constant:S, uniform:A,B, normal:MEAN,SD, lognormal:MEDIAN,SIGMA or exponential:MEAN')
+    parser.add_argument('--errors', type=float, default=0.0, help='fraction of requests failed with 500 or 503')
+    parser.add_argument('--rate-limit', dest='rate_limit', type=float, default=0.0,
+                        help='fraction of requests refused with 429')
+    parser.add_argument('--requests-per-second', dest='requests_per_second', type=float,
+                        help='refuse requests over this rate with 429')
+    parser.add_argument('--segments', dest='segment_limit', type=int, default=SEGMENT_LIMIT,
+                        help='most strings accepted in one request')
+    parser.add_argument('--characters', dest='character_limit', type=int,
+                        help='most characters accepted in one request')
+    parser.add_argument('--seed', type=int, help='seed for the latency and errors, for repeatable runs')
+    parser.add_argument('-v', '--verbose', default=False, action='store_true', help='log each request')
+    args = parser.parse_args(arg_list)
+    options = {key: value for (key, value) in vars(args).items() if key not in ('host', 'port')}
+    server = FakeTranslateServer((args.host, args.port), **options)
+    print('serving the Translate v2 API at %s' % server.endpoint)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        print('requests: %d, segments: %d, characters: %d, statuses: %s, most in flight: %d' % (
+            server.requests, server.segments, server.characters, dict(server.statuses), server.max_in_flight))
+
+
+if __name__ == '__main__':
+    main()
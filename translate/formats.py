@@ -0,0 +1,33 @@
+# coding: UTF-8
+from translate.translate_base import (
+    TranslateDocx, TranslateDocxXml, TranslateExcel, TranslateExcelXml, TranslateHtml, TranslatePptx, TranslateText,
+    TranslateExcelStream, TranslateHtmlStream, TranslateTextStream,
+)
+
+
+TRANSLATOR = {
+    'docx': TranslateDocx,
+    'html': TranslateHtml,
+    'pptx': TranslatePptx,
+    'txt': TranslateText,
+    'xlsx': TranslateExcel,
+}
+STREAMING = {
+    'html': TranslateHtmlStream,
+    'txt': TranslateTextStream,
+    'xlsx': TranslateExcelStream,
+}
+XML = {
+    'docx': TranslateDocxXml,
+    'xlsx': TranslateExcelXml,
+}
+
+
+def file_translators(stream=False, xml=False):
+    """ The TranslateXxxx class for each file extension, with the streaming or XML classes where they apply. """
+    translators = dict(TRANSLATOR)
+    if stream:
+        translators.update(STREAMING)
+    if xml:
+        translators.update(XML)
+    return translators
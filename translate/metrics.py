@@ -0,0 +1,141 @@
+# coding: UTF-8
+import contextlib
+import json
+import math
+import os
+import threading
+import time
+from collections import OrderedDict
+
+
+PHASES = ['load', 'extract', 'translate', 'write_back', 'save', 'stream']
+PERCENTILES = [50, 90, 95, 99]
+
+
+def percentile(values, p):
+    """ The p-th percentile of a sorted list, by the nearest-rank method, or None for an empty list. """
+    if not values:
+        return None
+    return values[max(0, math.ceil(p / 100 * len(values)) - 1)]
+
+
+class Metrics(object):
+    """
+    Time the phases of a translation job and the requests sent to the cloud, for telling a job held up by the
+    network from one held up by parsing or saving documents.
+
+    A translator with this object as its `metrics` times each request, and the wait for its rate limiter; the
+    documents it translates time their load, extract, translate, write_back and save phases (or the whole of a
+    streamed document, as 'stream') and count the bytes of each file saved.  The seconds of each phase are summed
+    over all the documents.  Several translators may share one Metrics, which is safe to use from several threads.
+    """
+    def __init__(self, clock=time.perf_counter):
+        self.clock = clock
+        self.lock = threading.Lock()
+        self.phases = OrderedDict()
+        self.latencies = []
+        self.characters = 0
+        self.failed_requests = 0
+        self.throttled = 0.0
+        self.files = 0
+        self.bytes_written = 0
+
+    @contextlib.contextmanager
+    def phase(self, name):
+        """ Add the time spent in the body of the `with` statement to a phase. """
+        start = self.clock()
+        try:
+            yield
+        finally:
+            self.add_phase(name, self.clock() - start)
+
+    def add_phase(self, name, seconds, count=1):
+        with self.lock:
+            record = self.phases.setdefault(name, {'seconds': 0.0, 'count': 0})
+            record['seconds'] += seconds
+            record['count'] += count
+
+    def record_request(self, seconds, characters=0, failed=False):
+        """ Record the latency of a request, and the characters sent if it succeeded. """
+        with self.lock:
+            self.latencies.append(seconds)
+            if failed:
+                self.failed_requests += 1
+            else:
+                self.characters += characters
+
+    def record_wait(self, seconds):
+        """ Record time spent waiting for the rate limiter. """
+        with self.lock:
+            self.throttled += seconds
+
+    def record_output(self, filename):
+        """ Count a saved file and its size. """
+        size = os.path.getsize(filename) if os.path.isfile(filename) else 0
+        with self.lock:
+            self.files += 1
+            self.bytes_written += size
+
+    def merge(self, other):
+        """ Add the measurements of another Metrics, or of its as_dict(), to these. """
+        other = other.as_dict(latencies=True) if isinstance(other, Metrics) else other
+        for name, record in other['phases'].items():
+            self.add_phase(name, record['seconds'], record['count'])
+        with self.lock:
+            self.latencies.extend(other['requests']['latencies'])
+            self.characters += other['requests']['characters']
+            self.failed_requests += other['requests']['failed']
+            self.throttled += other['requests']['throttled_seconds']
+            self.files += other['output']['files']
+            self.bytes_written += other['output']['bytes']
+
+    @property
+    def requests(self):
+        return len(self.latencies)
+
+    def latency_percentiles(self, percentiles=PERCENTILES):
+        with self.lock:
+            latencies = sorted(self.latencies)
+        return OrderedDict(('p%d' % p, percentile(latencies, p)) for p in percentiles)
+
+    def as_dict(self, latencies=False):
+        """ The measurements as a dictionary of plain values, ready for JSON; the latencies listed if asked for. """
+        with self.lock:
+            phases = OrderedDict((name, dict(self.phases[name])) for name in sorted(
+                self.phases, key=lambda name: PHASES.index(name) if name in PHASES else len(PHASES)))
+            request_seconds = sum(self.latencies)
+            requests = OrderedDict([
+                ('count', len(self.latencies)), ('failed', self.failed_requests), ('characters', self.characters),
+                ('seconds', request_seconds), ('throttled_seconds', self.throttled),
+                ('mean_latency', request_seconds / len(self.latencies) if self.latencies else None),
+                ('max_latency', max(self.latencies) if self.latencies else None),
+            ])
+            if latencies:
+                requests['latencies'] = list(self.latencies)
+            output = OrderedDict([('files', self.files), ('bytes', self.bytes_written)])
+        requests.update(self.latency_percentiles())
+        return OrderedDict([('phases', phases), ('requests', requests), ('output', output)])
+
+    def report(self):
+        """ A table of the time in each phase, and a summary of the requests and output. """
+        metrics = self.as_dict()
+        lines = ['timing of translation:']
+        for name, record in metrics['phases'].items():
+            lines.append('    {:<12} {:>10.3f}s in {} calls'.format(name, record['seconds'], record['count']))
+        requests = metrics['requests']
+        if requests['count']:
+            lines.append('    requests: %d (%d failed), %d characters, latency %s' % (
+                requests['count'], requests['failed'], requests['characters'],
+                ', '.join('p%d %.3fs' % (p, requests['p%d' % p]) for p in PERCENTILES)
+            ))
+        if requests['throttled_seconds']:
+            lines.append('    waited for the rate limit: %.3fs' % requests['throttled_seconds'])
+        lines.append('    output: %d files, %d bytes' % (metrics['output']['files'], metrics['output']['bytes']))
+        return '\n'.join(lines)
+
+    def save(self, filename, **extra):
+        """ Write the measurements, and any extra items given, as a JSON report. """
+        report = self.as_dict()
+        report.update(extra)
+        with open(filename, 'w') as f:
+            json.dump(report, f, indent=2)
@@ -0,0 +1,49 @@
+# coding: UTF-8
+import re
+
+
+PLACEHOLDER_PATTERNS = [
+    # in order of precedence, as a URL or e-mail address may contain a date or a number
+    ('url', r'\b(?:https?://|www\.)[^\s<>"]*[^\s<>".,;:!?)\]\'"]'),
+    ('email', r'\b[\w.+-]+@[\w-]+(?:\.[\w-]+)+\b'),
+    ('date', r'\b(?:\d{4}-\d{1,2}-\d{1,2}|\d{1,2}[/.-]\d{1,2}[/.-]\d{2,4})\b'),
+    ('number', r'(?<![\w.,])[-+]?\d+(?:[.,]\d+)*(?!\w)'),
+]
+PLACEHOLDER = re.compile('|'.join('(?:%s)' % pattern for (_, pattern) in PLACEHOLDER_PATTERNS))
+TOKEN = '<x%d/>'  # an empty tag, which the API keeps in place as it is sent as HTML
+TOKEN_PATTERN = re.compile(r'<\s*x\s*(\d+)\s*/\s*>')
+
+
+class Placeholders(object):
+    """
+    A string with its numbers, dates, URLs and e-mail addresses replaced by numbered tokens, and its surrounding
+    whitespace taken off, so that strings which differ only in those share one key for the cache and the cloud.
+
+    restore() puts the values back into a translation of the key, or gives None if the translation has lost (or
+    repeated) one of the tokens, in which case the string has to be translated as it is.
+    """
+    __slots__ = ('key', 'values', 'leading', 'trailing')
+
+    def __init__(self, string):
+        body = string.strip()
+        self.leading = string[:len(string) - len(string.lstrip())]
+        self.trailing = string[len(string.rstrip()):] if body else ''
+        self.values = []
+        if TOKEN_PATTERN.search(body):
+            # the string already holds something that looks like a token, so it is left alone
+            self.key = body
+        else:
+            self.key = PLACEHOLDER.sub(self.replace, body)
+
+    def replace(self, match):
+        self.values.append(match.group(0))
+        return TOKEN % (len(self.values) - 1)
+
+    def restore(self, translation):
+        if not self.values:
+            return translation.join([self.leading, self.trailing])
+        found = [int(number) for number in TOKEN_PATTERN.findall(translation)]
+        if sorted(found) != list(range(len(self.values))):
+            return None
+        restored = TOKEN_PATTERN.sub(lambda match: self.values[int(match.group(1))], translation)
+        return restored.join([self.leading, self.trailing])
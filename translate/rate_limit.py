@@ -0,0 +1,84 @@
+# coding: UTF-8
+import random
+import threading
+import time
+
+
+RETRIES = 5  # attempts after the first, for a request refused for its rate or failed by the server
+BACKOFF = 1.0  # seconds before the first retry, doubled for each one after
+MAX_BACKOFF = 60.0
+RETRY_STATUS = (429, 500, 502, 503, 504)
+
+
+class TokenBucket(object):
+    """ Allow `rate` units per `period` seconds on average, with bursts of up to `rate` units. """
+    def __init__(self, rate, period, clock):
+        self.capacity = float(rate)
+        self.refill = float(rate) / period
+        self.tokens = self.capacity
+        self.clock = clock
+        self.updated = clock()
+
+    def reserve(self, amount):
+        """ Take `amount` units, going into debt if need be, and return the seconds to wait before using them. """
+        now = self.clock()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.refill)
+        self.updated = now
+        self.tokens -= amount
+        return max(0.0, -self.tokens / self.refill)
+
+    def duration(self, amount):
+        """ The least time in which `amount` units can be taken, starting with a full bucket. """
+        return max(0.0, amount - self.capacity) / self.refill
+
+
+class RateLimiter(object):
+    """
+    Keep the requests to the cloud within a quota of characters per minute and requests per second.
+
+    Each request reserves its share of both before it is sent, and waits until they are available.  A request
+    larger than the quota waits for the full allowance and then goes ahead.  One limiter may be shared by several
+    translators and threads, since the quota belongs to the project rather than to a language pair.
+    """
+    def __init__(self, characters_per_minute=None, requests_per_second=None, clock=time.monotonic, sleep=time.sleep):
+        self.characters = TokenBucket(characters_per_minute, 60, clock) if characters_per_minute else None
+        self.requests = TokenBucket(requests_per_second, 1, clock) if requests_per_second else None
+        self.sleep = sleep
+        self.lock = threading.Lock()
+        self.waited = 0.0
+
+    def reserve(self, characters):
+        """ Reserve a request of `characters` and return the seconds to wait before sending it. """
+        with self.lock:
+            delay = max(self.characters.reserve(characters) if self.characters else 0.0,
+                        self.requests.reserve(1) if self.requests else 0.0)
+            self.waited += delay
+        return delay
+
+    def duration(self, characters, requests):
+        """ The least time in which `requests` totalling `characters` can be sent within the quota. """
+        return max(self.characters.duration(characters) if self.characters else 0.0,
+                   self.requests.duration(requests) if self.requests else 0.0)
+
+    def wait(self, characters):
+        """ Reserve a request of `characters`, sleep until it may be sent, and return the seconds slept. """
+        delay = self.reserve(characters)
+        if delay:
+            self.sleep(delay)
+        return delay
+
+
+def retry_delay(error, attempt, retries=RETRIES):
+    """
+    The seconds to wait before retrying a request that failed with `error`, or None if it should not be retried.
+
+    Rate limits (429, or 403 for a rate limit exceeded) and server errors are retried after an exponential
+    backoff with full jitter, so that concurrent requests that failed together do not retry together.
+    """
+    from google.api_core import exceptions
+    if attempt >= retries or not isinstance(error, exceptions.GoogleAPICallError):
+        return None
+    rate_limited = error.code == 403 and 'rate limit' in (error.message or '').lower()
+    if error.code not in RETRY_STATUS and not rate_limited:
+        return None
+    return random.uniform(0, min(MAX_BACKOFF, BACKOFF * 2 ** attempt))
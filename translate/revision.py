@@ -0,0 +1,47 @@
+# coding: UTF-8
+import difflib
+
+
+class Revision(object):
+    """
+    The translation of a previous version of a document, to be kept for the segments that have not changed.
+
+    `sources` and `translations` are the lines of the previous source and of its translated output, in document
+    order, one for one.  The lines of the revised source are aligned with the previous source by difflib, a
+    longest-matching-block diff, so that paragraphs, cells or slides inserted, deleted or edited only disturb the
+    lines around them.  The translation of each line in an unchanged run is copied from the previous output (with
+    any corrections made to it by hand), and only the other lines are sent to be translated.
+    """
+    def __init__(self, sources, translations, name=None):
+        self.sources = sources
+        self.translations = translations
+        self.name = name
+        self.matcher = difflib.SequenceMatcher(None, autojunk=False)
+        # the previous source is indexed once, whatever the number of times the revision is aligned with it
+        self.matcher.set_seq2(sources)
+        self.reused = 0
+        self.changed = 0
+
+    def align(self, lines):
+        """ The translation kept for each line of the revised source, or None where it has changed. """
+        self.matcher.set_seq1(lines)
+        kept = [None] * len(lines)
+        for tag, i1, i2, j1, j2 in self.matcher.get_opcodes():
+            if tag == 'equal':
+                kept[i1:i2] = self.translations[j1:j2]
+        return kept
+
+    def translate(self, lines, translate_changed):
+        """ Translate the lines of the revised source, calling translate_changed(lines) for those that have changed. """
+        translations = self.align(lines)
+        changed = [i for (i, translation) in enumerate(translations) if translation is None]
+        for i, translation in zip(changed, translate_changed([lines[i] for i in changed]) if changed else []):
+            translations[i] = translation
+        self.reused += len(lines) - len(changed)
+        self.changed += len(changed)
+        return translations
+
+    def report(self):
+        return 'kept %d of %d segments from %s, and translated %d' % (
+            self.reused, self.reused + self.changed, self.name, self.changed
+        )
@@ -0,0 +1,352 @@
+# coding: UTF-8
+"""
+A long-running translation daemon, which keeps the cloud client, its connections and the translation dictionary
+warm between jobs.
+
+    $ python -m translate serve --socket /tmp/translate.sock -r memory.db -m 8
+    $ python -m translate --server /tmp/translate.sock my_document.docx fr
+
+Jobs are posted as JSON, to a local port or a Unix socket, and run concurrently:
+
+    POST /translate  {"strings": [...], "target_lang": "fr", "source_lang": "en"}  ->  {"translations": [...]}
+    POST /document   {"file": "/path/to/my_document.docx", "target_lang": "fr,ja", "source_lang": "en",
+                      "target": null, "condense": false, "cross_check": false, "stream": false, "xml": false}
+                     ->  {"targets": [...], "seconds": ...}
+    GET  /status     ->  the jobs run, and the stats and metrics of the translators
+
+A job reads and writes files with the server's permissions, so the server listens only on a loopback address or a
+Unix socket, and writes each output beside its source.
+"""
+import argparse
+import http.client
+import ipaddress
+import json
+import os
+import socket
+import socketserver
+import threading
+import time
+import traceback
+import warnings
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from translate.formats import file_translators
+from translate.metrics import Metrics
+from translate.rate_limit import RETRIES, RateLimiter
+from translate.translate_base import CREDS, MAX_THREADS, GoogleTranslate
+from translate.translation_memory import language_history
+
+
+PORT = 8090
+TIMEOUT = 600  # seconds a client waits for a job
+
+
+class JobError(ValueError):
+    """ A job that cannot be run as it was posted. """
+
+
+def is_loopback(host):
+    """ Whether a host name or address can only be reached from this machine. """
+    if host == 'localhost':
+        return True
+    try:
+        return ipaddress.ip_address(host).is_loopback
+    except ValueError:
+        return False
+
+
+class TranslationHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def setup(self):
+        # Nagle's algorithm applies to TCP only, and would delay each response until the client acknowledged
+        self.disable_nagle_algorithm = self.request.family != getattr(socket, 'AF_UNIX', None)
+        BaseHTTPRequestHandler.setup(self)
+
+    def do_GET(self):
+        if self.path.rstrip('/') == '/status':
+            self.reply(200, self.server.status())
+        else:
+            self.reply(404, {'error': 'Not Found'})
+
+    def do_POST(self):
+        routes = {'/translate': self.server.translate_strings, '/document': self.server.translate_document}
+        body = self.rfile.read(int(self.headers.get('Content-Length', 0)))
+        route = routes.get(self.path.rstrip('/'))
+        if route is None:
+            return self.reply(404, {'error': 'Not Found'})
+        try:
+            job = json.loads(body.decode('utf-8'))
+        except ValueError as error:
+            return self.reply(400, {'error': 'Invalid JSON: %s' % error})
+        try:
+            if not isinstance(job, dict):
+                raise JobError('a job is a JSON object')
+            self.reply(200, self.server.run_job(route, job))
+        except JobError as error:
+            self.reply(400, {'error': str(error)})
+        except Exception as error:
+            if self.server.verbose:
+                traceback.print_exc()
+            self.reply(500, {'error': '%s: %s' % (type(error).__name__, error)})
+
+    def reply(self, status, response):
+        data = json.dumps(response).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json; charset=UTF-8')
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def address_string(self):
+        # a Unix socket client has no address
+        return self.client_address[0] if self.client_address else 'unix'
+
+    def log_message(self, *args):
+        if self.server.verbose:
+            BaseHTTPRequestHandler.log_message(self, *args)
+
+
+class TranslationService(object):
+    """
+    Run translation jobs with translators that are created once for each language pair and then kept.
+
+    The translators share one rate limiter and one Metrics, and keep their dictionary (and translation memory)
+    for the life of the server, so a string translated for one job is found for every later one.  So does the
+    reverse translator of each, which is made for the first cross-check job.
+    """
+    def setup_service(self, history=None, verbose=False, source_lang=None, **bf_kwargs):
+        self.history = history
+        self.source_lang = source_lang
+        self.verbose = verbose
+        self.bf_kwargs = bf_kwargs
+        self.bf_kwargs.setdefault('metrics', Metrics())
+        self.metrics = self.bf_kwargs['metrics']
+        self.translators = {}
+        self.translators_lock = threading.Lock()
+        self.jobs_lock = threading.Lock()
+        self.started = time.time()
+        self.jobs = 0
+        self.active = 0
+        self.failed = 0
+
+    def translator(self, target_lang, source_lang=None):
+        """ The translator for a language pair, created on first use. """
+        key = (source_lang, target_lang)
+        with self.translators_lock:
+            if key not in self.translators:
+                self.translators[key] = GoogleTranslate(CREDS, target_lang, source_lang=source_lang,
+                                                        history=language_history(self.history, target_lang),
+                                                        **self.bf_kwargs)
+            return self.translators[key]
+
+    def run_job(self, route, job):
+        with self.jobs_lock:
+            self.active += 1
+        try:
+            return route(job)
+        except Exception:
+            with self.jobs_lock:
+                self.failed += 1
+            raise
+        finally:
+            with self.jobs_lock:
+                self.active -= 1
+                self.jobs += 1
+
+    def translate_strings(self, job):
+        strings = job.get('strings')
+        if not isinstance(strings, list) or not all(isinstance(string, str) for string in strings):
+            raise JobError("'strings' must be a list of strings")
+        translator = self.translator(self.target_lang(job), self.job_source_lang(job))
+        translations = translator.translate_many(strings)
+        translator.save_history()
+        return {'translations': translations}
+
+    def translate_document(self, job):
+        filename = job.get('file')
+        if not filename or not os.path.isfile(filename):
+            raise JobError("'file' must be the path of a file that the server can read: %r" % filename)
+        filepath, filename = os.path.split(os.path.realpath(filename))
+        extension = filename.rsplit('.', 1)[-1]
+        translate_class = file_translators(job.get('stream', False), job.get('xml', False)).get(extension)
+        if translate_class is None:
+            raise JobError("'.%s' files cannot be translated" % extension)
+
+        target = job.get('target')
+        # a name with a directory in it, absolute or relative, could overwrite any file the server can write
+        if target is not None and (not isinstance(target, str) or os.path.basename(target) != target
+                                   or target in ('.', '..')):
+            raise JobError("'target' must be a file name, which is written beside the source: %r" % target)
+
+        translators = [self.translator(lang, self.job_source_lang(job)) for lang in self.target_lang(job).split(',')]
+        start = time.perf_counter()
+        document = translate_class(filepath, filename, translators if len(translators) > 1 else translators[0],
+                                   target=target, condense=bool(job.get('condense', False)),
+                                   cross_check=bool(job.get('cross_check', False)))
+        return {'targets': [os.path.join(filepath, target) for target in document.targets],
+                'seconds': time.perf_counter() - start}
+
+    @staticmethod
+    def target_lang(job):
+        if not job.get('target_lang') or not isinstance(job['target_lang'], str):
+            raise JobError("'target_lang' is required")
+        return job['target_lang']
+
+    def job_source_lang(self, job):
+        """ The source language of a job, by default that given to the server. """
+        return job.get('source_lang') or self.source_lang
+
+    def status(self):
+        with self.translators_lock:
+            translators = list(self.translators.values())
+        stats = {}
+        for translator in translators:
+            with translator.lock:
+                translator.update_stats()
+                stats.update({lang_pair: dict(each) for (lang_pair, each) in translator.stats.items()})
+        with self.jobs_lock:
+            jobs = {'jobs': self.jobs, 'active': self.active, 'failed': self.failed}
+        return dict(jobs, uptime=time.time() - self.started, stats=stats, metrics=self.metrics.as_dict())
+
+    def save_histories(self):
+        with self.translators_lock:
+            for translator in self.translators.values():
+                translator.save_history()
+
+
+class TranslationServer(TranslationService, ThreadingHTTPServer):
+    """
+    Serve translation jobs over HTTP on a local port (see the module docstring), a thread for each job.
+
+    The jobs are not authenticated, so an address that other machines could reach is refused with a ValueError.
+    """
+    daemon_threads = True
+
+    def __init__(self, address=('127.0.0.1', PORT), **kwargs):
+        if not is_loopback(address[0]):
+            raise ValueError('%r is not a loopback address: the server only takes jobs from this machine' % (
+                address[0],
+            ))
+        ThreadingHTTPServer.__init__(self, address, TranslationHandler)
+        self.setup_service(**kwargs)
+
+    @property
+    def address(self):
+        return 'http://%s:%d' % self.server_address[:2]
+
+
+class UnixTranslationServer(TranslationService, socketserver.ThreadingUnixStreamServer):
+    """ Serve translation jobs over HTTP on a Unix socket, which only local users with access to it can reach. """
+    daemon_threads = True
+
+    def __init__(self, path, **kwargs):
+        if os.path.exists(path):
+            os.remove(path)
+        socketserver.ThreadingUnixStreamServer.__init__(self, path, TranslationHandler)
+        self.setup_service(**kwargs)
+
+    @property
+    def address(self):
+        return self.server_address
+
+    def server_close(self):
+        socketserver.ThreadingUnixStreamServer.server_close(self)
+        if os.path.exists(self.server_address):
+            os.remove(self.server_address)
+
+
+class UnixHTTPConnection(http.client.HTTPConnection):
+    def __init__(self, path, timeout=TIMEOUT):
+        http.client.HTTPConnection.__init__(self, 'localhost', timeout=timeout)
+        self.path = path
+
+    def connect(self):
+        self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.sock.settimeout(self.timeout)
+        self.sock.connect(self.path)
+
+
+def request(address, path, job=None, timeout=TIMEOUT):
+    """
+    Post a job to a translation server, at a URL such as http://127.0.0.1:8090 or the path of its Unix socket, and
+    return the status and the response.  Without a job, GET the path instead.
+    """
+    if address.startswith('http://'):
+        host, _, port = address[len('http://'):].rstrip('/').partition(':')
+        connection = http.client.HTTPConnection(host, int(port or 80), timeout=timeout)
+    else:
+        connection = UnixHTTPConnection(address, timeout=timeout)
+    try:
+        if job is None:
+            connection.request('GET', path)
+        else:
+            connection.request('POST', path, json.dumps(job).encode('utf-8'),
+                               {'Content-Type': 'application/json'})
+        response = connection.getresponse()
+        return response.status, json.loads(response.read().decode('utf-8'))
+    finally:
+        connection.close()
+
+
+def parse_args(args):
+    parser = argparse.ArgumentParser(
+        prog='translate serve',
+        description='Serve translation jobs from a daemon that keeps the cloud client and translations warm.',
+    )
+    parser.add_argument('--host', default='127.0.0.1',
+                        help='loopback address to listen on (default 127.0.0.1)')
+    parser.add_argument('--port', type=int, default=PORT, help='port to listen on (default %d)' % PORT)
+    parser.add_argument('--socket', help='listen on a Unix socket at this path instead of a port')
+    parser.add_argument('--cache_mb', type=float,
+                        help='keep the translations held in memory within N MB, with a translation memory (.db) as -r')
+    parser.add_argument('--chars_per_minute', type=int,
+                        help='keep the characters sent to the cloud within a quota of N per minute')
+    parser.add_argument('--endpoint', help='URL of the translation API, such as a translate.fake_server')
+    parser.add_argument('-m', '--threads', type=int, default=1,
+                        help='use N threads to access cloud for each job (at most %d)' % MAX_THREADS)
+    parser.add_argument('-n', '--preview', dest='online', default=True, action='store_false',
+                        help='offline preview mode')
+    parser.add_argument('--normalize', default=False, action='store_true',
+                        help='replace numbers, dates, URLs and e-mail addresses with placeholders while translating')
+    parser.add_argument('-r', '--reuse', dest='history',
+                        help='history shared by all jobs: JSON, or .db for a translation memory (recommended)')
+    parser.add_argument('--requests_per_second', type=float,
+                        help='keep the requests sent to the cloud within a quota of N per second')
+    parser.add_argument('--retries', type=int, default=RETRIES,
+                        help='retry a request refused for its rate, or failed by the server, N times')
+    parser.add_argument('-s', '--source', dest='source_lang',
+                        help='source language per ISO 639-1, for the jobs that do not give one')
+    parser.add_argument('-v', '--verbose', default=False, action='store_true', help='log each job')
+    return parser.parse_args(args)
+
+
+def main(arg_list=None):
+    args = parse_args(arg_list)
+    bf_kwargs = {'online': args.online, 'threads': args.threads, 'retries': args.retries,
+                 'endpoint': args.endpoint, 'normalize': args.normalize}
+    if args.cache_mb:
+        bf_kwargs['cache_size'] = int(args.cache_mb * 2 ** 20)
+    if args.chars_per_minute or args.requests_per_second:
+        bf_kwargs['limiter'] = RateLimiter(args.chars_per_minute, args.requests_per_second)
+    if not args.socket and not is_loopback(args.host):
+        warnings.warn('The server runs jobs on local files without authentication, so it only listens on a '
+                      'loopback address, not %r' % args.host)
+        return 'invalid host'
+    if args.socket:
+        server = UnixTranslationServer(args.socket, history=args.history, verbose=args.verbose,
+                                       source_lang=args.source_lang, **bf_kwargs)
+    else:
+        server = TranslationServer((args.host, args.port), history=args.history, verbose=args.verbose,
+                                   source_lang=args.source_lang, **bf_kwargs)
+    print('serving translation jobs at %s' % server.address, flush=True)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        server.save_histories()
+        status = server.status()
+        print('jobs: %d (%d failed)' % (status['jobs'], status['failed']))
+        print(server.metrics.report())
@@ -1,6 +1,27 @@
 # Fixtures (pre-configured objects) for tests
+import json
+import os
+
 import pytest
 
+mock_dict = json.load(open(os.path.join(os.path.split(__file__)[0], 'data', 'mock_translations.json')))
+
+
+def mock_session(*args, **kwargs):
+    return
+
+
+def mock_response(*args, **kwargs):
+    return [{'language': 'af', 'name': 'Afrikaans'}]
+
+
+def mock_translation(self, string):
+    return {'translatedText': mock_dict[string]}
+
+
+def mock_batch_translation(self, strings):
+    return [{'translatedText': mock_dict[string]} for string in strings]
+
 
 @pytest.fixture
 def datadir():
@@ -11,3 +32,32 @@ def datadir():
     DATADIR = os.path.join(here, "data")
     return LocalPath(DATADIR)
 
+
+@pytest.fixture(autouse=True)
+def mock_Client(monkeypatch):
+    from google.cloud.translate import Client
+    monkeypatch.setattr(Client, 'from_service_account_json', staticmethod(mock_session))
+    monkeypatch.setattr(Client, 'get_languages', mock_response)
+
+
+@pytest.fixture
+def GoogleTranslate(monkeypatch):
+    """GoogleTranslate answering from mock_translations.json; a module may override it to patch the requests again"""
+    from translate.translate_base import GoogleTranslate
+    monkeypatch.setattr(GoogleTranslate, 'request_translation', mock_translation)
+    monkeypatch.setattr(GoogleTranslate, 'request_batch', mock_batch_translation)
+    return GoogleTranslate
+
+
+@pytest.fixture
+def text_contents():
+    """The text files written by text_files, by name; a module may override it"""
+    return {'first.txt': 'List\none\ntwo\n', 'second.txt': 'one\nthree\nthree\n\n'}
+
+
+@pytest.fixture
+def text_files(tmp_path, text_contents):
+    """A directory holding the text_contents"""
+    for name, text in text_contents.items():
+        (tmp_path / name).write_text(text)
+    return tmp_path
@@ -0,0 +1,50 @@
+# coding: UTF-8
+from __future__ import absolute_import
+from __future__ import unicode_literals
+
+import copy
+import json
+
+import pytest
+
+
+@pytest.mark.parametrize("file_format", ['docx', 'pptx', 'xlsx', 'html', 'txt'])
+def test_generate(tmp_path, file_format):
+    from translate.benchmarks.generators import generate
+    filename = generate(str(tmp_path), file_format, 20)
+    assert (tmp_path / filename).stat().st_size
+    assert generate(str(tmp_path), file_format, 20) == filename
+
+
+def test_run_suite(tmp_path):
+    from translate.benchmarks import suite
+    results = suite.run_suite(str(tmp_path), scales=[20], repeat=1, memory=True)
+    classes = [result['class'] for result in results['results']]
+    assert classes == [name for names in suite.CLASSES.values() for name in names]
+    for result in results['results']:
+        assert result['segments'] > 0
+        phases = ['load', 'stream'] if result['class'].endswith('Stream') else [
+            'load', 'extract', 'translate', 'write_back', 'save']
+        assert list(result['phases']) == phases
+        assert all(record['peak_bytes'] > 0 for record in result['phases'].values())
+    # only the generated documents are left behind
+    assert sorted(path.suffix for path in tmp_path.iterdir()) == ['.docx', '.html', '.pptx', '.txt', '.xlsx']
+
+    results['results'][0]['phases']['save']['seconds'] = 1.0
+    slower = copy.deepcopy(results)
+    slower['results'][0]['phases']['save']['seconds'] = 2.0
+    assert [key for (key, _, _) in suite.compare(results, slower)] == [('TranslateDocx', 20, 'save')]
+    assert suite.compare(slower, results) == []
+
+
+def test_main(tmp_path, capsys):
+    from translate.benchmarks.__main__ import main
+    output = str(tmp_path / 'results.json')
+    options = ['--formats', 'txt', '--scales', '10', '--repeat', '1', '--workdir', str(tmp_path / 'work')]
+    assert main(options + ['--backend', 'fake', '-m', '2', '-o', output]) == 0
+    with open(output) as f:
+        results = json.load(f)
+    assert results['settings']['backend'] == 'fake'
+    assert [result['class'] for result in results['results']] == ['TranslateText', 'TranslateTextStream']
+    assert main(options + ['--compare', output, '--threshold', '1000']) == 0
+    assert 'TranslateTextStream' in capsys.readouterr()[0]
@@ -0,0 +1,68 @@
+# coding: UTF-8
+from __future__ import absolute_import
+from __future__ import unicode_literals
+
+import json
+
+import pytest
+
+from translate.translate_base import CREDS
+
+
+class TestCostEstimate():
+    def test_record(self, GoogleTranslate, text_files, monkeypatch):
+        from translate.estimate import CostEstimate
+        from translate.rate_limit import RateLimiter
+        from translate.translate_base import BATCH_LIMITS, TranslateText
+        monkeypatch.setitem(BATCH_LIMITS, 'segments', 2)
+        history = text_files / 'history.json'
+        history.write_text(json.dumps({'two': 'deux'}))
+        estimate = CostEstimate(latency=1.0)
+        babelfish = GoogleTranslate(CREDS, 'fr', source_lang='en', online=False, history=str(history), threads=2,
+                                    limiter=RateLimiter(characters_per_minute=60))
+        babelfish.estimate = estimate
+        for filename in ('first.txt', 'second.txt'):
+            TranslateText(str(text_files), filename, babelfish)
+
+        first, second = [estimate.estimates[(filename, 'en-fr')] for filename in ('first.txt', 'second.txt')]
+        assert (first.segments, first.unique, first.cached, first.characters, first.requests) == (3, 3, 1, 7, 1)
+        # 'one' was counted with the first file, so only 'three' is billed for the second
+        assert (second.segments, second.unique, second.cached, second.characters, second.requests) == (3, 2, 1, 5, 1)
+        assert estimate.characters == 12
+        assert first.seconds(estimate.latency) == 1.0
+        assert estimate.seconds() == 2.0
+        assert 'total' in estimate.report()
+        assert json.loads(json.dumps(estimate.as_dict()))['files'][1]['unique_segments'] == 2
+
+    @pytest.mark.parametrize("budget, expected", [(15, None), (14, 'over budget')])
+    def test_main_budget(self, GoogleTranslate, text_files, capsys, budget, expected):
+        from translate.__main__ import main
+        with pytest.warns(None):
+            result = main(arg_list=[str(text_files), 'fr', '-s', 'en', '-n', '--budget', str(budget)])
+        out, err = capsys.readouterr()
+        assert result == expected
+        assert '    first.txt' in out
+        # with a budget, the preview only estimates
+        assert 'translated' not in out and not (text_files / 'first_fr.txt').exists()
+
+    @pytest.mark.parametrize('options', [[], ['--stream']])
+    def test_refused_job(self, GoogleTranslate, text_files, options):
+        from translate.__main__ import main
+        (text_files / 'first_fr.txt').write_text('corrected by hand\n')
+        with pytest.warns(UserWarning, match='refused'):
+            result = main(arg_list=[str(text_files), 'fr', '-s', 'en', '--budget', '14'] + options)
+        assert result == 'over budget'
+        assert (text_files / 'first_fr.txt').read_text() == 'corrected by hand\n'
+        assert not (text_files / 'second_fr.txt').exists()
+
+    @pytest.mark.parametrize('options', [[], ['--stream']])
+    def test_within_budget(self, GoogleTranslate, text_files, monkeypatch, options):
+        from translate.__main__ import main
+        from translate.translate_base import TranslateText
+        saved = []
+        save = TranslateText.save
+        monkeypatch.setattr(TranslateText, 'save', lambda self: saved.append(self.target) or save(self))
+        main(arg_list=[str(text_files), 'fr', '-s', 'en', '--budget', '15'] + options)
+        assert (text_files / 'first_fr.txt').read_text() == 'liste\nun\ndeux\n'
+        # the estimate only reads each file: the outputs are saved once, by the translation itself
+        assert saved == ([] if options else ['first_fr.txt', 'second_fr.txt'])
@@ -0,0 +1,84 @@
+# coding: UTF-8
+from __future__ import absolute_import
+from __future__ import unicode_literals
+
+import asyncio
+import random
+
+import pytest
+from google.api_core import exceptions
+
+from translate.translate_base import CREDS
+
+
+@pytest.fixture
+def no_backoff(monkeypatch):
+    from translate import rate_limit
+    monkeypatch.setattr(rate_limit.random, 'uniform', lambda low, high: 0)
+
+
+@pytest.fixture
+def fake_server():
+    from translate.fake_server import FakeTranslateServer
+    servers = []
+
+    def start(**kwargs):
+        servers.append(FakeTranslateServer(**kwargs).start())
+        return servers[-1]
+    yield start
+    for server in servers:
+        server.__exit__(None, None, None)
+
+
+class TestFakeTranslateServer():
+    @pytest.mark.parametrize("spec", ['constant:0.2', 'uniform:0.1,0.3', 'normal:0.2,0.05', 'lognormal:0.2,0.5',
+                                      'exponential:0.2'])
+    def test_latency_distribution(self, spec):
+        from translate.fake_server import latency_distribution
+        rng = random.Random(1)
+        samples = [latency_distribution(spec)(rng) for _ in range(2000)]
+        assert min(samples) >= 0
+        assert 0.1 < sorted(samples)[1000] < 0.3
+
+    def test_unknown_distribution(self):
+        from translate.fake_server import latency_distribution
+        with pytest.raises(ValueError):
+            latency_distribution('pareto:1')
+
+    def test_translate_many(self, fake_server, monkeypatch):
+        from translate.translate_base import BATCH_LIMITS, GoogleTranslate
+        monkeypatch.setitem(BATCH_LIMITS, 'segments', 2)
+        server = fake_server(latency='constant:0.05')
+        babelfish = GoogleTranslate(CREDS, 'fr', source_lang='en', threads=4, endpoint=server.endpoint)
+        strings = ['one', 'two', 'three', 'two', 'four', 'five', 'six', 'seven', '']
+        assert babelfish.translate_many(strings) == ['fr(%s)' % string if string else '' for string in strings]
+        assert babelfish.translate('eight') == 'fr(eight)'
+        assert (server.requests, server.segments, server.characters) == (5, 8, 32)
+        assert server.max_in_flight == 4
+
+    def test_errors_retried(self, fake_server, no_backoff):
+        from translate.translate_base import GoogleTranslate
+        server = fake_server(errors=0.3, rate_limit=0.3, seed=7)
+        babelfish = GoogleTranslate(CREDS, 'fr', source_lang='en', retries=20, endpoint=server.endpoint)
+        strings = ['segment %d' % i for i in range(20)]
+        assert [babelfish.translate(string) for string in strings] == ['fr(%s)' % string for string in strings]
+        assert server.statuses[200] == 20
+        assert server.statuses[429] and server.statuses[500] + server.statuses[503]
+
+    def test_limits(self, fake_server, monkeypatch):
+        from translate.translate_base import BATCH_LIMITS, GoogleTranslate
+        monkeypatch.setitem(BATCH_LIMITS, 'segments', 3)
+        server = fake_server(segment_limit=2, requests_per_second=1)
+        babelfish = GoogleTranslate(CREDS, 'fr', source_lang='en', retries=0, endpoint=server.endpoint)
+        with pytest.raises(exceptions.BadRequest):
+            babelfish.translate_many(['one', 'two', 'three'])
+        with pytest.raises(exceptions.TooManyRequests):
+            babelfish.translate_many(['one'])
+
+    def test_async(self, fake_server):
+        from translate.translate_async import AsyncGoogleTranslate
+        server = fake_server(latency='uniform:0.01,0.05', seed=1)
+        babelfish = AsyncGoogleTranslate(CREDS, 'ja', source_lang='en', concurrency=4, endpoint=server.endpoint)
+        result = asyncio.run(babelfish.run_and_close(babelfish.translate_many(['one', 'two'])))
+        assert result == ['ja(one)', 'ja(two)']
+        assert server.statuses[200] == 1
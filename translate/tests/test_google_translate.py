@@ -9,9 +9,10 @@ import json
 import logging
 import mock
 import pytest
-from py._path.local import LocalPath
+import zipfile
 
 # import document libraries
+import lxml.etree
 from translate.translate_base import (
     load_workbook,
     Document,
@@ -25,32 +26,12 @@ from translate.translate_base import (
     # LANGUAGE_PROPERTIES,
     # TRANSLATION_RULES,
 )
+from translate.tests.conftest import mock_batch_translation, mock_response
 
 
 
 # TODO: move tests around to reflect where the methods being tested now reside
 
-mock_dict = json.load(open(os.path.join(LocalPath(os.path.split(__file__)[0]).join("data"), 'mock_translations.json')))
-
-
-def mock_session(*args, **kwargs):
-    return
-
-
-def mock_response(*args, **kwargs):
-    return [{'language': 'af', 'name': 'Afrikaans'}]
-
-
-def mock_translation(self, string):
-    return {'translatedText': mock_dict[string]}
-
-
-@pytest.fixture(autouse=True)
-def mock_Client(monkeypatch):
-    from google.cloud.translate import Client
-    monkeypatch.setattr(Client, 'from_service_account_json', staticmethod(mock_session))
-    monkeypatch.setattr(Client, 'get_languages', mock_response)
-
 
 @pytest.fixture
 def TRANSLATION_RULES():
@@ -99,13 +80,6 @@ def prepare_history(datadir):
     return history
 
 
-@pytest.fixture
-def GoogleTranslate(monkeypatch):
-    from translate.translate_base import GoogleTranslate
-    monkeypatch.setattr(GoogleTranslate, 'request_translation', mock_translation)
-    return GoogleTranslate
-
-
 from docx.shared import RGBColor
 lavender = RGBColor(0xff, 0x99, 0xcc)
 
@@ -172,6 +146,60 @@ class TestGoogleTranslate():
         result = [value for (key, value) in sorted(stats[lang_pair].items())]
         assert result == expected_counts
 
+    @pytest.mark.parametrize("target_lang, kwargs, strings",
+                             [
+                                 ("fr", {'source_lang': 'en'}, ('one', 'two', 'three', 'two', 'two', '')),
+                                 ("ja", {'online': True}, ('3 &lt; 5', 'Red/Yellow/Green/Grey', '3 &lt; 5')),
+                                 ("fr", {'online': False}, ('one', '', 'one', 'middle', '')),
+                             ]
+                             )
+    def test_translate_many(self, GoogleTranslate, target_lang, kwargs, strings):
+        serial = GoogleTranslate(CREDS, target_lang, **kwargs)
+        expected = [serial.translate(string) for string in strings]
+        serial.update_stats()
+        babelfish = GoogleTranslate(CREDS, target_lang, **kwargs)
+        result = babelfish.translate_many(strings)
+        babelfish.update_stats()
+        assert result == expected
+        assert babelfish.translated == serial.translated
+        assert babelfish.stats == serial.stats
+
+    @pytest.mark.parametrize("threads, exp_threads", [(1, 1), (8, 8), (0, 1), (100, 16)])
+    def test_threaded_translate_many(self, GoogleTranslate, monkeypatch, threads, exp_threads):
+        import threading
+        import time
+        from translate.translate_base import BATCH_LIMITS
+        monkeypatch.setitem(BATCH_LIMITS, 'segments', 1)
+        callers = set()
+
+        def slow_batch_translation(self, strings):
+            time.sleep(0.01)
+            callers.add(threading.current_thread().name)
+            return mock_batch_translation(self, strings)
+
+        monkeypatch.setattr(GoogleTranslate, 'request_batch', slow_batch_translation)
+        strings = ('one', 'two', 'three', 'two', 'four', 'five', '', 'one')
+        babelfish = GoogleTranslate(CREDS, 'fr', source_lang='en', threads=threads)
+        assert babelfish.threads == exp_threads
+        result = babelfish.translate_many(strings)
+        assert [each.lower() for each in result] == ['un', 'deux', 'trois', 'deux', 'quatre', 'cinq', '', 'un']
+        assert (babelfish.cloud_requests, babelfish.dict_hits, babelfish.empty_strings) == (5, 2, 1)
+        assert (len(callers) > 1) == (exp_threads > 1)
+
+    @pytest.mark.parametrize("limits, strings, expected",
+                             [
+                                 ({'segments': 2, 'characters': 100}, ('a', 'b', 'c'), [['a', 'b'], ['c']]),
+                                 ({'segments': 10, 'characters': 5}, ('abc', 'de', 'f', 'ghijkl'),
+                                  [['abc', 'de'], ['f'], ['ghijkl']]),
+                             ]
+                             )
+    def test_batches(self, GoogleTranslate, monkeypatch, limits, strings, expected):
+        from translate.translate_base import BATCH_LIMITS
+        monkeypatch.setitem(BATCH_LIMITS, 'segments', limits['segments'])
+        monkeypatch.setitem(BATCH_LIMITS, 'characters', limits['characters'])
+        babelfish = GoogleTranslate(CREDS, 'fr', online=False)
+        assert list(babelfish.batches(strings)) == expected
+
     @pytest.mark.parametrize("target_lang, kwargs, hist_given, hist_exists, use_hist, len_hist",
                              [
                                  ("fr", {'source_lang': 'en'}, True, False, True, 0),
@@ -245,6 +273,17 @@ class TestGoogleTranslate():
         if os.path.exists(babelfish.history_file):
             os.remove(babelfish.history_file)
 
+    def test_lazy_client(self, GoogleTranslate, monkeypatch):
+        from google.cloud.translate import Client
+        created = []
+        monkeypatch.setattr(Client, 'from_service_account_json', staticmethod(lambda *args, **kwargs: created.append(
+            (args, kwargs)) or 'client'))
+        babelfish = GoogleTranslate('no such credentials.json', 'fr', online=False)
+        assert babelfish.translate('one') == 'fr(one)'
+        assert created == []
+        assert babelfish.client == babelfish.client == 'client'
+        assert created == [(('no such credentials.json',), {})]
+
 
 @pytest.fixture
 def TranslateBase():
@@ -313,6 +352,23 @@ class TestTranslateBase():
         assert tg.cross_check == exp_cross_check
         assert len(tg.translator.translated) == exp_len_trans
 
+    @pytest.mark.parametrize('multi_line, preserve_whitespace, text, lines, exp_text',
+                             [
+                                 (True, False, 'one\ntwo', ['one', 'two'], 'fr(one)\nfr(two)'),
+                                 (False, False, 'one\ntwo', ['one\ntwo'], 'fr(one\ntwo)'),
+                                 (False, True, '  one two\n', ['one two'], '  fr(one two)\n'),
+                             ]
+                             )
+    def test_collect_and_write_back(self, GoogleTranslate, TranslateBase, datadir,
+                                    multi_line, preserve_whitespace, text, lines, exp_text):
+        babelfish = GoogleTranslate(CREDS, 'fr', online=False)
+        tg = TranslateBase(datadir, 'test_textfile.txt', babelfish)
+        document = ['unchanged', text]
+        tg.collect(document, 1, multi_line=multi_line, preserve_whitespace=preserve_whitespace)
+        assert tg.source_lines() == lines
+        tg.write_back(babelfish.translate_many(tg.source_lines()))
+        assert document == ['unchanged', exp_text]
+
     @pytest.mark.parametrize('target_lang, bf_kwargs, '
                              'filename, tg_kwargs, '
                              'altb_fname, altb_kwargs, exp_new_name',
@@ -390,6 +446,149 @@ class TestTranslateText():
         if os.path.exists(os.path.join(datadir, target)):
             os.remove(os.path.join(datadir, target))
 
+    @pytest.mark.parametrize('target_lang, filename, src_lang, targets, exp_lines',
+                             [
+                                 ('fr', 'test_textfile.txt', 'en', ('test_textfile_fr.txt', 'test_textfile_fr_en.txt'),
+                                  (['fr(List)\n', 'fr(* Eggs)\n'], ['en(fr(List))\n', 'en(fr(* Eggs))\n'])),
+                             ]
+                             )
+    def test_cross_check(self, GoogleTranslate, TranslateText, datadir, target_lang, filename,
+                         src_lang, targets, exp_lines):
+        babelfish = GoogleTranslate(CREDS, target_lang, source_lang=src_lang, online=False)
+        TranslateText(datadir, filename, babelfish, cross_check=True)
+        for target, lines in zip(targets, exp_lines):
+            with open(os.path.join(datadir, target)) as f:
+                text = f.readlines()
+            assert [text[0], text[2]] == lines
+            os.remove(os.path.join(datadir, target))
+
+    @pytest.mark.parametrize('stream', [False, True])
+    def test_cross_check_in_memory(self, GoogleTranslate, TranslateText, tmp_path, monkeypatch, stream):
+        from translate.translate_base import TranslateTextStream
+        translate_class = TranslateTextStream if stream else TranslateText
+        extract, extracted = translate_class.extract, []
+        monkeypatch.setattr(translate_class, 'extract', lambda self: extracted.append(self.source) or extract(self))
+        (tmp_path / 'first.txt').write_text('List\none\n\n')
+        babelfish = GoogleTranslate(CREDS, 'fr', source_lang='en', online=False)
+        translate_class(str(tmp_path), 'first.txt', babelfish, cross_check=True)
+        assert (tmp_path / 'first_fr_en.txt').read_text() == 'en(fr(List))\nen(fr(one))\n\n'
+        # the translations are translated back as they are, without extracting them again from the output
+        assert extracted == ['first.txt']
+        assert (babelfish.target_lang, babelfish.source_lang) == ('fr', 'en')
+        assert babelfish.stats['fr-en']['dummy_text'] == 2
+
+    def test_batch(self, GoogleTranslate, TranslateText, tmp_path):
+        from translate.translate_base import TranslateBatch
+        (tmp_path / 'first.txt').write_text('List\none\n')
+        (tmp_path / 'second.txt').write_text('one\ntwo\n')
+        babelfish = GoogleTranslate(CREDS, 'fr', source_lang='en', online=False)
+        documents = [TranslateText(str(tmp_path), name, babelfish, cross_check=True, defer=True)
+                     for name in ('first.txt', 'second.txt')]
+        assert not (tmp_path / 'first_fr.txt').exists()
+        TranslateBatch(documents, babelfish).execute()
+        assert (tmp_path / 'first_fr.txt').read_text() == 'fr(List)\nfr(one)\n'
+        assert (tmp_path / 'second_fr.txt').read_text() == 'fr(one)\nfr(two)\n'
+        assert (tmp_path / 'second_fr_en.txt').read_text() == 'en(fr(one))\nen(fr(two))\n'
+        assert babelfish.stats['en-fr']['dict_hits'] == 1
+        assert babelfish.stats['en-fr']['dummy_text'] == 3
+
+
+class TestTranslateTextStream():
+    @pytest.mark.parametrize('window', [1, 3, 1024])
+    def test_translate(self, GoogleTranslate, TranslateText, datadir, monkeypatch, window):
+        from translate.translate_base import TranslateTextStream
+        serial = GoogleTranslate(CREDS, 'fr', source_lang='en')
+        TranslateText(datadir, 'test_textfile.txt', serial)
+        with open(os.path.join(datadir, 'test_textfile_fr.txt')) as f:
+            expected = f.read()
+
+        windows = []
+        extract = TranslateTextStream.extract
+        monkeypatch.setattr(TranslateTextStream, 'extract', lambda self: windows.append(len(self.text)) or extract(self))
+        babelfish = GoogleTranslate(CREDS, 'fr', source_lang='en')
+        TranslateTextStream(datadir, 'test_textfile.txt', babelfish, window=window)
+        with open(os.path.join(datadir, 'test_textfile_fr.txt')) as f:
+            assert f.read() == expected
+        os.remove(os.path.join(datadir, 'test_textfile_fr.txt'))
+        assert max(windows) == min(window, sum(windows))
+        assert babelfish.translated == serial.translated
+        assert babelfish.stats == serial.stats
+
+    def test_languages_and_cross_check(self, GoogleTranslate, datadir):
+        from translate.translate_base import TranslateTextStream
+        babelfish = [GoogleTranslate(CREDS, lang, source_lang='en', online=False) for lang in ('fr', 'ja')]
+        TranslateTextStream(datadir, 'test_textfile.txt', babelfish, cross_check=True, window=4)
+        for target, first_line in (('test_textfile_fr.txt', 'fr(List)\n'), ('test_textfile_ja.txt', 'ja(List)\n'),
+                                   ('test_textfile_fr_en.txt', 'en(fr(List))\n'),
+                                   ('test_textfile_ja_en.txt', 'en(ja(List))\n')):
+            with open(os.path.join(datadir, target)) as f:
+                assert f.readline() == first_line
+            os.remove(os.path.join(datadir, target))
+        assert sorted(babelfish[1].stats) == ['en-ja', 'ja-en']
+
+
+@pytest.fixture
+def webpage(tmp_path):
+    body = ''.join('<div class="c%d"><p>Para %d <i>it</i> tail</p><!-- note --> text %d</div>\n' % (i, i % 20, i)
+                   for i in range(200))
+    (tmp_path / 'page.html').write_text(
+        '<!DOCTYPE html>\n<html lang="en">\n<head><meta charset="utf-8"><title>A title</title>\n'
+        '<style>p {color: red}</style></head>\n<body class="x">\nBody text\n%s'
+        '<script>var a = 1;</script> after script\n</body>\n</html>\n' % body
+    )
+    return tmp_path
+
+
+class TestTranslateHtmlStream():
+    @pytest.mark.parametrize('window', [1, 7, 1024])
+    def test_translate(self, GoogleTranslate, webpage, monkeypatch, window):
+        from translate.translate_base import TranslateHtml, TranslateHtmlStream
+        serial = GoogleTranslate(CREDS, 'fr', source_lang='en', online=False)
+        TranslateHtml(str(webpage), 'page.html', serial)
+        expected = (webpage / 'page_fr.html').read_bytes()
+        (webpage / 'page_fr.html').unlink()
+
+        held = []
+        write_window = TranslateHtmlStream.write_window
+        monkeypatch.setattr(TranslateHtmlStream, 'write_window',
+                            lambda self, *args: held.append(len(self.segments)) or write_window(self, *args))
+        babelfish = GoogleTranslate(CREDS, 'fr', source_lang='en', online=False)
+        TranslateHtmlStream(str(webpage), 'page.html', babelfish, window=window)
+        assert (webpage / 'page_fr.html').read_bytes() == expected
+        assert b'fr(Body text)' in expected and b'fr(after script)' not in expected
+        assert max(held) <= window + 4
+        assert babelfish.stats == serial.stats
+
+    def test_wrapper_element(self, GoogleTranslate, tmp_path, monkeypatch):
+        from translate.translate_base import TranslateHtml, TranslateHtmlStream
+        rows = ''.join('<tr><td>Cell %d</td><td><b>bold</b> %d</td></tr>' % (i, i) for i in range(100))
+        (tmp_path / 'wrapped.html').write_text(
+            '<html><body><div id="wrapper">%s<table>%s</table></div></body></html>\n' % (
+                ''.join('<p>Para %d</p>\n' % i for i in range(300)), rows)
+        )
+        TranslateHtml(str(tmp_path), 'wrapped.html', GoogleTranslate(CREDS, 'fr', source_lang='en', online=False))
+        expected = (tmp_path / 'wrapped_fr.html').read_bytes()
+        (tmp_path / 'wrapped_fr.html').unlink()
+
+        held = []
+        write_window = TranslateHtmlStream.write_window
+        monkeypatch.setattr(TranslateHtmlStream, 'write_window',
+                            lambda self, *args: held.append(len(self.segments)) or write_window(self, *args))
+        babelfish = GoogleTranslate(CREDS, 'fr', source_lang='en', online=False)
+        TranslateHtmlStream(str(tmp_path), 'wrapped.html', babelfish, window=8)
+        assert (tmp_path / 'wrapped_fr.html').read_bytes() == expected
+        # the paragraphs and rows inside the wrapper are released as they are parsed, not held to its end
+        assert len(held) > 50 and max(held) <= 8 + 4
+
+    def test_languages_and_cross_check(self, GoogleTranslate, webpage):
+        from translate.translate_base import TranslateHtmlStream
+        babelfish = [GoogleTranslate(CREDS, lang, source_lang='en', online=False) for lang in ('fr', 'ja')]
+        TranslateHtmlStream(str(webpage), 'page.html', babelfish, cross_check=True, window=16)
+        assert b'<title>ja(A title)</title>' in (webpage / 'page_ja.html').read_bytes()
+        assert b'<i>fr(it)</i>' in (webpage / 'page_fr.html').read_bytes()
+        assert b'<p>en(ja(Para 3)) <i>en(ja(it))</i>' in (webpage / 'page_ja_en.html').read_bytes()
+        assert sorted(babelfish[0].stats) == ['en-fr', 'fr-en']
+
 
 @pytest.fixture
 def TranslateExcel():
@@ -415,6 +614,110 @@ class TestTranslateExcel():
             os.remove(os.path.join(datadir, 'test_spreadsheet_ja.xlsx'))
 
 
+class TestTranslateExcelXml():
+    def test_translate(self, TranslateExcel, GoogleTranslate, datadir):
+        from translate.translate_base import TranslateExcelXml
+        serial = GoogleTranslate(CREDS, 'ja', source_lang='en', online=False)
+        TranslateExcel(datadir, 'test_spreadsheet.xlsx', serial)
+        expected = load_workbook(os.path.join(datadir, 'test_spreadsheet_ja.xlsx'))
+        os.remove(os.path.join(datadir, 'test_spreadsheet_ja.xlsx'))
+
+        babelfish = GoogleTranslate(CREDS, 'ja', source_lang='en', online=False)
+        TranslateExcelXml(datadir, 'test_spreadsheet.xlsx', babelfish)
+        wb = load_workbook(os.path.join(datadir, 'test_spreadsheet_ja.xlsx'))
+        for sheetname in expected.sheetnames:
+            assert [[cell.value for cell in row] for row in wb[sheetname]] == (
+                [[cell.value for cell in row] for row in expected[sheetname]])
+        # each distinct string is translated once, rather than once per cell
+        assert serial.stats['en-ja']['dict_hits'] == 6
+        assert babelfish.stats['en-ja'] == dict(serial.stats['en-ja'], dict_hits=0)
+
+        with zipfile.ZipFile(os.path.join(datadir, 'test_spreadsheet.xlsx')) as source, \
+                zipfile.ZipFile(os.path.join(datadir, 'test_spreadsheet_ja.xlsx')) as target:
+            assert target.namelist() == source.namelist()
+            changed = [name for name in source.namelist() if source.read(name) != target.read(name)]
+        assert changed == ['xl/sharedStrings.xml']
+        os.remove(os.path.join(datadir, 'test_spreadsheet_ja.xlsx'))
+
+    @pytest.mark.parametrize('condense, expected',
+                             [
+                                 (False, ['fr(Rich)', ' fr(text) ', 'fr(plain)']),
+                                 (True, ['fr(Rich text) ', None, 'fr(plain)']),
+                             ])
+    def test_rich_text(self, GoogleTranslate, datadir, tmp_path, condense, expected):
+        from translate.translate_base import TranslateExcelXml
+        strings = ('<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+                   '<sst xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main" count="2" uniqueCount="2">'
+                   '<si><r><rPr><b/></rPr><t>Rich</t></r><r><t xml:space="preserve"> text </t></r></si>'
+                   '<si><t>plain</t><rPh sb="0" eb="1"><t>phonetic</t></rPh></si></sst>')
+        with zipfile.ZipFile(os.path.join(datadir, 'test_spreadsheet.xlsx')) as source, \
+                zipfile.ZipFile(str(tmp_path / 'rich.xlsx'), 'w') as target:
+            for info in source.infolist():
+                target.writestr(info, strings if info.filename == 'xl/sharedStrings.xml' else source.read(info))
+
+        babelfish = GoogleTranslate(CREDS, 'fr', source_lang='en', online=False)
+        TranslateExcelXml(str(tmp_path), 'rich.xlsx', babelfish, condense=condense)
+        with zipfile.ZipFile(str(tmp_path / 'rich_fr.xlsx')) as translated:
+            sst = lxml.etree.fromstring(translated.read('xl/sharedStrings.xml'))
+        texts = sst.findall('.//{http://schemas.openxmlformats.org/spreadsheetml/2006/main}t')
+        assert [text.text for text in texts] == expected + ['phonetic']
+        assert texts[0].get('{http://www.w3.org/XML/1998/namespace}space') == ('preserve' if condense else None)
+
+
+class TestTranslateExcelStream():
+    @pytest.mark.parametrize('window', [1, 4, 1024])
+    def test_translate(self, TranslateExcel, GoogleTranslate, datadir, window):
+        from translate.translate_base import TranslateExcelStream
+        serial = GoogleTranslate(CREDS, 'ja', source_lang='en', online=False)
+        TranslateExcel(datadir, 'test_spreadsheet.xlsx', serial)
+        expected = load_workbook(os.path.join(datadir, 'test_spreadsheet_ja.xlsx'))
+        os.remove(os.path.join(datadir, 'test_spreadsheet_ja.xlsx'))
+
+        babelfish = GoogleTranslate(CREDS, 'ja', source_lang='en', online=False)
+        TranslateExcelStream(datadir, 'test_spreadsheet.xlsx', babelfish, window=window)
+        wb = load_workbook(os.path.join(datadir, 'test_spreadsheet_ja.xlsx'))
+        assert wb.sheetnames == expected.sheetnames
+        for sheetname in expected.sheetnames:
+            assert [[cell.value for cell in row] for row in wb[sheetname]] == (
+                [[cell.value for cell in row] for row in expected[sheetname]])
+        assert wb['Sheet1']['A1'].font.b == expected['Sheet1']['A1'].font.b
+        assert babelfish.stats == serial.stats
+        os.remove(os.path.join(datadir, 'test_spreadsheet_ja.xlsx'))
+
+    def test_numeric_rows(self, GoogleTranslate, tmp_path, monkeypatch):
+        from openpyxl import Workbook
+        from translate.translate_base import TranslateExcelStream
+        workbook = Workbook()
+        workbook.active.append(['Heading', 'Total'])
+        for i in range(500):
+            workbook.active.append([i, i * 2.5] if i % 100 else ['Subtotal', i])
+        workbook.save(str(tmp_path / 'numbers.xlsx'))
+
+        held = []
+        write_window = TranslateExcelStream.write_window
+        monkeypatch.setattr(TranslateExcelStream, 'write_window',
+                            lambda self, *args: held.append(len(self.rows)) or write_window(self, *args))
+        babelfish = GoogleTranslate(CREDS, 'fr', source_lang='en', online=False)
+        TranslateExcelStream(str(tmp_path), 'numbers.xlsx', babelfish, window=16)
+        rows = [[cell.value for cell in row] for row in load_workbook(str(tmp_path / 'numbers_fr.xlsx')).active]
+        assert rows[0] == ['fr(Heading)', 'fr(Total)'] and rows[101] == ['fr(Subtotal)', 100]
+        assert rows[-1] == [499, 1247.5]
+        # the rows are written a window at a time, though few of them hold any text
+        assert len(rows) == 501 and max(held) <= 16
+
+    def test_languages_and_cross_check(self, GoogleTranslate, datadir):
+        from translate.translate_base import TranslateExcelStream
+        babelfish = [GoogleTranslate(CREDS, lang, source_lang='en', online=False) for lang in ('fr', 'ja')]
+        TranslateExcelStream(datadir, 'test_spreadsheet.xlsx', babelfish, cross_check=True, window=2)
+        for target, heading in (('test_spreadsheet_fr.xlsx', 'fr(Heading)'), ('test_spreadsheet_ja.xlsx', 'ja(Heading)'),
+                                ('test_spreadsheet_fr_en.xlsx', 'en(fr(Heading))'),
+                                ('test_spreadsheet_ja_en.xlsx', 'en(ja(Heading))')):
+            wb = load_workbook(os.path.join(datadir, target))
+            assert wb['Sheet1']['A1'].value == heading
+            assert wb['Sheet2']['A4'].value == 25
+            os.remove(os.path.join(datadir, target))
+
+
 @pytest.fixture
 def TranslateDocx():
     from translate.translate_base import TranslateDocx
@@ -465,6 +768,29 @@ class TestTranslateDocx():
             if os.path.exists(os.path.join(filepath, file)):
                 os.remove(os.path.join(filepath, file))
 
+    def test_multiple_target_languages(self, GoogleTranslate, TranslateDocx, datadir):
+        filename = 'test_document.docx'
+        single = GoogleTranslate(CREDS, 'fr', source_lang='en', online=False)
+        TranslateDocx(datadir, filename, single, condense=True)
+        expected = [p.text for p in Document(os.path.join(datadir, 'test_document_fr.docx')).paragraphs]
+        os.remove(os.path.join(datadir, 'test_document_fr.docx'))
+
+        babelfish = [GoogleTranslate(CREDS, lang, source_lang='en', online=False) for lang in ('ja', 'fr')]
+        td = TranslateDocx(datadir, filename, babelfish, condense=True, cross_check=True)
+        assert td.targets == ['test_document_ja.docx', 'test_document_fr.docx']
+        ja = Document(os.path.join(datadir, 'test_document_ja.docx'))
+        fr = Document(os.path.join(datadir, 'test_document_fr.docx'))
+        assert [p.text for p in fr.paragraphs] == expected
+        assert ja.paragraphs[0].text.startswith('ja(')
+        assert (ja.core_properties.language, ja.styles["Normal"].font.name) == ('Japanese', 'Hiragino Sans W3')
+        assert (fr.core_properties.language, fr.styles["Normal"].font.name) == ('French', None)
+        assert Document(os.path.join(datadir, 'test_document_fr_en.docx')).paragraphs[0].text.startswith('en(fr(')
+        assert babelfish[0].stats['en-ja'] == single.stats['en-fr']
+        assert sorted(babelfish[1].stats) == ['en-fr', 'fr-en']
+        for file in ('test_document_ja.docx', 'test_document_fr.docx',
+                     'test_document_ja_en.docx', 'test_document_fr_en.docx'):
+            os.remove(os.path.join(datadir, file))
+
     # These two tests relate to methods in TranslateBase
     @pytest.mark.parametrize("run_list, condensed_run_list, run_count",
                              [
@@ -613,11 +939,25 @@ class TestTranslateDocx():
         args.extend([td.document.paragraphs[0].style, style_props])
         result = td.same_style_runs(*args)
         assert result == same
+        paragraph = td.document.paragraphs[0]
+        assert (td.run_style(args[0], paragraph) == td.run_style(args[1], paragraph)) == same
 
         for file in (filename, 'style_test_ja.docx'):
             if os.path.exists(os.path.join(filepath, file)):
                 os.remove(os.path.join(filepath, file))
 
+    def test_paragraph_style_cache(self, TranslateDocx, GoogleTranslate, datadir, monkeypatch):
+        from docx.text.paragraph import Paragraph
+        lookups = []
+        style = Paragraph.style
+        monkeypatch.setattr(Paragraph, 'style', property(lambda p: lookups.append(p._p.style) or style.fget(p),
+                                                         style.fset))
+        babelfish = GoogleTranslate(CREDS, 'fr', source_lang='en', online=False)
+        td = TranslateDocx(datadir, 'test_document.docx', babelfish)
+        os.remove(os.path.join(datadir, 'test_document_fr.docx'))
+        assert sorted(lookups, key=str) == sorted(td.style_cache, key=str)
+        assert all(name for (name, _) in td.style_cache.values())
+
     def setattr_drill(self, o, attr_str, value):
         if '.' in attr_str:
             attr_list = attr_str.split('.')
@@ -626,6 +966,60 @@ class TestTranslateDocx():
             setattr(o, attr_str, value)
 
 
+def docx_runs(document):
+    paragraphs = list(document.paragraphs)
+    for table in document.tables:
+        for row in table.rows:
+            for cell in row.cells:
+                paragraphs.extend(cell.paragraphs)
+    return [[run.text for run in paragraph.runs] for paragraph in paragraphs]
+
+
+class TestTranslateDocxXml():
+    @pytest.mark.parametrize('target_lang, condense', [('fr', False), ('ja', False), ('ja', True)])
+    def test_translate(self, GoogleTranslate, TranslateDocx, datadir, target_lang, condense):
+        from translate.translate_base import TranslateDocxXml
+        target = os.path.join(datadir, 'test_document_%s.docx' % target_lang)
+        serial = GoogleTranslate(CREDS, target_lang, source_lang='en', online=False)
+        TranslateDocx(datadir, 'test_document.docx', serial, condense=condense)
+        expected = Document(target)
+        os.remove(target)
+
+        babelfish = GoogleTranslate(CREDS, target_lang, source_lang='en', online=False)
+        TranslateDocxXml(datadir, 'test_document.docx', babelfish, condense=condense)
+        document = Document(target)
+        assert docx_runs(document) == docx_runs(expected)
+        assert (document.core_properties.language, document.styles["Normal"].font.name) == (
+            expected.core_properties.language, expected.styles["Normal"].font.name)
+        # the table of contents is in hyperlinks, which python-docx leaves out
+        assert babelfish.stats['en-%s' % target_lang]['history'] > serial.stats['en-%s' % target_lang]['history']
+        with zipfile.ZipFile(os.path.join(datadir, 'test_document.docx')) as source, zipfile.ZipFile(target) as output:
+            assert output.namelist() == source.namelist()
+            assert output.read('word/media/image1.png') == source.read('word/media/image1.png')
+        os.remove(target)
+
+    def test_headers_nested_tables_and_ignored_styles(self, GoogleTranslate, tmp_path):
+        from docx.enum.style import WD_STYLE_TYPE
+        from translate.translate_base import TranslateDocxXml
+        document = Document()
+        document.sections[0].header.paragraphs[0].text = 'Page header'
+        document.sections[0].footer.paragraphs[0].text = 'Page footer'
+        document.add_paragraph('Body text')
+        document.styles.add_style('Code', WD_STYLE_TYPE.PARAGRAPH)
+        document.add_paragraph('x = 1', style='Code')
+        document.add_table(rows=1, cols=1).cell(0, 0).add_table(rows=1, cols=1).cell(0, 0).text = 'Nested cell'
+        document.save(str(tmp_path / 'sections.docx'))
+
+        babelfish = GoogleTranslate(CREDS, 'fr', source_lang='en', online=False)
+        TranslateDocxXml(str(tmp_path), 'sections.docx', babelfish, cross_check=True)
+        for target, wrap in (('sections_fr.docx', 'fr(%s)'), ('sections_fr_en.docx', 'en(fr(%s))')):
+            translated = Document(str(tmp_path / target))
+            assert translated.sections[0].header.paragraphs[0].text == wrap % 'Page header'
+            assert translated.sections[0].footer.paragraphs[0].text == wrap % 'Page footer'
+            assert [paragraph.text for paragraph in translated.paragraphs[:2]] == [wrap % 'Body text', 'x = 1']
+            assert translated.tables[0].cell(0, 0).tables[0].cell(0, 0).text == wrap % 'Nested cell'
+
+
 @pytest.fixture
 def TranslatePptx():
     from translate.translate_base import TranslatePptx
@@ -738,6 +1132,31 @@ class TestParser():
                                  ('translate -n -p 20 textfile.txt fr',
                                   {'online': False, 'show': 20},
                                   pytest.warns, None),
+                                 ('translate -m 8 textfile.txt fr',
+                                  {'threads': 8},
+                                  pytest.warns, None),
+                                 ('translate --stream textfile.txt fr',
+                                  {'stream': True},
+                                  pytest.warns, None),
+                                 ('translate --xml textfile.txt fr',
+                                  {'xml': True},
+                                  pytest.warns, None),
+                                 ('translate -w 4 textfile.txt fr',
+                                  {'processes': 4},
+                                  pytest.warns, None),
+                                 ('translate --chars_per_minute 6000000 --requests_per_second 10 --retries 2 '
+                                  'textfile.txt fr',
+                                  {'chars_per_minute': 6000000, 'requests_per_second': 10, 'retries': 2},
+                                  pytest.warns, None),
+                                 ('translate --endpoint http://127.0.0.1:8089 textfile.txt fr',
+                                  {'endpoint': 'http://127.0.0.1:8089'},
+                                  pytest.warns, None),
+                                 ('translate --previous textfile_v1.txt textfile.txt fr',
+                                  {'previous': 'textfile_v1.txt'},
+                                  pytest.warns, None),
+                                 ('translate --budget 100000 textfile.txt fr',
+                                  {'budget': 100000, 'online': True},
+                                  pytest.warns, None),
                                  ('translate -d textfile_fr.txt  textfile.txt fr -l',
                                   {'target': 'textfile_fr.txt', 'list_langs': True},
                                   pytest.warns, None),
@@ -775,6 +1194,16 @@ class TestListLanguages():
         out, err = capsys.readouterr()
         assert out == 'Afrikaans (af)\n'
 
+    def test_default_credentials(self, ListLanguages, capsys, monkeypatch):
+        from google.cloud.translate_v2 import Client
+        from translate import __main__ as module
+        created = []
+        monkeypatch.setattr(Client, '__init__', lambda self, **kwargs: created.append(kwargs))
+        # without GOOGLE_APPLICATION_CREDENTIALS, the client is made as the translators make theirs
+        monkeypatch.setattr(module, 'CREDS', None)
+        ListLanguages()
+        assert created == [{}] and capsys.readouterr()[0] == 'Afrikaans (af)\n'
+
 
 @pytest.fixture
 def correct_rel_path():
@@ -790,10 +1219,10 @@ def correct_rel_path():
 @pytest.mark.parametrize('arg_list, log_level, category, error, bf_kwargs, filename',
                          [
                              (['data/test_textfile.txt', 'fr', '-v'], logging.INFO, pytest.warns, None,
-                              dict(history=None, online=True, show=0, source_lang=None),
+                              dict(history=None, online=True, show=0, source_lang=None, threads=1),
                               'test_textfile.txt'),
                              (['textfile.txt', 'fr'], logging.WARNING, pytest.warns, UserWarning,
-                              dict(history=None, online=True, show=0, source_lang=None),
+                              dict(history=None, online=True, show=0, source_lang=None, threads=1),
                               None),
                          ]
                          )
@@ -819,6 +1248,83 @@ def test_main(GoogleTranslate, TranslateBase, TranslateText, datadir, correct_re
     if os.path.exists(filename):
         os.remove(filename)
 
+@pytest.mark.parametrize('history, lang, expected',
+                         [
+                             (None, 'fr', None),
+                             ('history.json', 'fr', 'history_fr.json'),
+                             ('history', 'ja', 'history_ja'),
+                             ('memory.db', 'fr', 'memory.db'),
+                         ])
+def test_language_history(history, lang, expected):
+    from translate.__main__ import language_history
+    assert language_history(history, lang) == expected
+
+
+def test_main_multiple_languages(GoogleTranslate, datadir, capsys):
+    from translate.__main__ import main
+    main(arg_list=[os.path.join(datadir, 'test_textfile.txt'), 'fr,ja', '-n'])
+    out, err = capsys.readouterr()
+    for lang in ('fr', 'ja'):
+        target = os.path.join(datadir, 'test_textfile_%s.txt' % lang)
+        with open(target) as f:
+            assert f.readline() == '%s(List)\n' % lang
+        os.remove(target)
+        assert 'None-%s' % lang in out
+
+
+def test_find_files(tmp_path):
+    from translate.__main__ import find_files
+    for name in ('a.txt', 'a_fr.txt', 'b.docx', 'c.pdf', 'sub/d.txt'):
+        (tmp_path / name).parent.mkdir(exist_ok=True)
+        (tmp_path / name).write_text('List\n')
+    extensions = ('txt', 'docx')
+    assert [f for (_, f) in find_files(str(tmp_path), extensions, ['fr'])] == ['a.txt', 'b.docx']
+    assert [f for (_, f) in find_files(str(tmp_path / '**' / '*.txt'), extensions, ['fr'])] == ['a.txt', 'd.txt']
+    assert find_files(str(tmp_path / '*.xlsx'), extensions, ['fr']) == []
+    # the output of an earlier run into another language is skipped too, beside its source
+    for name in ('b_ja.docx', 'b_ja_en.docx', 'e_final.txt', 'e.txt', 'f_ja.txt', 'g_zh-TW.txt', 'g.txt'):
+        (tmp_path / name).write_text('List\n')
+    assert [f for (_, f) in find_files(str(tmp_path), extensions, ['fr'])] == [
+        'a.txt', 'b.docx', 'e.txt', 'e_final.txt', 'f_ja.txt', 'g.txt']
+
+
+@pytest.mark.parametrize('options, expected', [
+    (['-n'], ['fr(List)\nfr(one)\n', 'fr(one)\nfr(two)\n']),
+    (['-n', '--stream'], ['fr(List)\nfr(one)\n', 'fr(one)\nfr(two)\n']),
+    # online, so that the files go through the pipeline to the (mocked) cloud
+    (['-w', '2'], ['liste\nun\n', 'un\ndeux\n']),
+])
+def test_main_batch(GoogleTranslate, tmp_path, capsys, options, expected):
+    from translate.__main__ import main
+    from translate.translate_pipeline import TranslatePipeline
+    (tmp_path / 'first.txt').write_text('List\none\n')
+    (tmp_path / 'second.txt').write_text('one\ntwo\n')
+    with mock.patch.object(TranslatePipeline, 'execute', autospec=True,
+                           side_effect=TranslatePipeline.execute) as pipeline:
+        main(arg_list=[str(tmp_path), 'fr'] + options)
+    out, err = capsys.readouterr()
+    assert 'translated 2 files' in out
+    assert pipeline.called == ('-w' in options)
+    assert (tmp_path / 'first_fr.txt').read_text() == expected[0]
+    assert (tmp_path / 'second_fr.txt').read_text() == expected[1]
+
+
+def test_main_batch_cross_check_stats(GoogleTranslate, tmp_path, capsys, monkeypatch):
+    from translate.__main__ import main
+    monkeypatch.setattr(GoogleTranslate, 'request_batch', lambda self, strings: [
+        {'translatedText': '%s(%s)' % (self.target_lang, string)} for string in strings])
+    (tmp_path / 'first.txt').write_text('List\none\n')
+    (tmp_path / 'second.txt').write_text('one\ntwo\n')
+    reports = []
+    for options in ([], ['--stream']):
+        main(arg_list=[str(tmp_path), 'fr,ja', '-s', 'en', '-x'] + options)
+        out = capsys.readouterr()[0]
+        reports.append(out[out.index('statistics'):])
+    # every streamed document is checked by the same reverse translators, as in the batch
+    assert reports[0] == reports[1]
+    assert "statistics for %s translation session fr-en\n    cloud_requests: 3\n" in reports[1]
+
+
 def test_init():
     from translate import __main__ as module
     with mock.patch.object(module, "main", return_value=42):
@@ -827,3 +1333,15 @@ def test_init():
                 module.init()
                 assert mock_exit.call_args[0][0] == 42
 
+
+def test_lazy_imports():
+    import subprocess
+    import sys
+    # the cloud and document libraries are left until a translator or a document of their format needs them
+    code = ("import sys; from translate.__main__ import main; "
+            "print([name for name in ('docx', 'pptx', 'openpyxl', 'google.cloud.translate_v2') if name in sys.modules])")
+    env = {key: value for (key, value) in os.environ.items() if key != 'GOOGLE_APPLICATION_CREDENTIALS'}
+    root = os.path.dirname(os.path.dirname(os.path.dirname(os.path.realpath(__file__))))
+    result = subprocess.run([sys.executable, '-c', code], cwd=root, env=env, capture_output=True, text=True,
+                            check=True)
+    assert result.stdout.strip() == '[]'
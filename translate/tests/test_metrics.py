@@ -0,0 +1,93 @@
+# coding: UTF-8
+from __future__ import absolute_import
+from __future__ import unicode_literals
+
+import json
+
+import pytest
+
+from translate.translate_base import CREDS
+
+
+class TestMetrics():
+    @pytest.mark.parametrize("p, expected", [(50, 5), (90, 9), (99, 10), (100, 10), (1, 1)])
+    def test_percentile(self, p, expected):
+        from translate.metrics import percentile
+        assert percentile(list(range(1, 11)), p) == expected
+        assert percentile([], p) is None
+
+    def test_phases_and_requests(self):
+        from translate.metrics import Metrics
+        ticks = iter(range(100))
+        metrics = Metrics(clock=lambda: next(ticks))
+        with metrics.phase('save'):
+            pass
+        with metrics.phase('load'):
+            pass
+        with metrics.phase('load'):
+            pass
+        for seconds in (0.1, 0.4, 0.2, 0.3):
+            metrics.record_request(seconds, 10)
+        metrics.record_request(0.5, 10, failed=True)
+        metrics.record_wait(1.5)
+
+        result = metrics.as_dict()
+        assert list(result['phases']) == ['load', 'save']
+        assert result['phases']['load'] == {'seconds': 2, 'count': 2}
+        assert (result['requests']['count'], result['requests']['failed'], result['requests']['characters']) == (
+            5, 1, 40)
+        assert (result['requests']['p50'], result['requests']['max_latency']) == (0.3, 0.5)
+        assert result['requests']['throttled_seconds'] == 1.5
+        assert 'load' in metrics.report()
+
+        merged = Metrics()
+        merged.merge(metrics)
+        merged.merge(json.loads(json.dumps(metrics.as_dict(latencies=True))))
+        assert merged.phases['load'] == {'seconds': 4, 'count': 4}
+        assert (merged.requests, merged.characters, merged.failed_requests) == (10, 80, 2)
+
+
+class TestDocumentMetrics():
+    def test_phases(self, GoogleTranslate, text_files):
+        from translate.translate_base import TranslateText
+        babelfish = GoogleTranslate(CREDS, 'fr', source_lang='en', online=True)
+        TranslateText(str(text_files), 'first.txt', babelfish)
+        result = babelfish.metrics.as_dict()
+        assert list(result['phases']) == ['load', 'extract', 'translate', 'write_back', 'save']
+        assert all(record['count'] == 1 for record in result['phases'].values())
+        assert (result['requests']['count'], result['requests']['characters']) == (1, 10)
+        assert result['output'] == {'files': 1, 'bytes': (text_files / 'first_fr.txt').stat().st_size}
+
+    @pytest.mark.parametrize("stream", [False, True])
+    def test_batch(self, GoogleTranslate, text_files, stream):
+        from translate.metrics import Metrics
+        from translate.translate_base import TranslateBatch, TranslateText, TranslateTextStream
+        metrics = Metrics()
+        babelfish = [GoogleTranslate(CREDS, lang, source_lang='en', online=False, metrics=metrics)
+                     for lang in ('fr', 'ja')]
+        translate_class = TranslateTextStream if stream else TranslateText
+        documents = [translate_class(str(text_files), filename, babelfish, defer=True)
+                     for filename in ('first.txt', 'second.txt')]
+        if stream:
+            for document in documents:
+                document.execute(document.translate)
+        else:
+            TranslateBatch(documents, babelfish).execute()
+        result = metrics.as_dict()
+        phases = ['stream'] if stream else ['load', 'extract', 'translate', 'write_back', 'save']
+        assert list(result['phases']) == phases
+        assert result['phases'][phases[-1]]['count'] == (2 if stream else 4)
+        assert result['output']['files'] == 4
+        assert result['requests']['count'] == 0
+
+
+def test_main_report(GoogleTranslate, text_files):
+    from translate.__main__ import main
+    report = text_files / 'report.json'
+    main(arg_list=[str(text_files / 'first.txt'), 'fr', '--report', str(report)])
+    result = json.loads(report.read_text())
+    assert list(result['phases']) == ['load', 'extract', 'translate', 'write_back', 'save']
+    assert result['requests']['count'] == 1
+    assert result['output']['files'] == 1
+    assert result['stats']['None-fr']['cloud_requests'] == 3
+    assert result['seconds'] > 0
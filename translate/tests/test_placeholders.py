@@ -0,0 +1,110 @@
+# coding: UTF-8
+from __future__ import absolute_import
+from __future__ import unicode_literals
+
+import asyncio
+
+import pytest
+
+from translate.translate_base import CREDS
+
+
+def echo_translation(self, string):
+    return {'translatedText': 'fr[%s]' % string}
+
+
+def echo_batch_translation(self, strings):
+    self.sent.extend(strings)
+    # a translation that drops the second placeholder, as the cloud occasionally does
+    return [{'translatedText': 'fr[%s]' % string.replace('<x1/>', '') if 'lossy' in string else 'fr[%s]' % string}
+            for string in strings]
+
+
+@pytest.fixture
+def GoogleTranslate(GoogleTranslate, monkeypatch):
+    monkeypatch.setattr(GoogleTranslate, 'request_translation', echo_translation)
+    monkeypatch.setattr(GoogleTranslate, 'request_batch', echo_batch_translation)
+    monkeypatch.setattr(GoogleTranslate, 'sent', [], raising=False)
+    return GoogleTranslate
+
+
+class TestPlaceholders():
+    @pytest.mark.parametrize("string, key, values", [
+        ('Page 12', 'Page <x0/>', ['12']),
+        ('  Total: -1,234.50 on 2024-03-01\n', 'Total: <x0/> on <x1/>', ['-1,234.50', '2024-03-01']),
+        ('Due 31/12/2024, see https://example.com/a?b=1.', 'Due <x0/>, see <x1/>.',
+         ['31/12/2024', 'https://example.com/a?b=1']),
+        ('Write to jane.doe@example.co.uk or call 555 0100', 'Write to <x0/> or call <x1/> <x2/>',
+         ['jane.doe@example.co.uk', '555', '0100']),
+        ('A4 paper, 3rd floor', 'A4 paper, 3rd floor', []),
+        ('Already <x0/> tokenised 5', 'Already <x0/> tokenised 5', []),
+        ('   ', '', []),
+    ])
+    def test_key(self, string, key, values):
+        from translate.placeholders import Placeholders
+        placeholders = Placeholders(string)
+        assert (placeholders.key, placeholders.values) == (key, values)
+        assert placeholders.restore(placeholders.key) == string
+
+    @pytest.mark.parametrize("translation, expected", [
+        ('Page <x1/> de <x0/>', ' Page 4 de 3'),
+        ('Page < x1 /> de <x0 />', ' Page 4 de 3'),
+        ('Page de <x0/>', None),
+        ('Page <x0/> de <x0/>', None),
+    ])
+    def test_restore(self, translation, expected):
+        from translate.placeholders import Placeholders
+        placeholders = Placeholders(' Page 3 of 4')
+        assert placeholders.restore(translation) == expected
+
+
+class TestNormalizedTranslation():
+    def test_translate_many(self, GoogleTranslate):
+        babelfish = GoogleTranslate(CREDS, 'fr', source_lang='en', normalize=True)
+        strings = ['Page 12', 'Page 13 ', '', 'Page 14', 'See https://example.com', 'Other']
+        assert babelfish.translate_many(strings) == [
+            'fr[Page 12]', 'fr[Page 13] ', '', 'fr[Page 14]', 'fr[See https://example.com]', 'fr[Other]']
+        assert babelfish.sent == ['Page <x0/>', 'See <x0/>', 'Other']
+        assert (babelfish.cloud_requests, babelfish.dict_hits, babelfish.empty_strings) == (3, 2, 1)
+        assert babelfish.translate('Page 15') == 'fr[Page 15]'
+        assert babelfish.translate(' 2024-01-01 ') == ' fr[2024-01-01] '
+
+    def test_lost_placeholder(self, GoogleTranslate):
+        babelfish = GoogleTranslate(CREDS, 'fr', source_lang='en', normalize=True)
+        strings = ['lossy 1 of 2', 'lossy 3 of 4', 'fine 5']
+        assert babelfish.translate_many(strings) == ['fr[lossy 1 of 2]', 'fr[lossy 3 of 4]', 'fr[fine 5]']
+        # the lost key is translated again for each string as it is, and not used after that
+        assert babelfish.sent == ['lossy <x0/> of <x1/>', 'fine <x0/>', 'lossy 1 of 2', 'lossy 3 of 4']
+        assert 'lossy <x0/> of <x1/>' not in babelfish.translated
+        assert babelfish.translate('lossy 5 of 6') == 'fr[lossy 5 of 6]'
+
+    def test_lost_placeholder_stats(self, GoogleTranslate, monkeypatch):
+        monkeypatch.setattr(GoogleTranslate, 'request_translation',
+                            lambda self, string: echo_batch_translation(self, [string])[0])
+        strings = ['lossy 1 of 2', 'lossy 3 of 4', 'fine 5', 'lossy 1 of 2', 'fine 6']
+        serial = GoogleTranslate(CREDS, 'fr', source_lang='en', normalize=True)
+        translations = [serial.translate(string) for string in strings]
+        batch = GoogleTranslate(CREDS, 'fr', source_lang='en', normalize=True)
+        assert batch.translate_many(strings) == translations
+        # the fallback to the strings as they are is counted the same way, one by one or in bulk
+        assert [(each.dict_hits, each.cloud_requests) for each in (batch, serial)] == [(2, 4), (2, 4)]
+
+    def test_offline_and_estimate(self, GoogleTranslate):
+        from translate.estimate import CostEstimate
+        babelfish = GoogleTranslate(CREDS, 'fr', source_lang='en', online=False, normalize=True)
+        babelfish.estimate = CostEstimate()
+        babelfish.estimate.record('file.txt', babelfish, ['Page 1', 'Page 2', 'Page 3'])
+        assert babelfish.estimate.characters == len('Page <x0/>')
+        assert babelfish.translate_many(['Page 1', 'Page 2']) == ['fr(Page 1)', 'fr(Page 2)']
+        assert babelfish.dummy_text == 1
+
+    def test_async(self, GoogleTranslate, monkeypatch):
+        from translate.translate_async import AsyncGoogleTranslate
+
+        async def request_batch_async(self, strings):
+            return echo_batch_translation(self, strings)
+        monkeypatch.setattr(AsyncGoogleTranslate, 'request_batch_async', request_batch_async)
+        babelfish = AsyncGoogleTranslate(CREDS, 'fr', source_lang='en', normalize=True)
+        result = asyncio.run(babelfish.run_and_close(babelfish.translate_many(['lossy 1 of 2', 'Page 3', 'Page 4'])))
+        assert result == ['fr[lossy 1 of 2]', 'fr[Page 3]', 'fr[Page 4]']
+        assert babelfish.sent == ['lossy <x0/> of <x1/>', 'Page <x0/>', 'lossy 1 of 2']
@@ -0,0 +1,119 @@
+# coding: UTF-8
+from __future__ import absolute_import
+from __future__ import unicode_literals
+
+import json
+
+import pytest
+from google.api_core import exceptions
+
+from translate.translate_base import CREDS
+from translate.tests.conftest import mock_batch_translation
+
+
+@pytest.fixture
+def no_backoff(monkeypatch):
+    from translate import rate_limit
+    monkeypatch.setattr(rate_limit.random, 'uniform', lambda low, high: 0)
+
+
+def failing_batches(errors):
+    """ A request_batch that raises each of `errors` in turn before translating as usual. """
+    errors = list(errors)
+
+    def request_batch(self, strings):
+        self.attempts = getattr(self, 'attempts', 0) + 1
+        if errors:
+            raise errors.pop(0)
+        return mock_batch_translation(self, strings)
+    return request_batch
+
+
+class FakeClock(object):
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.now += seconds
+
+
+class TestRateLimiter():
+    def test_characters_per_minute(self):
+        from translate.rate_limit import RateLimiter
+        clock = FakeClock()
+        limiter = RateLimiter(characters_per_minute=600, clock=clock, sleep=clock.sleep)
+        assert limiter.reserve(500) == 0
+        assert limiter.reserve(200) == pytest.approx(10)
+        clock.now = 10
+        # a request larger than the quota waits for the full allowance, then goes ahead
+        assert limiter.reserve(1000) == pytest.approx(100)
+        limiter.wait(60)
+        assert clock.now == pytest.approx(116)
+        assert limiter.waited == pytest.approx(216)
+
+    def test_requests_per_second(self):
+        from translate.rate_limit import RateLimiter
+        clock = FakeClock()
+        limiter = RateLimiter(requests_per_second=2, clock=clock, sleep=clock.sleep)
+        for _ in range(6):
+            limiter.wait(5000)
+        assert clock.now == pytest.approx(2)
+
+    @pytest.mark.parametrize("error, attempt, retried",
+                             [
+                                 (exceptions.TooManyRequests('Too many requests'), 0, True),
+                                 (exceptions.Forbidden('User Rate Limit Exceeded'), 1, True),
+                                 (exceptions.Forbidden('The caller does not have permission'), 0, False),
+                                 (exceptions.ServiceUnavailable('Backend Error'), 4, True),
+                                 (exceptions.InternalServerError('Backend Error'), 5, False),
+                                 (exceptions.BadRequest('Invalid Value'), 0, False),
+                                 (ValueError('not JSON'), 0, False),
+                             ])
+    def test_retry_delay(self, error, attempt, retried):
+        from translate.rate_limit import MAX_BACKOFF, retry_delay
+        delay = retry_delay(error, attempt)
+        assert (delay is not None) == retried
+        assert delay is None or 0 <= delay <= MAX_BACKOFF
+
+
+class TestRetry():
+    def test_translate_many(self, GoogleTranslate, no_backoff, monkeypatch):
+        from translate.rate_limit import RateLimiter
+        monkeypatch.setattr(GoogleTranslate, 'request_batch', failing_batches(
+            [exceptions.TooManyRequests('Too many requests'), exceptions.ServiceUnavailable('Backend Error')]
+        ))
+        limiter = RateLimiter(characters_per_minute=10 ** 6, requests_per_second=100)
+        babelfish = GoogleTranslate(CREDS, 'fr', source_lang='en', limiter=limiter, threads=2)
+        assert babelfish.translate_many(['one', 'two', 'one']) == ['un', 'deux', 'un']
+        assert babelfish.attempts == 3
+
+    def test_retries_exhausted(self, GoogleTranslate, no_backoff, monkeypatch):
+        monkeypatch.setattr(GoogleTranslate, 'request_batch', failing_batches(
+            [exceptions.TooManyRequests('Too many requests')] * 3
+        ))
+        babelfish = GoogleTranslate(CREDS, 'fr', source_lang='en', retries=2)
+        with pytest.raises(exceptions.TooManyRequests):
+            babelfish.translate_many(['one'])
+        assert babelfish.attempts == 3
+
+    def test_history_saved_on_failure(self, GoogleTranslate, monkeypatch, tmp_path):
+        from translate.translate_base import BATCH_LIMITS, TranslateText
+        monkeypatch.setitem(BATCH_LIMITS, 'segments', 2)
+        requests = []
+
+        def request_batch(self, strings):
+            requests.append(strings)
+            if len(requests) > 1:
+                raise exceptions.BadRequest('Invalid Value')
+            return mock_batch_translation(self, strings)
+        monkeypatch.setattr(GoogleTranslate, 'request_batch', request_batch)
+        (tmp_path / 'source.txt').write_text('one\ntwo\nthree\n')
+        history = str(tmp_path / 'history.json')
+        babelfish = GoogleTranslate(CREDS, 'fr', source_lang='en', history=history)
+        with pytest.raises(exceptions.BadRequest):
+            TranslateText(str(tmp_path), 'source.txt', babelfish)
+        with open(history) as f:
+            assert json.load(f) == {'one': 'un', 'two': 'deux'}
@@ -0,0 +1,108 @@
+# coding: UTF-8
+from __future__ import absolute_import
+from __future__ import unicode_literals
+
+import pytest
+
+from translate.translate_base import CREDS
+
+
+@pytest.fixture
+def revised_text(tmp_path):
+    (tmp_path / 'v1.txt').write_text('Title\nFirst paragraph\nSecond paragraph\nThird\n')
+    (tmp_path / 'v1_fr.txt').write_text('Titre corrigé\nfr(First paragraph)\nfr(Second paragraph)\nfr(Third)\n')
+    (tmp_path / 'v2.txt').write_text('Title\nFirst paragraph\nNew paragraph\nSecond paragraph\nThird, edited\n')
+    return tmp_path
+
+
+class TestRevision():
+    @pytest.mark.parametrize("lines, expected", [
+        (['a', 'b', 'c'], ['A', 'B', 'C']),
+        (['a', 'new', 'b', 'c'], ['A', None, 'B', 'C']),
+        (['a', 'c'], ['A', 'C']),
+        (['a', 'b2', 'c', 'a'], ['A', None, 'C', None]),
+        ([], []),
+    ])
+    def test_align(self, lines, expected):
+        from translate.revision import Revision
+        revision = Revision(['a', 'b', 'c'], ['A', 'B', 'C'])
+        assert revision.align(lines) == expected
+
+    def test_translate(self):
+        from translate.revision import Revision
+        revision = Revision(['a', 'b', 'c'], ['A', 'B', 'C'], name='v1_fr.txt')
+        sent = []
+        translations = revision.translate(['a', 'new', 'c'], lambda lines: sent.extend(lines) or [
+            'fr(%s)' % line for line in lines])
+        assert translations == ['A', 'fr(new)', 'C'] and sent == ['new']
+        assert revision.translate(['a', 'b'], lambda lines: sent.extend(lines)) == ['A', 'B'] and sent == ['new']
+        assert revision.report() == 'kept 4 of 5 segments from v1_fr.txt, and translated 1'
+
+
+class TestRevise():
+    def test_text(self, GoogleTranslate, revised_text):
+        from translate.translate_base import TranslateText
+        babelfish = GoogleTranslate(CREDS, 'fr', source_lang='en', online=False)
+        document = TranslateText(str(revised_text), 'v2.txt', babelfish, defer=True)
+        document.revise('v1.txt')
+        document.execute(document.translate)
+        assert (revised_text / 'v2_fr.txt').read_text() == (
+            'Titre corrigé\nfr(First paragraph)\nfr(New paragraph)\nfr(Second paragraph)\nfr(Third, edited)\n')
+        # only the changed lines went to the translator
+        assert babelfish.dummy_text == 2
+
+    def test_docx(self, GoogleTranslate, tmp_path):
+        from translate.translate_base import Document, TranslateDocx
+        document = Document()
+        for text in ('Introduction', 'Unchanged text', 'To be edited'):
+            document.add_paragraph(text)
+        document.add_table(rows=1, cols=2).cell(0, 1).text = 'A cell'
+        document.save(str(tmp_path / 'v1.docx'))
+        TranslateDocx(str(tmp_path), 'v1.docx', GoogleTranslate(CREDS, 'ja', source_lang='en', online=False))
+
+        document.paragraphs[2].text = 'Edited'
+        document.paragraphs[1].insert_paragraph_before('Inserted')
+        document.save(str(tmp_path / 'v2.docx'))
+        babelfish = GoogleTranslate(CREDS, 'ja', source_lang='en', online=False)
+        revised = TranslateDocx(str(tmp_path), 'v2.docx', babelfish, defer=True)
+        revised.revise(str(tmp_path / 'v1.docx'))
+        revised.execute(revised.translate)
+        translated = Document(str(tmp_path / 'v2_ja.docx'))
+        assert [paragraph.text for paragraph in translated.paragraphs] == [
+            'ja(Introduction)', 'ja(Inserted)', 'ja(Unchanged text)', 'ja(Edited)']
+        assert translated.tables[0].cell(0, 1).text == 'ja(A cell)'
+        assert babelfish.dummy_text == 2
+        assert revised.revisions[('en', 'ja')].reused == 3
+
+    def test_missing_or_mismatched(self, GoogleTranslate, revised_text):
+        from translate.translate_base import TranslateText, TranslateTextStream
+        babelfish = [GoogleTranslate(CREDS, lang, source_lang='en', online=False) for lang in ('fr', 'ja', 'de')]
+        (revised_text / 'v1_de.txt').write_text('nur eine Zeile\n')
+        document = TranslateText(str(revised_text), 'v2.txt', babelfish, defer=True)
+        with pytest.warns(UserWarning) as warnings:
+            document.revise('v1.txt')
+        assert len(warnings) == 2
+        assert list(document.revisions) == [('en', 'fr')]
+        with pytest.warns(UserWarning, match='streamed'):
+            TranslateTextStream(str(revised_text), 'v2.txt', babelfish[0], defer=True).revise('v1.txt')
+
+
+def test_main(revised_text, capsys):
+    from translate.__main__ import main
+    main(arg_list=['-s', 'en', '-n', '--previous', str(revised_text / 'v1.txt'), str(revised_text / 'v2.txt'), 'fr'])
+    assert (revised_text / 'v2_fr.txt').read_text().startswith('Titre corrigé\n')
+    # the estimate counts only the lines that changed
+    assert 'v2.txt                           en-fr             2' in capsys.readouterr()[0]
+    with pytest.warns(UserWarning):
+        assert main(arg_list=['--previous', str(revised_text / 'v0.txt'), str(revised_text / 'v2.txt'),
+                              'fr']) == 'invalid previous'
+
+
+def test_main_unchanged(revised_text, capsys):
+    from translate.__main__ import main
+    (revised_text / 'v1_copy.txt').write_text((revised_text / 'v1.txt').read_text())
+    main(arg_list=['-s', 'en', '-n', '--previous', str(revised_text / 'v1.txt'), str(revised_text / 'v1_copy.txt'),
+                   'fr'])
+    assert (revised_text / 'v1_copy_fr.txt').read_text() == (revised_text / 'v1_fr.txt').read_text()
+    # a file reused in full still has its row in the estimate
+    assert 'v1_copy.txt                      en-fr             0' in capsys.readouterr()[0]
@@ -0,0 +1,146 @@
+# coding: UTF-8
+from __future__ import absolute_import
+from __future__ import unicode_literals
+
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+
+@pytest.fixture
+def serve(tmp_path):
+    from translate.server import TranslationServer, UnixTranslationServer
+    servers = []
+
+    def start(unix=False, **kwargs):
+        kwargs.setdefault('online', False)
+        if unix:
+            server = UnixTranslationServer(str(tmp_path / 'translate.sock'), **kwargs)
+        else:
+            server = TranslationServer(('127.0.0.1', 0), **kwargs)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        servers.append(server)
+        return server
+    yield start
+    for server in servers:
+        server.shutdown()
+        server.server_close()
+
+
+@pytest.fixture
+def text_contents():
+    return dict(('file%d.txt' % i, 'List\none\nfile %d\n' % i) for i in range(6))
+
+
+class TestTranslationServer():
+    def test_strings(self, serve, tmp_path):
+        from translate.server import request
+        server = serve(history=str(tmp_path / 'memory.db'))
+        job = {'strings': ['one', '', 'two', 'one'], 'target_lang': 'fr', 'source_lang': 'en'}
+        assert request(server.address, '/translate', job) == (200, {'translations': [
+            'fr(one)', '', 'fr(two)', 'fr(one)']})
+        request(server.address, '/translate', job)
+        status, response = request(server.address, '/status')
+        assert (status, response['jobs'], response['failed']) == (200, 2, 0)
+        # the translator is kept between jobs, so the second job is answered from its dictionary
+        assert response['stats']['en-fr']['dummy_text'] == 2
+        assert response['stats']['en-fr']['dict_hits'] == 4
+
+    def test_source_lang(self, serve):
+        from translate.server import request
+        server = serve(source_lang='en')
+        assert request(server.address, '/translate', {'strings': ['one'], 'target_lang': 'fr'})[0] == 200
+        assert request(server.address, '/translate', {'strings': ['one'], 'target_lang': 'fr',
+                                                      'source_lang': 'de'})[0] == 200
+        assert sorted(server.translators) == [('de', 'fr'), ('en', 'fr')]
+
+    def test_documents(self, serve, text_files):
+        from translate.server import request
+        server = serve(unix=True)
+        jobs = [{'file': str(text_files / ('file%d.txt' % i)), 'target_lang': 'fr,ja'} for i in range(6)]
+        with ThreadPoolExecutor(max_workers=6) as executor:
+            responses = list(executor.map(lambda job: request(server.address, '/document', job), jobs))
+        for i, (status, response) in enumerate(responses):
+            assert status == 200
+            assert response['targets'] == [str(text_files / ('file%d_%s.txt' % (i, lang))) for lang in ('fr', 'ja')]
+            assert (text_files / ('file%d_ja.txt' % i)).read_text() == 'ja(List)\nja(one)\nja(file %d)\n' % i
+        assert sorted(server.translators) == [(None, 'fr'), (None, 'ja')]
+        status, response = request(server.address, '/status')
+        assert response['metrics']['output']['files'] == 12
+
+    def test_cross_check(self, serve, text_files):
+        from translate.server import request
+        server = serve()
+        job = {'file': str(text_files / 'file0.txt'), 'target_lang': 'fr', 'source_lang': 'en', 'cross_check': True}
+        assert request(server.address, '/document', job)[0] == 200
+        assert (text_files / 'file0_fr_en.txt').read_text() == 'en(fr(List))\nen(fr(one))\nen(fr(file 0))\n'
+        # the translation back is made by a reverse translator, so the job's translator is kept as it was
+        assert sorted(server.translators) == [('en', 'fr')]
+        assert request(server.address, '/translate', dict(job, strings=['one']))[1] == {'translations': ['fr(one)']}
+
+    @pytest.mark.parametrize("path, job, status", [
+        ('/translate', {'strings': ['one']}, 400),
+        ('/translate', {'strings': 'one', 'target_lang': 'fr'}, 400),
+        ('/translate', ['one'], 400),
+        ('/document', {'file': 'missing.txt', 'target_lang': 'fr'}, 400),
+        ('/document', {'file': __file__, 'target_lang': 'fr'}, 400),
+        ('/unknown', {}, 404),
+    ])
+    def test_bad_jobs(self, serve, path, job, status):
+        from translate.server import request
+        server = serve()
+        assert request(server.address, path, job)[0] == status
+
+    @pytest.mark.parametrize("target", ['/tmp/elsewhere.txt', '../elsewhere.txt', 'sub/elsewhere.txt', '..', 7])
+    def test_target_outside_folder(self, serve, text_files, target):
+        from translate.server import request
+        server = serve()
+        job = {'file': str(text_files / 'file0.txt'), 'target_lang': 'fr', 'target': target}
+        status, response = request(server.address, '/document', job)
+        assert status == 400 and 'beside the source' in response['error']
+        assert sorted(path.name for path in text_files.iterdir()) == ['file%d.txt' % i for i in range(6)]
+        job['target'] = 'renamed.txt'
+        assert request(server.address, '/document', job)[0] == 200
+        assert (text_files / 'renamed.txt').read_text() == 'fr(List)\nfr(one)\nfr(file 0)\n'
+
+    @pytest.mark.parametrize("host, allowed", [
+        ('127.0.0.1', True), ('localhost', True), ('0.0.0.0', False), ('', False), ('example.com', False),
+    ])
+    def test_loopback_only(self, host, allowed):
+        from translate.server import TranslationServer, is_loopback
+        assert is_loopback(host) == allowed
+        if not allowed:
+            with pytest.raises(ValueError, match='loopback'):
+                TranslationServer((host, 0), online=False)
+
+
+def test_main_server(serve, text_files, capsys):
+    from translate.__main__ import main
+    server = serve(unix=True)
+    assert main(arg_list=['--server', server.address, str(text_files / 'file1.txt'), 'fr']) is None
+    assert str(text_files / 'file1_fr.txt') in capsys.readouterr()[0]
+    assert (text_files / 'file1_fr.txt').read_text() == 'fr(List)\nfr(one)\nfr(file 1)\n'
+    with pytest.warns(UserWarning):
+        assert main(arg_list=['--server', server.address, str(text_files / 'file1.txt'), '']) == 'failed'
+
+
+@pytest.mark.parametrize('options', [['-n'], ['-r', 'memory.db'], ['--budget', '10'], ['-m', '4'], ['-d', 'out.txt']])
+def test_main_server_local_options(serve, text_files, options):
+    from translate.__main__ import main
+    server = serve(unix=True)
+    # options that only the command's own translators, or a single file, would use are not dropped without a word
+    with pytest.warns(UserWarning, match='cannot be sent to a daemon'):
+        assert main(arg_list=['--server', server.address, str(text_files), 'fr'] + options) == 'invalid server job'
+    assert server.jobs == 0 and not (text_files / 'file0_fr.txt').exists()
+
+
+def test_main_serve(capsys):
+    from translate.__main__ import main
+    with pytest.raises(SystemExit):
+        main(arg_list=['serve', '--help'])
+    assert 'usage: translate serve' in capsys.readouterr()[0]
+    from translate.server import parse_args
+    assert parse_args(['--socket', '/tmp/translate.sock', '-s', 'en', '-r', 'memory.db', '-m', '8']).source_lang == 'en'
+    with pytest.warns(UserWarning, match='loopback'):
+        assert main(arg_list=['serve', '--host', '0.0.0.0', '-n']) == 'invalid host'
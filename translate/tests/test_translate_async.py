@@ -0,0 +1,129 @@
+# coding: UTF-8
+from __future__ import absolute_import
+from __future__ import unicode_literals
+
+import asyncio
+import json
+import os
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+from translate.translate_base import CREDS
+from translate.tests.conftest import mock_dict
+
+
+async def mock_async_translation(self, strings):
+    await asyncio.sleep(0.01)
+    self.in_flight = getattr(self, 'in_flight', 0) + 1
+    self.max_in_flight = max(getattr(self, 'max_in_flight', 0), self.in_flight)
+    await asyncio.sleep(0.01)
+    self.in_flight -= 1
+    return [{'translatedText': mock_dict[string]} for string in strings]
+
+
+@pytest.fixture
+def AsyncGoogleTranslate(monkeypatch):
+    from translate.translate_async import AsyncGoogleTranslate
+    monkeypatch.setattr(AsyncGoogleTranslate, 'request_batch_async', mock_async_translation)
+    return AsyncGoogleTranslate
+
+
+@pytest.fixture
+def translation_server():
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = 'HTTP/1.1'
+
+        def do_POST(self):
+            request = json.loads(self.rfile.read(int(self.headers['Content-Length'])))
+            self.server.requests.append(request)
+            translations = [{'translatedText': '%s(%s)' % (request['target'], q)} for q in request['q']]
+            body = json.dumps({'data': {'translations': translations}}).encode('utf-8')
+            self.send_response(200)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+    server.requests = []
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+class TestAsyncGoogleTranslate():
+    @pytest.mark.parametrize("target_lang, kwargs, strings",
+                             [
+                                 ("fr", {'source_lang': 'en'}, ('one', 'two', 'three', 'two', 'two', '')),
+                                 ("fr", {'online': False}, ('one', '', 'one', 'middle', '')),
+                             ]
+                             )
+    def test_translate_many(self, GoogleTranslate, AsyncGoogleTranslate, target_lang, kwargs, strings):
+        serial = GoogleTranslate(CREDS, target_lang, **kwargs)
+        expected = serial.translate_many(strings)
+        babelfish = AsyncGoogleTranslate(CREDS, target_lang, **kwargs)
+        result = asyncio.run(babelfish.translate_many(strings))
+        assert result == expected
+        assert babelfish.translated == serial.translated
+        assert (babelfish.cloud_requests, babelfish.dict_hits, babelfish.empty_strings) == (
+            serial.cloud_requests, serial.dict_hits, serial.empty_strings)
+
+    @pytest.mark.parametrize("concurrency", [1, 2, 4])
+    def test_concurrency_limit(self, AsyncGoogleTranslate, monkeypatch, concurrency):
+        from translate.translate_base import BATCH_LIMITS
+        monkeypatch.setitem(BATCH_LIMITS, 'segments', 1)
+        babelfish = AsyncGoogleTranslate(CREDS, 'fr', source_lang='en', concurrency=concurrency)
+        asyncio.run(babelfish.translate_many(['one', 'two', 'three', 'four', 'five', 'List']))
+        assert babelfish.max_in_flight == concurrency
+        assert babelfish.cloud_requests == 6
+
+    def test_translate_document(self, AsyncGoogleTranslate, datadir):
+        from translate.translate_base import TranslateText
+        babelfish = AsyncGoogleTranslate(CREDS, 'fr', source_lang='en')
+
+        async def service():
+            return await babelfish.translate_document(TranslateText, datadir, 'test_textfile.txt')
+
+        asyncio.run(service())
+        target = os.path.join(datadir, 'test_textfile_fr.txt')
+        with open(target) as f:
+            assert f.readline().lower() == 'liste\n'
+        os.remove(target)
+        assert babelfish.cloud_requests == 10
+
+    def test_run_from_sync_code(self, AsyncGoogleTranslate, datadir):
+        from translate.translate_base import TranslateText
+        babelfish = AsyncGoogleTranslate(CREDS, 'fr', source_lang='en', online=False)
+        TranslateText(datadir, 'test_textfile.txt', babelfish)
+        target = os.path.join(datadir, 'test_textfile_fr.txt')
+        with open(target) as f:
+            assert f.readline() == 'fr(List)\n'
+        os.remove(target)
+        assert babelfish.loop is None
+
+    def test_connection_reuse(self, translation_server, monkeypatch):
+        from translate.translate_async import AsyncGoogleTranslate
+        from translate.translate_base import BATCH_LIMITS
+        monkeypatch.setitem(BATCH_LIMITS, 'segments', 2)
+        endpoint = 'http://127.0.0.1:%d' % translation_server.server_address[1]
+        babelfish = AsyncGoogleTranslate(CREDS, 'fr', source_lang='en', concurrency=2, endpoint=endpoint)
+
+        async def service():
+            first = await babelfish.translate_many(['a', 'b', 'c', 'd'])
+            second = await babelfish.translate_many(['e', 'f', 'g', 'h', 'a'])
+            connections = babelfish.pool.connections_opened
+            babelfish.close()
+            return first + second, connections
+
+        result, connections = asyncio.run(service())
+        assert result == ['fr(a)', 'fr(b)', 'fr(c)', 'fr(d)', 'fr(e)', 'fr(f)', 'fr(g)', 'fr(h)', 'fr(a)']
+        assert len(translation_server.requests) == 4
+        assert translation_server.requests[0] == {'q': ['a', 'b'], 'target': 'fr', 'source': 'en'}
+        assert connections == 2
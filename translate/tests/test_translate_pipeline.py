@@ -0,0 +1,58 @@
+# coding: UTF-8
+from __future__ import absolute_import
+from __future__ import unicode_literals
+
+import pytest
+
+from translate.translate_base import CREDS
+
+
+@pytest.fixture
+def text_contents():
+    return dict(('file%d.txt' % i, 'shared\nline %d\n' % i) for i in range(5))
+
+
+@pytest.fixture
+def documents(text_files, text_contents):
+    from translate.translate_base import TranslateText
+    return [(TranslateText, str(text_files), name) for name in text_contents]
+
+
+class TestTranslatePipeline():
+    @pytest.mark.parametrize('processes', [1, 3])
+    def test_execute(self, GoogleTranslate, documents, tmp_path, processes):
+        from translate.translate_pipeline import TranslatePipeline
+        babelfish = GoogleTranslate(CREDS, 'fr', source_lang='en', online=False)
+        pipeline = TranslatePipeline(documents, babelfish, processes=processes, queue_size=1)
+        pipeline.execute()
+        for i in range(5):
+            assert (tmp_path / ('file%d_fr.txt' % i)).read_text() == 'fr(shared)\nfr(line %d)\n' % i
+        assert sorted(pipeline.targets) == list(range(5))
+        assert pipeline.targets[0] == ['file0_fr.txt']
+        assert babelfish.stats['en-fr'] == {'cloud_requests': 0, 'dummy_text': 6, 'dict_hits': 4,
+                                            'empty_strings': 0, 'history': 6}
+
+    def test_languages_and_cross_check(self, GoogleTranslate, documents, tmp_path):
+        from translate.translate_pipeline import TranslatePipeline
+        babelfish = [GoogleTranslate(CREDS, lang, source_lang='en', online=False) for lang in ('fr', 'ja')]
+        pipeline = TranslatePipeline(documents[:2], babelfish, processes=2, cross_check=True)
+        pipeline.execute()
+        assert (tmp_path / 'file1_ja.txt').read_text() == 'ja(shared)\nja(line 1)\n'
+        assert (tmp_path / 'file1_ja_en.txt').read_text() == 'en(ja(shared))\nen(ja(line 1))\n'
+        assert (tmp_path / 'file0_fr_en.txt').read_text() == 'en(fr(shared))\nen(fr(line 0))\n'
+        assert sorted(babelfish[0].stats) == ['en-fr', 'fr-en']
+        assert babelfish[1].stats['ja-en']['dummy_text'] == 3
+        assert babelfish[0].target_lang == 'fr'
+
+    def test_failed_document(self, GoogleTranslate, documents, tmp_path):
+        from translate.translate_base import TranslateDocx
+        from translate.translate_pipeline import TranslatePipeline
+        (tmp_path / 'broken.docx').write_text('not a document')
+        babelfish = GoogleTranslate(CREDS, 'fr', source_lang='en', online=False)
+        pipeline = TranslatePipeline([(TranslateDocx, str(tmp_path), 'broken.docx')] + documents[:1], babelfish,
+                                     processes=2)
+        with pytest.warns(UserWarning, match='broken.docx'):
+            pipeline.execute()
+        assert list(pipeline.failed) == [0]
+        assert list(pipeline.targets) == [1]
+        assert (tmp_path / 'file0_fr.txt').exists()
@@ -0,0 +1,106 @@
+# coding: UTF-8
+from __future__ import absolute_import
+from __future__ import unicode_literals
+
+import json
+
+import pytest
+
+from translate.translate_base import CREDS
+
+
+def counting_batch_translation(self, strings):
+    self.sent.extend(strings)
+    return [{'translatedText': 'fr[%s]' % string} for string in strings]
+
+
+@pytest.fixture
+def GoogleTranslate(GoogleTranslate, monkeypatch):
+    monkeypatch.setattr(GoogleTranslate, 'request_batch', counting_batch_translation)
+    monkeypatch.setattr(GoogleTranslate, 'sent', [], raising=False)
+    return GoogleTranslate
+
+
+class TestTranslationCache():
+    def test_lru(self):
+        from translate.translation_cache import LOW_WATER, TranslationCache
+        spilled = []
+        cache = TranslationCache(10 ** 6, spill=spilled.extend)
+        cache.update([('one', 'un'), ('two', 'deux')])
+        # room for two entries once trimmed, but not for three
+        cache.max_bytes = int((cache.bytes + 50) / LOW_WATER)
+        assert cache['one'] == 'un'  # 'two' is now the least recently used
+        cache['three'] = 'trois'
+        assert 'two' not in cache and 'one' in cache and 'three' in cache
+        assert spilled == [('two', 'deux')]
+        assert cache.bytes <= cache.max_bytes
+        assert sorted(cache.items()) == [('one', 'un'), ('three', 'trois')]
+        assert cache.pop('one') == 'un' and cache.pop('one') is None
+        assert len(cache) == 1
+
+    def test_shared_translations(self):
+        from translate.translation_cache import TranslationCache
+        cache = TranslationCache(10 ** 6)
+        first, second = ''.join(['Total']), ''.join(['Tot', 'al'])
+        cache.update({'Sum': first, 'Total': second})
+        assert cache['Sum'] is cache['Total']
+        assert len(cache.values) == 1
+        cache.pop('Sum')
+        assert cache.values['Total'][1] == 1
+        bytes_held = cache.bytes
+        cache.pop('Total')
+        assert cache.bytes < bytes_held and not cache.values
+
+    def test_digest_keys(self):
+        from translate.translation_cache import TranslationCache
+        spilled = []
+        cache = TranslationCache(10 ** 6, spill=spilled.extend, digest_keys=True, items={'one': 'un'})
+        assert cache['one'] == 'un' and 'two' not in cache
+        assert all(len(key) == 16 for key in cache.entries)
+        with pytest.raises(TypeError):
+            list(cache)
+        cache.max_bytes = 0
+        cache['two'] = 'deux'
+        assert len(cache) == 1 and spilled == []
+
+    def test_history_over_budget(self):
+        from translate.translation_cache import ENTRY_BYTES, TranslationCache
+        spilled = []
+        cache = TranslationCache(8 * ENTRY_BYTES, spill=spilled.extend,
+                                 items=[('segment %d' % i, 'translation %d' % i) for i in range(10)])
+        assert 0 < len(cache) < 10 and cache.evictions and spilled == []
+
+
+class TestBoundedCache():
+    @pytest.mark.parametrize('history', ['history.json', None])
+    def test_without_memory(self, GoogleTranslate, tmp_path, history):
+        from translate.translation_cache import ENTRY_BYTES
+        history = tmp_path / history if history else None
+        if history:
+            history.write_text(json.dumps({'old': 'ancien'}))
+        with pytest.warns(UserWarning, match='translation memory'):
+            babelfish = GoogleTranslate(CREDS, 'fr', source_lang='en', history=history and str(history),
+                                        cache_size=8 * ENTRY_BYTES)
+        # nothing is evicted, as it could only be found again by sending it to the cloud
+        assert isinstance(babelfish.translated, dict)
+        strings = ['segment %d' % i for i in range(20)]
+        assert babelfish.translate_many(strings) == ['fr[%s]' % string for string in strings]
+        assert babelfish.translate_many(strings) == ['fr[%s]' % string for string in strings]
+        assert babelfish.sent == strings
+        if history:
+            babelfish.save_history()
+            saved = json.loads(history.read_text())
+            assert saved == dict({'old': 'ancien'}, **{string: 'fr[%s]' % string for string in strings})
+
+    def test_memory(self, GoogleTranslate, tmp_path):
+        from translate.translation_cache import ENTRY_BYTES
+        babelfish = GoogleTranslate(CREDS, 'fr', source_lang='en', history=str(tmp_path / 'memory.db'),
+                                    cache_size=8 * ENTRY_BYTES)
+        strings = ['segment %d' % i for i in range(20)]
+        babelfish.translate_many(strings)
+        assert babelfish.translated.digest_keys and len(babelfish.translated) < 20
+        # the evicted translations are found in the translation memory, not requested again
+        assert babelfish.translate_many(strings + ['new']) == ['fr[%s]' % string for string in strings + ['new']]
+        assert babelfish.translate('segment 0') == 'fr[segment 0]'
+        assert babelfish.sent == strings + ['new']
+        assert babelfish.cloud_requests == 21
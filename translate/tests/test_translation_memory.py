@@ -0,0 +1,124 @@
+# coding: UTF-8
+from __future__ import absolute_import
+from __future__ import unicode_literals
+
+import json
+import os
+import sqlite3
+
+import pytest
+
+from translate.translate_base import CREDS
+
+
+@pytest.fixture
+def memory_file(datadir):
+    filename = os.path.join(datadir, 'history_file.db')
+    for each in (filename, filename + '-wal', filename + '-shm'):
+        if os.path.exists(each):
+            os.remove(each)
+    yield filename
+    for each in (filename, filename + '-wal', filename + '-shm'):
+        if os.path.exists(each):
+            os.remove(each)
+
+
+class TestTranslationMemory():
+    @pytest.mark.parametrize("filename, expected",
+                             [
+                                 ('history.db', True), ('history.SQLite', True), ('history.json', False), (None, False),
+                             ])
+    def test_is_memory_file(self, filename, expected):
+        from translate.translation_memory import is_memory_file
+        assert is_memory_file(filename) == expected
+
+    def test_update_and_get_many(self, memory_file):
+        from translate.translation_memory import TranslationMemory, QUERY_LIMIT
+        memory = TranslationMemory(memory_file, 'en', 'fr')
+        memory.update([('one', 'un'), ('two', 'deux')])
+        memory.update({'segment %d' % i: 'segment %d' % i for i in range(QUERY_LIMIT + 10)})
+        other_pair = TranslationMemory(memory_file, 'en', 'ja')
+        other_pair.update([('one', 'ichi')])
+
+        assert memory.get('one') == 'un'
+        assert memory.get('three') is None
+        found = memory.get_many(['one', 'two', 'three'] + ['segment %d' % i for i in range(QUERY_LIMIT + 10)])
+        assert len(found) == QUERY_LIMIT + 12
+        assert len(memory) == QUERY_LIMIT + 12
+        assert other_pair.get_many(['one', 'two']) == {'one': 'ichi'}
+        memory.close()
+        other_pair.close()
+
+    def test_import_json(self, memory_file, datadir):
+        from translate.translation_memory import TranslationMemory
+        memory = TranslationMemory(memory_file, 'en', 'fr')
+        assert memory.import_json(os.path.join(datadir, 'history_copy.json')) == 3
+        assert len(memory) == 3
+        memory.close()
+
+    def test_shared_between_connections(self, memory_file):
+        from translate.translation_memory import TranslationMemory
+        writer = TranslationMemory(memory_file, 'en', 'fr')
+        reader = TranslationMemory(memory_file, 'en', 'fr')
+        writer.update([('one', 'un')])
+        assert reader.get('one') == 'un'
+        assert sqlite3.connect(memory_file).execute('PRAGMA journal_mode').fetchone()[0] == 'wal'
+        writer.close()
+        reader.close()
+
+
+class TestGoogleTranslateMemory():
+    def test_translate_with_memory(self, GoogleTranslate, memory_file):
+        strings = ('one', 'two', 'three', 'two', '')
+        babelfish = GoogleTranslate(CREDS, 'fr', source_lang='en', history=memory_file)
+        assert babelfish.memory is not None
+        babelfish.translate_many(strings)
+        babelfish.translate('four')
+        assert babelfish.cloud_requests == 4
+
+        # a second session finds everything in the memory without loading it all at the start
+        babelfish = GoogleTranslate(CREDS, 'fr', source_lang='en', history=memory_file)
+        assert babelfish.translated == {}
+        result = babelfish.translate_many(strings + ('four',))
+        babelfish.save_history()
+        babelfish.update_stats()
+        assert [each.lower() for each in result] == ['un', 'deux', 'trois', 'deux', '', 'quatre']
+        assert babelfish.stats['en-fr'] == {
+            'cloud_requests': 0, 'dummy_text': 0, 'dict_hits': 5, 'empty_strings': 1, 'history': 4,
+        }
+
+    def test_swap_languages_keeps_memory(self, GoogleTranslate, memory_file, datadir):
+        from translate.translate_base import TranslateBase
+        babelfish = GoogleTranslate(CREDS, 'fr', source_lang='en', history=memory_file)
+        tg = TranslateBase(datadir, 'test_document.docx', babelfish, cross_check=True)
+        tg.swap_languages()
+        assert babelfish.history_file == memory_file
+        assert (babelfish.memory.source_lang, babelfish.memory.target_lang) == ('fr', 'en')
+
+
+def test_main_import(memory_file, datadir, capsys):
+    from translate.__main__ import main
+    from translate.translation_memory import TranslationMemory
+    main(arg_list=[os.path.join(datadir, 'test_textfile.txt'), 'fr', '-s', 'en', '-n', '-r', memory_file,
+                   '--import', os.path.join(datadir, 'history_copy.json')])
+    out, err = capsys.readouterr()
+    assert out.startswith('imported 3 segments into %s' % memory_file)
+    assert len(TranslationMemory(memory_file, 'en', 'fr')) == 3
+    os.remove(os.path.join(datadir, 'test_textfile_fr.txt'))
+
+
+def test_main_import_languages(memory_file, tmp_path, capsys):
+    from translate.__main__ import main
+    from translate.translation_memory import TranslationMemory
+    (tmp_path / 'doc.txt').write_text('one\n')
+    (tmp_path / 'history_fr.json').write_text(json.dumps({'one': 'un', 'two': 'deux'}))
+    arg_list = [str(tmp_path / 'doc.txt'), 'fr,ja', '-s', 'en', '-n', '-r', memory_file,
+                '--import', str(tmp_path / 'history.json')]
+    with pytest.warns(UserWarning, match='history_ja.json'):
+        assert main(arg_list=arg_list) == 'invalid history'
+    assert len(TranslationMemory(memory_file, 'en', 'fr')) == 0
+    (tmp_path / 'history_ja.json').write_text(json.dumps({'one': 'ichi'}))
+    main(arg_list=arg_list)
+    assert 'imported 1 segments into %s (en-ja)' % memory_file in capsys.readouterr()[0]
+    assert len(TranslationMemory(memory_file, 'en', 'fr')) == 2
+    assert TranslationMemory(memory_file, 'en', 'ja').get('one') == 'ichi'
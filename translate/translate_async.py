@@ -0,0 +1,228 @@
+# coding: UTF-8
+import asyncio
+import itertools
+import json
+import ssl
+import urllib.parse
+
+from google.api_core import exceptions
+
+from translate.rate_limit import retry_delay
+from translate.translate_base import GoogleTranslate
+
+
+API_ENDPOINT = 'https://translation.googleapis.com'
+API_PATH = '/language/translate/v2'
+
+
+class HttpConnectionPool(object):
+    """
+    Keep-alive HTTP/1.1 connections to a single host, for coroutines running on one event loop.
+
+    Connections are returned to the pool after each response, so successive requests reuse them rather than
+    paying for a new TCP and TLS handshake.  At most `size` idle connections are kept.
+    """
+    def __init__(self, url, size):
+        parts = urllib.parse.urlsplit(url)
+        self.host = parts.hostname
+        self.ssl = ssl.create_default_context() if parts.scheme == 'https' else None
+        self.port = parts.port or (443 if self.ssl else 80)
+        self.netloc = parts.netloc
+        self.base_path = parts.path.rstrip('/')
+        self.size = size
+        self.idle = []
+        self.connections_opened = 0
+
+    async def connect(self):
+        self.connections_opened += 1
+        return await asyncio.open_connection(self.host, self.port, ssl=self.ssl)
+
+    async def request(self, method, path, body=b'', headers=None):
+        """ Send a request and return the status, headers and body of the response. """
+        for attempt in range(2):
+            reused = bool(self.idle)
+            reader, writer = self.idle.pop() if reused else await self.connect()
+            try:
+                status, response_headers, data = await self.exchange(reader, writer, method, path, body, headers)
+            except (ConnectionError, asyncio.IncompleteReadError):
+                writer.close()
+                # the server may have dropped an idle connection: try once more on a new one
+                if reused and not attempt:
+                    continue
+                raise
+
+            if response_headers.get('connection', '').lower() == 'close' or len(self.idle) >= self.size:
+                writer.close()
+            else:
+                self.idle.append((reader, writer))
+            return status, response_headers, data
+
+    async def exchange(self, reader, writer, method, path, body, headers):
+        lines = ['%s %s%s HTTP/1.1' % (method, self.base_path, path),
+                 'Host: %s' % self.netloc,
+                 'Content-Length: %d' % len(body)]
+        lines.extend('%s: %s' % (name, value) for (name, value) in (headers or {}).items())
+        writer.write(('\r\n'.join(lines) + '\r\n\r\n').encode('latin-1') + body)
+        await writer.drain()
+
+        status_line = await reader.readline()
+        if not status_line:
+            raise ConnectionError('connection closed by %s' % self.netloc)
+        status = int(status_line.split()[1])
+        response_headers = {}
+        while True:
+            line = await reader.readline()
+            if line in (b'\r\n', b'\n', b''):
+                break
+            name, _, value = line.decode('latin-1').partition(':')
+            response_headers[name.strip().lower()] = value.strip()
+
+        if response_headers.get('transfer-encoding', '').lower() == 'chunked':
+            chunks = []
+            while True:
+                size = int((await reader.readline()).split(b';')[0], 16)
+                if not size:
+                    while (await reader.readline()) not in (b'\r\n', b'\n', b''):
+                        pass
+                    break
+                chunks.append(await reader.readexactly(size))
+                await reader.readline()
+            data = b''.join(chunks)
+        elif 'content-length' in response_headers:
+            data = await reader.readexactly(int(response_headers['content-length']))
+        else:
+            data = await reader.read()
+            response_headers['connection'] = 'close'
+        return status, response_headers, data
+
+    def close(self):
+        while self.idle:
+            reader, writer = self.idle.pop()
+            writer.close()
+
+
+class AsyncGoogleTranslate(GoogleTranslate):
+    """
+    Translate passages of text with Google Cloud Translate from asyncio code.
+
+    translate_many() is a coroutine: batches of uncached strings are sent concurrently over a pool of keep-alive
+    connections, with at most `concurrency` requests in flight.  The translation dictionary, history, stats, rate
+    limiter and retries are shared with GoogleTranslate.
+
+    The file-format classes can use this translator too.  From a coroutine, translate_document() runs the
+    (blocking) parse and save in an executor while the requests are made on the running loop.
+    """
+    def __init__(self, creds, target_lang, concurrency=8, endpoint=None, **kwargs):
+        super(AsyncGoogleTranslate, self).__init__(creds, target_lang, endpoint=endpoint, **kwargs)
+        self.concurrency = max(1, concurrency)
+        self.endpoint = endpoint or API_ENDPOINT
+        self.loop = None
+        self.pool = None
+        self.semaphore = None
+
+    def bind_loop(self):
+        """ Set up the connection pool and semaphore for the running loop. """
+        loop = asyncio.get_running_loop()
+        if loop is not self.loop:
+            if self.pool:
+                self.pool.close()
+            self.loop = loop
+            self.pool = HttpConnectionPool(self.endpoint, self.concurrency)
+            self.semaphore = asyncio.Semaphore(self.concurrency)
+
+    async def translate_many(self, strings):
+        """ Translate a list of text elements, as GoogleTranslate.translate_many() but without blocking. """
+        self.bind_loop()
+        keys = [self.cache_key(string) for string in strings]
+        pending, found = self.plan_translation([key for (key, _) in keys])
+        if self.online:
+            await asyncio.gather(*[self.request_and_store(batch, found) for batch in self.batches(pending)])
+
+        else:
+            self.store_dummy_text(pending, found)
+
+        translations, lost = self.restore_placeholders(keys, found)
+        for i, translation in zip(lost, await self.translate_many([strings[i] for i in lost]) if lost else []):
+            translations[i] = translation
+        return translations
+
+    async def request_and_store(self, batch, found):
+        self.store_translations(batch, await self.bounded_request(batch), found)
+
+    async def bounded_request(self, batch):
+        """ Send a batch within the concurrency and rate limits, retrying after a backoff if the cloud refuses it. """
+        characters = sum(len(string) for string in batch)
+        for attempt in itertools.count():
+            async with self.semaphore:
+                if self.limiter is not None:
+                    wait = self.limiter.reserve(characters)
+                    self.metrics.record_wait(wait)
+                    await asyncio.sleep(wait)
+                start = self.metrics.clock()
+                try:
+                    response = await self.request_batch_async(batch)
+                except Exception as error:
+                    self.metrics.record_request(self.metrics.clock() - start, failed=True)
+                    delay = retry_delay(error, attempt, self.retries)
+                    if delay is None:
+                        raise
+                else:
+                    self.metrics.record_request(self.metrics.clock() - start, characters)
+                    return response
+            await asyncio.sleep(delay)
+
+    async def request_batch_async(self, strings):
+        data = {'q': strings, 'target': self.target_lang}
+        if self.source_lang:
+            data['source'] = self.source_lang
+        headers = {'Content-Type': 'application/json'}
+        credentials = getattr(self.client, '_credentials', None)
+        if credentials is not None:
+            if not credentials.valid:
+                await self.loop.run_in_executor(None, self.refresh_credentials, credentials)
+            if credentials.token:
+                headers['Authorization'] = 'Bearer %s' % credentials.token
+
+        status, _, body = await self.pool.request('POST', API_PATH, json.dumps(data).encode('utf-8'), headers)
+        if status >= 400:
+            try:
+                message = json.loads(body.decode('utf-8'))['error']['message']
+            except (ValueError, KeyError, TypeError):
+                message = body.decode('utf-8', 'replace')
+            raise exceptions.from_http_status(status, message)
+        return json.loads(body.decode('utf-8'))['data']['translations']
+
+    def refresh_credentials(self, credentials):
+        from google.auth.transport.requests import Request
+        credentials.refresh(Request())
+
+    def run(self, coroutine):
+        """ Wait for a coroutine from synchronous code, on the loop this translator is serving if there is one. """
+        try:
+            running = asyncio.get_running_loop()
+        except RuntimeError:
+            running = None
+        if self.loop is not None and self.loop.is_running():
+            if running is self.loop:
+                raise RuntimeError('await translate_many(), or use translate_document(), from within the event loop')
+            return asyncio.run_coroutine_threadsafe(coroutine, self.loop).result()
+        return asyncio.run(self.run_and_close(coroutine))
+
+    async def run_and_close(self, coroutine):
+        try:
+            return await coroutine
+        finally:
+            self.close()
+
+    async def translate_document(self, translate_class, filepath, filename, **kwargs):
+        """ Translate a file with one of the TranslateXxxx classes without blocking the event loop. """
+        self.bind_loop()
+        return await self.loop.run_in_executor(
+            None, lambda: translate_class(filepath, filename, self, **kwargs)
+        )
+
+    def close(self):
+        """ Close the idle connections. """
+        if self.pool:
+            self.pool.close()
+        self.loop = self.pool = self.semaphore = None
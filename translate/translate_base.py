@@ -2,23 +2,44 @@
 import re
 
 import lxml.etree
-import lxml.html
 
+import contextlib
+import copy
 import html
+import importlib
+import inspect
+import itertools
 import json
 import os
+import posixpath
+import shutil
+import sqlite3
 import sys
+import threading
+import time
 import warnings
+import zipfile
 from collections import defaultdict
-from docx import Document
-from google.cloud.translate_v2 import Client
-from openpyxl import load_workbook
-from openpyxl.cell import Cell
-from pptx import Presentation
-from pptx.oxml import CT_TextLineBreak
-
-
-CREDS = os.environ["GOOGLE_APPLICATION_CREDENTIALS"]
+from concurrent.futures import ThreadPoolExecutor
+
+from translate.metrics import Metrics
+from translate.placeholders import Placeholders
+from translate.rate_limit import RETRIES, retry_delay
+from translate.revision import Revision
+from translate.translation_cache import TranslationCache
+from translate.translation_memory import MEMORY_EXTENSIONS, TranslationMemory, is_memory_file
+
+
+# the credentials file is only read when a translator first sends a request to the cloud
+CREDS = os.environ.get("GOOGLE_APPLICATION_CREDENTIALS")
+# the libraries for each format are imported by the classes that use them, so that starting up (for --help, or a
+# preview of a text file) does not wait for all of them; their names can still be imported from this module
+FORMAT_LIBRARIES = {
+    'Document': 'docx',
+    'Presentation': 'pptx',
+    'Workbook': 'openpyxl',
+    'load_workbook': 'openpyxl',
+}
 DOCX_STYLE_PROPERTY = {
     'font': {
         'color': {
@@ -46,18 +67,80 @@ LANGUAGE_PROPERTIES = {
 TRANSLATION_RULES = {
     'ignore_styles': ['Code', 'Normal-No spellcheck', 'Legal Text'],
 }
+BATCH_LIMITS = {
+    # Cloud Translation v2 accepts at most 128 segments per request, and recommends at most 5K characters
+    'segments': 128,
+    'characters': 5000,
+}
+MAX_THREADS = 16
+OOXML_NAMESPACES = {
+    'a': 'http://schemas.openxmlformats.org/drawingml/2006/main',
+    'cp': 'http://schemas.openxmlformats.org/package/2006/metadata/core-properties',
+    'dc': 'http://purl.org/dc/elements/1.1/',
+    'r': 'http://schemas.openxmlformats.org/package/2006/relationships',
+    's': 'http://schemas.openxmlformats.org/spreadsheetml/2006/main',
+    'w': 'http://schemas.openxmlformats.org/wordprocessingml/2006/main',
+    'xml': 'http://www.w3.org/XML/1998/namespace',
+}
+DOCX_RUN_PROPERTIES = {
+    # the w:rPr elements behind the font properties in DOCX_STYLE_PROPERTY: attributes compared, or None for on/off
+    'rFonts': ('ascii',), 'sz': ('val',), 'color': ('val', 'themeColor'), 'highlight': ('val',), 'u': ('val',),
+    'vertAlign': ('val',), 'b': None, 'i': None, 'strike': None, 'dstrike': None, 'noProof': None, 'vanish': None,
+    'oMath': None, 'rtl': None, 'outline': None, 'emboss': None, 'shadow': None, 'imprint': None, 'caps': None,
+    'smallCaps': None, 'webHidden': None, 'cs': None, 'bCs': None, 'iCs': None, 'snapToGrid': None,
+    'specVanish': None,
+}
+PPTX_RUN_PROPERTIES = ['sz', 'b', 'i', 'u']  # a:rPr attributes behind the font properties python-pptx offers
+STREAM_WINDOW = 1024  # segments read ahead and translated together in streaming mode
+
+
+def __getattr__(name):
+    """ Import a name from the library for a format (see FORMAT_LIBRARIES) when it is first asked for. """
+    if name in FORMAT_LIBRARIES:
+        return getattr(importlib.import_module(FORMAT_LIBRARIES[name]), name)
+    raise AttributeError("module %r has no attribute %r" % (__name__, name))
+
+
+def make_client(creds, api_endpoint=None):
+    """ A Cloud Translate client, from a credentials file, or anonymous for a local endpoint without one. """
+    from google.cloud.translate_v2 import Client
+    options = {'client_options': {'api_endpoint': api_endpoint}} if api_endpoint else {}
+    if api_endpoint and not (creds and os.path.isfile(creds)):
+        from google.auth.credentials import AnonymousCredentials
+        return Client(credentials=AnonymousCredentials(), **options)
+    elif creds:
+        return Client.from_service_account_json(creds, **options)
+    # without GOOGLE_APPLICATION_CREDENTIALS, the application default credentials are looked for
+    return Client(**options)
 
 
 class GoogleTranslate(object):
-    """ Establish a Google Cloud Translate client to translate passages of text. """
-    def __init__(self, creds, target_lang, source_lang=None, online=True, history=None, show=0):
-        self.client = Client.from_service_account_json(creds)
+    """ Establish a Google Cloud Translate client to translate passages of text, from one or more threads. """
+    def __init__(self, creds, target_lang, source_lang=None, online=True, history=None, show=0, threads=1,
+                 limiter=None, retries=RETRIES, endpoint=None, metrics=None, normalize=False, cache_size=None):
+        self.creds = creds
+        self.api_endpoint = endpoint
+        self._client = None
+        self.client_lock = threading.Lock()
         self.target_lang = target_lang
         self.source_lang = source_lang
         self.online = online
         self.history = bool(history) and online
         self.history_file = history
         self.show = show
+        self.threads = max(1, min(threads, MAX_THREADS))
+        self.limiter = limiter
+        self.retries = max(0, retries)
+        self.metrics = metrics if metrics is not None else Metrics()
+        self.normalize = normalize
+        if cache_size is not None and not (self.history and is_memory_file(history)):
+            # what a bounded cache evicts must be found again, not sent (and billed) a second time
+            warnings.warn('A bounded cache needs a translation memory (%s) as the history - keeping every '
+                          'translation in memory' % ', '.join(MEMORY_EXTENSIONS))
+            cache_size = None
+        self.cache_size = cache_size
+        self.lock = threading.RLock()
+        self.memory = None
         self.prepare_translation()
         self.stats = defaultdict(dict)
 
@@ -68,7 +151,11 @@ class GoogleTranslate(object):
         self.dict_hits = 0
         self.empty_strings = 0
         self.translated = {}
-        if self.history:
+        self.lost_keys = set()
+        self.reverse = None
+        if self.history and is_memory_file(self.history_file):
+            self.open_memory()
+        elif self.history:
             if os.path.exists(self.history_file):
                 try:
                     with open(self.history_file, 'r') as f:
@@ -79,44 +166,251 @@ class GoogleTranslate(object):
                         self.history_file, fallback_history_file
                     ))
                     self.history_file = fallback_history_file
+        if self.cache_size is not None:
+            # the translations are found again in the translation memory, so only their digests need be kept
+            self.translated = TranslationCache(self.cache_size, digest_keys=True)
+
+    def reverse_translator(self):
+        """
+        The translator from the target language back to the source, for a cross-check, sharing this one's client,
+        settings and stats but with a dictionary and history of its own.  It is made once and kept, so that every
+        document cross-checked in a batch (or by a server) shares its dictionary and adds to its stats.
+        """
+        with self.lock:
+            if self.reverse is None:
+                reverse = copy.copy(self)
+                reverse.target_lang, reverse.source_lang = self.source_lang, self.target_lang
+                if reverse.history and reverse.memory is None:
+                    body, dot, extn = reverse.history_file.rpartition('.')
+                    reverse.history_file = '%s_%s.%s' % (body, reverse.target_lang, extn) if dot else (
+                        '%s_%s' % (reverse.history_file, reverse.target_lang))
+                # the reverse language pair opens a memory of its own, leaving this translator's open
+                reverse.memory = None
+                reverse.prepare_translation()
+                self.reverse = reverse
+            return self.reverse
+
+    def open_memory(self):
+        """ Open the translation memory for the current language pair. """
+        if self.memory is not None:
+            self.memory.close()
+        try:
+            self.memory = TranslationMemory(self.history_file, self.source_lang, self.target_lang)
+        except sqlite3.Error:
+            fallback_history_file = os.path.join(os.environ['HOME'], 'history_file.db')
+            warnings.warn("'%s' is not a usable database - saving history in home directory as:\n '%s' " % (
+                self.history_file, fallback_history_file
+            ))
+            self.history_file = fallback_history_file
+            self.memory = TranslationMemory(self.history_file, self.source_lang, self.target_lang)
 
+    @property
+    def client(self):
+        """ The cloud client, created on first use. """
+        with self.client_lock:
+            if self._client is None:
+                self._client = make_client(self.creds, self.api_endpoint)
+            return self._client
 
     def request_translation(self, string):
         return self.client.translate(string, target_language=self.target_lang, source_language=self.source_lang)
 
+    def request_batch(self, strings):
+        return self.client.translate(strings, target_language=self.target_lang, source_language=self.source_lang)
+
+    def send(self, request, strings):
+        """ Call request(strings) within the rate limit, retrying after a backoff if the cloud refuses it. """
+        characters = len(strings) if isinstance(strings, str) else sum(len(string) for string in strings)
+        for attempt in itertools.count():
+            if self.limiter is not None:
+                self.metrics.record_wait(self.limiter.wait(characters))
+            start = self.metrics.clock()
+            try:
+                response = request(strings)
+            except Exception as error:
+                self.metrics.record_request(self.metrics.clock() - start, failed=True)
+                delay = retry_delay(error, attempt, self.retries)
+                if delay is None:
+                    raise
+                time.sleep(delay)
+            else:
+                self.metrics.record_request(self.metrics.clock() - start, characters)
+                return response
+
+    def clean_translation(self, translation):
+        """ Unescape the returned text and apply any language-specific overwrites. """
+        # TODO: if not self.source_lang, look at ['detectedSourceLanguage']
+        translation = html.unescape(translation)
+        if self.target_lang in LANGUAGE_PROPERTIES and 'overwrite' in LANGUAGE_PROPERTIES[self.target_lang]:
+            for each in LANGUAGE_PROPERTIES[self.target_lang]['overwrite']:
+                if each in translation:
+                    translation = LANGUAGE_PROPERTIES[self.target_lang]['overwrite'][each].join(
+                        (translation.split(each))
+                    )
+        return translation
+
+    def show_progress(self, string):
+        if self.show:
+            print("{}{}".format(string[:self.show], " ..." if len(string) > self.show else ""))
+
+    def cache_key(self, string):
+        """ The string to look up and send in place of `string`, and the Placeholders to restore, if normalizing. """
+        if self.normalize and string:
+            placeholders = Placeholders(string)
+            if placeholders.key != string and placeholders.key not in self.lost_keys:
+                return placeholders.key, placeholders
+        return string, None
+
+    def lose_key(self, key):
+        """ Stop using a key whose translation lost a placeholder, so its strings are translated as they are. """
+        with self.lock:
+            self.lost_keys.add(key)
+            self.translated.pop(key, None)
+
     def translate(self, string):
         """ Translate a single text element. """
-        if string and string not in self.translated:
-            if self.show:
-                print("{}{}".format(string[:self.show], " ..." if len(string) > self.show else ""))
-
-            if self.online:
-                translation = self.request_translation(string)['translatedText']
-                # TODO: if not self.source_lang, look at ['detectedSourceLanguage']
-                translation = html.unescape(translation)
-                if self.target_lang in LANGUAGE_PROPERTIES and 'overwrite' in LANGUAGE_PROPERTIES[self.target_lang]:
-                    for each in LANGUAGE_PROPERTIES[self.target_lang]['overwrite']:
-                        if each in translation:
-                            translation = LANGUAGE_PROPERTIES[self.target_lang]['overwrite'][each].join(
-                                (translation.split(each))
-                            )
-                self.translated.update({string: translation})
-                self.cloud_requests += 1
+        original = string
+        string, placeholders = self.cache_key(string)
+        with self.lock:
+            if self.memory is not None and string and string not in self.translated:
+                translation = self.memory.get(string)
+                if translation is not None:
+                    self.translated.update({string: translation})
+
+            if string and string not in self.translated:
+                self.show_progress(string)
+
+                if self.online:
+                    translation = self.clean_translation(
+                        self.send(self.request_translation, string)['translatedText']
+                    )
+                    self.translated.update({string: translation})
+                    self.cloud_requests += 1
+                    if self.memory is not None:
+                        self.memory.update([(string, translation)])
+
+                else:
+                    self.translated.update({string: "%s(%s)" % (self.target_lang, string)})
+                    self.dummy_text += 1
+
+                string = u'{}'.format(self.translated[string])
+
+            elif string:
+                string = u'{}'.format(self.translated[string])
+                self.dict_hits += 1
 
             else:
-                self.translated.update({string: "%s(%s)" % (self.target_lang, string)})
-                self.dummy_text += 1
+                self.empty_strings += 1
+
+        if placeholders is not None:
+            restored = placeholders.restore(string)
+            if restored is None:
+                self.lose_key(placeholders.key)
+                return self.translate(original)
+            string = restored
+        return string
 
-            string = u'{}'.format(self.translated[string])
+    def batches(self, strings):
+        """ Group strings so that each request respects the segment and character limits of the API. """
+        batch, characters = [], 0
+        for string in strings:
+            if batch and (len(batch) >= BATCH_LIMITS['segments']
+                          or characters + len(string) > BATCH_LIMITS['characters']):
+                yield batch
+                batch, characters = [], 0
+            batch.append(string)
+            characters += len(string)
+        if batch:
+            yield batch
+
+    def translate_many(self, strings):
+        """
+        Translate a list of text elements, sending the uncached strings to the cloud in batches.
 
-        elif string:
-            string = u'{}'.format(self.translated[string])
-            self.dict_hits += 1
+        The result, the translation dictionary and the stats are the same as calling translate() on each string.
+        The lock is not held while waiting for the cloud, so other threads can use the dictionary meanwhile.
+        Each batch is stored as it arrives, so the translations received before a failure are kept.
+        """
+        keys = [self.cache_key(string) for string in strings]
+        pending, found = self.plan_translation([key for (key, _) in keys])
+        if self.online:
+            batches = list(self.batches(pending))
 
-        else:
-            self.empty_strings += 1
+            def request_and_store(batch):
+                self.store_translations(batch, self.send(self.request_batch, batch), found)
 
-        return string
+            if self.threads > 1 and len(batches) > 1:
+                with ThreadPoolExecutor(max_workers=min(self.threads, len(batches))) as executor:
+                    list(executor.map(request_and_store, batches))
+            else:
+                for batch in batches:
+                    request_and_store(batch)
+
+        else:
+            self.store_dummy_text(pending, found)
+
+        translations, lost = self.restore_placeholders(keys, found)
+        for i, translation in zip(lost, self.translate_many([strings[i] for i in lost]) if lost else []):
+            translations[i] = translation
+        return translations
+
+    def restore_placeholders(self, keys, found):
+        """ The translation of each string from that of its key, and the indexes of those that lost a placeholder. """
+        translations, lost = [], []
+        for i, (key, placeholders) in enumerate(keys):
+            translation = u'{}'.format(found[key]) if key else key
+            if placeholders is not None:
+                translation = placeholders.restore(translation)
+                if translation is None:
+                    # translated again as it is, once the key is known to be lost
+                    self.lose_key(key)
+                    lost.append(i)
+            translations.append(translation)
+        if lost:
+            with self.lock:
+                # translated one by one, only the first string with a lost key would have looked the key up
+                self.dict_hits -= len(lost) - len({keys[i][0] for i in lost})
+        return translations, lost
+
+    def plan_translation(self, strings):
+        """ Count dictionary hits and empty strings; return the strings still to translate, and those known. """
+        pending, found, remembered = [], {}, {}
+        with self.lock:
+            if self.memory is not None:
+                remembered = self.memory.get_many(
+                    {string for string in strings if string and string not in self.translated}
+                )
+            for string in strings:
+                if string and string not in self.translated and string not in remembered and string not in found:
+                    self.show_progress(string)
+                    pending.append(string)
+                    found[string] = None
+                elif string:
+                    found.setdefault(string, self.translated.get(string, remembered.get(string)))
+                    self.dict_hits += 1
+                else:
+                    self.empty_strings += 1
+            # added last, as a bounded cache may evict some of the strings just looked up
+            self.translated.update(remembered)
+        return pending, found
+
+    def store_translations(self, batch, response, found):
+        """ Add the cloud response for a batch of strings to the translation dictionary. """
+        translations = [self.clean_translation(each['translatedText']) for each in response]
+        with self.lock:
+            found.update(zip(batch, translations))
+            self.translated.update(zip(batch, translations))
+            self.cloud_requests += len(batch)
+        if self.memory is not None:
+            self.memory.update(zip(batch, translations))
+
+    def store_dummy_text(self, pending, found):
+        """ Mark the strings that would be sent to the cloud, when offline. """
+        translations = ["%s(%s)" % (self.target_lang, string) for string in pending]
+        found.update(zip(pending, translations))
+        with self.lock:
+            self.translated.update(zip(pending, translations))
+            self.dummy_text += len(pending)
 
     def multi_line(self, string):
         lines = string.split('\n')
@@ -124,25 +418,65 @@ class GoogleTranslate(object):
 
     def save_history(self):
         """ Save the translation dictionary as a history file. """
-        if self.history:
-            try:
-                with open(self.history_file, 'w') as f:
-                    json.dump(self.translated, f)
-            except (IOError, OSError):
-                fallback_history_file = os.path.join(os.environ['HOME'], 'history_file.json')
-                warnings.warn("'%s' is not writeable - saving history in home directory as:\n '%s' " % (
-                    self.history_file, fallback_history_file
-                ))
-                self.history_file = fallback_history_file
-                with open(self.history_file, 'w') as f:
-                    json.dump(self.translated, f)
+        if self.memory is not None:
+            pass  # translations are committed to the translation memory as they arrive
+        elif self.history:
+            # the dictionary may be growing in other threads meanwhile
+            with self.lock:
+                try:
+                    with open(self.history_file, 'w') as f:
+                        json.dump(self.translated, f)
+                except (IOError, OSError):
+                    fallback_history_file = os.path.join(os.environ['HOME'], 'history_file.json')
+                    warnings.warn("'%s' is not writeable - saving history in home directory as:\n '%s' " % (
+                        self.history_file, fallback_history_file
+                    ))
+                    self.history_file = fallback_history_file
+                    with open(self.history_file, 'w') as f:
+                        json.dump(self.translated, f)
 
     def update_stats(self):
         """ Provide a set of summary stats on how the translation was done. """
         language_pair = '%s-%s' % (self.source_lang, self.target_lang)
         for stat in ['cloud_requests', 'dummy_text', 'dict_hits', 'empty_strings']:
             self.stats[language_pair].update({stat: getattr(self, stat)})
-        self.stats[language_pair].update({'history': len(self.translated)})
+        history = self.memory if self.memory is not None else self.translated
+        self.stats[language_pair].update({'history': len(history)})
+
+
+class Segment(object):
+    """ A text element found in a document, and where to write its translation back. """
+    __slots__ = ('element', 'attr', 'lines', 'whitespace')
+
+    def __init__(self, element, attr, multi_line=True, preserve_whitespace=False):
+        self.element = element
+        self.attr = attr
+        text = element[attr] if isinstance(element, list) else getattr(element, attr)
+        self.whitespace = PreserveWhitespace(text) if preserve_whitespace else None
+        if self.whitespace:
+            text = self.whitespace.body
+        self.lines = text.split('\n') if multi_line else [text]
+
+    def write(self, lines):
+        """ Replace the text of the element with the translated lines. """
+        text = '\n'.join(lines)
+        if self.whitespace:
+            text = self.whitespace.replace(text)
+        if isinstance(self.element, list):
+            self.element[self.attr] = text
+        else:
+            setattr(self.element, self.attr, text)
+
+
+@contextlib.contextmanager
+def history_saved_on_error(translators):
+    """ Save the history of each translator if the translation stops with an error, to keep the work done. """
+    try:
+        yield
+    except BaseException:
+        for translator in translators:
+            translator.save_history()
+        raise
 
 
 class TranslateBase(object):
@@ -151,8 +485,14 @@ class TranslateBase(object):
         self.filepath = filepath
         self.source = filename
         self.filename, self.ext = filename.rsplit('.', 1)
-        self.translator = translator
+        self.translators = list(translator) if isinstance(translator, (list, tuple)) else [translator]
+        self.translator = self.translators[0]
         self.condense = condense
+        self.segments = []
+        self.style_cache = {}
+        self.metrics = getattr(self.translator, 'metrics', None)
+        self.language_defaults = None
+        self.revisions = {}
         self.cross_check = hasattr(self.translator, 'source_lang') and bool(self.translator.source_lang) and cross_check
         if cross_check and not bool(self.translator.source_lang):
             warnings.warn('Not possible to translate back: no source language was given')
@@ -161,30 +501,180 @@ class TranslateBase(object):
             self.target = self.add_lang_to_filename(self.source)
         else:
             self.target = target
+        if len(self.translators) > 1:
+            self.targets = [self.add_lang_to_filename(target or self.source, each.target_lang)
+                            for each in self.translators]
+        else:
+            self.targets = [self.target]
 
     def execute(self, translate_method):
         """ Method to combine translation and cross_check as in subclass.__init__ for .docx etc """
-        translate_method()
+        with history_saved_on_error(self.translators):
+            if len(self.translators) > 1 or self.cross_check:
+                self.translate_languages()
+            else:
+                translate_method()
+                self.finish_language()
+
+        # Google does not close the session: Connection='keep-alive'.  The line below did not work.
+        # self.translator.client._connection.http.close()
+
+    def finish_language(self):
+        """ Save the history and stats of the current translator. """
         self.translator.save_history()
         self.translator.update_stats()
 
-        if self.cross_check:
-            self.swap_languages()
-            translate_method()
-            self.translator.save_history()
-            self.translator.update_stats()
+    def translate_languages(self):
+        """
+        Segment the document once, translate it into every target language (and back, for a cross-check)
+        concurrently, and save each.  The translations back are written to the segments still held in memory, so
+        the output is not extracted again.
+        """
+        TranslateBatch([self], self.translators).execute()
 
-        # Google does not close the session: Connection='keep-alive'.  The line below did not work.
-        # self.translator.client._connection.http.close()
+    def reverse_translators(self, translators):
+        """ The translators back into the source language for a cross-check, or None for each if there is none. """
+        if not self.cross_check:
+            return [None] * len(translators)
+        return [translator.reverse_translator() for translator in translators]
+
+    def cross_check_target(self, target, translator):
+        """ The file name for the translation of `target` back into the source language of `translator`. """
+        return self.add_lang_to_filename(target, translator.source_lang)
+
+    def translate(self):
+        """ Collect the text elements of the document, translate them in bulk, write them back and save. """
+        self.segments = []
+        with self.timed('extract'):
+            self.extract()
+            lines = self.source_lines()
+        with self.timed('translate'):
+            translations = self.translate_lines(lines)
+        with self.timed('write_back'):
+            self.write_back(translations)
+        self.save_output()
+
+    def estimate_cost(self):
+        """
+        Collect the text elements of the document and pass their lines to each translator (and back, for a
+        cross-check), so that a translator with an `estimate` counts them, without writing back or saving anything.
+        """
+        self.segments = []
+        self.extract()
+        lines = self.source_lines()
+        for translator, reverse in zip(self.translators, self.reverse_translators(self.translators)):
+            self.translate_both_ways(lines, translator, reverse)
+
+    def extract(self):
+        """ Walk the document, calling collect() for each text element (implemented by each file format). """
+        raise NotImplementedError
+
+    def save(self):
+        """ Write the translated document (implemented by each file format). """
+        raise NotImplementedError
+
+    def timed(self, phase):
+        """ A context in which the time spent is added to a phase of the metrics, if the translator has them. """
+        return self.metrics.phase(phase) if self.metrics is not None else contextlib.nullcontext()
+
+    def save_output(self):
+        """ Save the translated document, timing it and counting the bytes written. """
+        with self.timed('save'):
+            self.save()
+        if self.metrics is not None:
+            self.metrics.record_output(os.path.join(self.filepath, self.target))
+
+    def collect(self, element, attr, multi_line=True, preserve_whitespace=False):
+        """ Record a text element, and where it sits, for translation in bulk. """
+        self.segments.append(Segment(element, attr, multi_line=multi_line, preserve_whitespace=preserve_whitespace))
+
+    def source_lines(self):
+        """ List the lines of text of all segments, in document order. """
+        return [line for segment in self.segments for line in segment.lines]
+
+    def translate_lines(self, lines, translator=None):
+        """ Translate lines in bulk, keeping the translations of a previous version where they are unchanged. """
+        translator = translator or self.translator
+        revision = self.revisions.get((translator.source_lang, translator.target_lang)) if self.revisions else None
+        if revision is not None:
+            if getattr(translator, 'estimate', None) is not None:
+                # a file with nothing to send is listed all the same, as reused in full
+                translator.estimate.record(self.source, translator, [])
+            return revision.translate(lines, lambda changed: self.request_lines(changed, translator))
+        return self.request_lines(lines, translator)
+
+    def request_lines(self, lines, translator):
+        """ Translate lines in bulk, waiting for the result if the translator is asynchronous. """
+        if getattr(translator, 'estimate', None) is not None:
+            translator.estimate.record(self.source, translator, lines)
+        translations = translator.translate_many(lines)
+        if inspect.isawaitable(translations):
+            translations = translator.run(translations)
+        return translations
+
+    def translate_both_ways(self, lines, translator, reverse=None):
+        """ Translate lines, then translate the translations back with `reverse`, if given, for a cross-check. """
+        translations = self.translate_lines(lines, translator)
+        return translations, self.translate_lines(translations, reverse) if reverse is not None else None
+
+    def write_back(self, translations):
+        """ Write translated lines, in the same order as source_lines(), back to their segments. """
+        translations = iter(translations)
+        for segment in self.segments:
+            segment.write([next(translations) for _ in segment.lines])
+
+    def revise(self, previous, previous_targets=None):
+        """
+        Keep the translations of a previous version of the document, `previous`, for the segments that are unchanged.
+
+        The translated output of the previous version for each target language is `previous_targets`, by default
+        named as translate names its output (e.g. my_document_v1_fr.docx).  Both are extracted as this document
+        is, so the output must have been written by translate, though it may since have been corrected by hand.
+        An output that is missing, or whose segments no longer match those of the previous version, is passed over
+        with a warning, and the document is then translated in full for that language.  The document must be
+        translated on its own (or in a TranslateBatch of its own), as its lines are aligned as a whole.
+        """
+        previous = os.path.join(self.filepath, previous)
+        if previous_targets is None:
+            previous_targets = [self.add_lang_to_filename(previous, translator.target_lang)
+                                for translator in self.translators]
+        sources = self.previous_segments(previous)
+        for translator, target in zip(self.translators, previous_targets):
+            target = os.path.join(self.filepath, target)
+            if not os.path.isfile(target):
+                warnings.warn("No previous translation '%s' - translating in full" % target)
+                continue
+            translations = self.previous_segments(target)
+            if [len(segment.lines) for segment in sources] != [len(segment.lines) for segment in translations]:
+                warnings.warn("'%s' does not match the segments of '%s' - translating in full" % (target, previous))
+                continue
+            self.revisions[(translator.source_lang, translator.target_lang)] = Revision(
+                [line for segment in sources for line in segment.lines],
+                [line for segment in translations for line in segment.lines],
+                name=os.path.basename(target),
+            )
+
+    def previous_segments(self, filename):
+        """ Load an earlier version of the document, or of its output, and extract its segments as this one's. """
+        filepath, filename = os.path.split(filename)
+        document = type(self)(filepath, filename, self.translators, condense=self.condense, defer=True)
+        document.segments = []
+        document.extract()
+        return document.segments
 
     def swap_languages(self):
         """ Swap languages and re-translate as a crude way of assessing the quality of the translation. """
+        self.swap_translator()
+        self.source, self.target = (self.target, self.add_lang_to_filename(self.target))
+
+    def swap_translator(self):
+        """ Reverse the languages of the translator, giving it a history of its own and an empty dictionary. """
         self.translator.target_lang, self.translator.source_lang = (
             self.translator.source_lang, self.translator.target_lang
         )
-        if self.translator.history:
+        if self.translator.history and getattr(self.translator, 'memory', None) is None:
+            # a translation memory is keyed by language pair, so it can be shared by both directions
             self.translator.history_file = self.add_lang_to_filename(self.translator.history_file)
-        self.source, self.target = (self.target, self.add_lang_to_filename(self.target))
         self.translator.prepare_translation()
 
     def add_lang_to_filename(self, filename, lang=None):
@@ -201,38 +691,70 @@ class TranslateBase(object):
 
     def set_language(self, document_object):
         """ Configure the language settings in the output document. """
-        if self.translator.target_lang in LANGUAGE_PROPERTIES:
-            if 'lang' in LANGUAGE_PROPERTIES[self.translator.target_lang]:
-                document_object.core_properties.language = LANGUAGE_PROPERTIES[self.translator.target_lang]['lang']
+        settings = self.language_settings(lambda: {
+            'lang': document_object.core_properties.language,
+            'font': None if isinstance(self, TranslatePptx) else document_object.styles["Normal"].font.name,
+        })
 
-            if not isinstance(self, TranslatePptx) and 'font' in LANGUAGE_PROPERTIES[self.translator.target_lang]:
-                document_object.styles["Normal"].font.name = LANGUAGE_PROPERTIES[self.translator.target_lang]['font']
+        if 'lang' in settings:
+            document_object.core_properties.language = settings['lang']
+
+        if not isinstance(self, TranslatePptx) and 'font' in settings:
+            document_object.styles["Normal"].font.name = settings['font']
 
         # TODO: [future] self.document.styles["Normal"] language = LANGUAGE_PROPERTIES[self.translator.target_lang]['lang']
         # (if/when supported by python-docx)
 
+    def language_settings(self, read_defaults):
+        """ The language settings for the current target language, given a function to read the source settings. """
+        settings = LANGUAGE_PROPERTIES.get(self.translator.target_lang, {})
+        if len(self.translators) > 1:
+            # restore the settings of the source document between target languages
+            if self.language_defaults is None:
+                self.language_defaults = read_defaults()
+            settings = dict(self.language_defaults, **settings)
+        return settings
+
     def condense_runs(self, paragraph, brk_run=None):
-        if len(paragraph.runs) > 1:
-            self._previous_run = paragraph.runs[0]
-            for i, run in enumerate(paragraph.runs[1:]):
+        runs = paragraph.runs
+        if len(runs) > 1:
+            # one fingerprint for each run, rather than a walk of the font properties for each pair
+            styles = [self.run_style(run, paragraph) for run in runs]
+            self._previous_run, previous_style = runs[0], styles[0]
+            for i, (run, style) in enumerate(zip(runs[1:], styles[1:])):
                 if all((
                         self._previous_run.text,
                         run.text,
                         (not isinstance(self, TranslatePptx) or not brk_run[i + 1]),
-                        self.same_style_runs(self._previous_run, run, paragraph, DOCX_STYLE_PROPERTY)
+                        previous_style == style,
                 )):
                     self._previous_run.text += run.text
                     run.text = ''
                 else:
-                    self._previous_run = run
+                    self._previous_run, previous_style = run, style
+
+    def run_style(self, run, paragraph):
+        """ A hashable summary of the font properties of a run, falling back to those of its paragraph. """
+        if isinstance(self, TranslatePptx):
+            pPr = paragraph._p.pPr
+            return pptx_run_style(run._r.rPr, pPr.find('a:defRPr', OOXML_NAMESPACES) if pPr is not None else None)
+        return docx_run_style(run._r.rPr, self.paragraph_style(paragraph)[1])
+
+    def paragraph_style(self, paragraph):
+        """ The name and run properties (w:rPr) of the style of a paragraph, looked up once for each style. """
+        style_id = paragraph._p.style
+        if style_id not in self.style_cache:
+            style = paragraph.style
+            self.style_cache[style_id] = (style.name, style.element.rPr) if style is not None else (None, None)
+        return self.style_cache[style_id]
 
     def translate_paragraphs(self, document_object):
-        """ Perform the translation of each text element """
+        """ Collect each text element of the paragraphs for translation """
         for paragraph in document_object:
             translate_style = any((
                                       isinstance(self, TranslatePptx),
                                       isinstance(self, TranslateDocx)
-                                      and paragraph.style.name not in TRANSLATION_RULES['ignore_styles'],
+                                      and self.paragraph_style(paragraph)[0] not in TRANSLATION_RULES['ignore_styles'],
             ))
             brk_run = self.break_runs(paragraph) if isinstance(self, TranslatePptx) else None
             if translate_style:
@@ -240,7 +762,7 @@ class TranslateBase(object):
                     self.condense_runs(paragraph, brk_run=brk_run)
                 for run in paragraph.runs:
                     if run.text:  # and '\n' in run.text:
-                        run.text = self.translator.multi_line(run.text)
+                        self.collect(run, 'text')
 
     def same_style_runs(self, reference, comparison, para_style, attrs):
         """
@@ -282,6 +804,72 @@ class TranslateBase(object):
         return True
 
 
+class TranslateBatch(object):
+    """
+    Translate several documents, loaded with defer=True, as one job.
+
+    The segments of every document are collected before any request is sent, so a string that the documents
+    share (a legal footer, slide-master text, column headings) is translated once per batch rather than once per
+    file, and the stats of each translator cover the whole batch.
+    """
+    def __init__(self, documents, translator):
+        self.documents = documents
+        self.translators = list(translator) if isinstance(translator, (list, tuple)) else [translator]
+        self.cross_check = bool(documents) and documents[0].cross_check
+
+    def execute(self):
+        """ Extract all the documents, translate them into each language concurrently, then write and save each. """
+        if not self.documents:
+            return
+        reverse = self.documents[0].reverse_translators(self.translators)
+        with history_saved_on_error(self.translators + [each for each in reverse if each is not None]):
+            timed = self.documents[0].timed
+            with timed('extract'):
+                for document in self.documents:
+                    document.segments = []
+                    document.extract()
+                originals = [(document.source, document.segments) for document in self.documents]
+                lines = self.source_lines()
+            with timed('translate'), ThreadPoolExecutor(max_workers=len(self.translators)) as executor:
+                # the cross-check of each language is requested as soon as its translations arrive
+                translations = list(executor.map(
+                    lambda pair: self.documents[0].translate_both_ways(lines, *pair), zip(self.translators, reverse)
+                ))
+
+            for i, (translator, (translated, checked)) in enumerate(zip(self.translators, translations)):
+                for document, (source, segments) in zip(self.documents, originals):
+                    # every segment is overwritten, so whatever the previous language left in the document goes
+                    document.translator, document.source, document.segments = translator, source, segments
+                    document.target = document.targets[i]
+                self.write_back(translated)
+                translator.save_history()
+                translator.update_stats()
+
+                if checked is not None:
+                    # the segments, holding this language's translation, are overwritten with the translation back
+                    for document in self.documents:
+                        document.translator = reverse[i]
+                        document.source, document.target = (
+                            document.target, document.cross_check_target(document.target, translator)
+                        )
+                    self.write_back(checked)
+                    reverse[i].save_history()
+                    reverse[i].update_stats()
+
+    def source_lines(self):
+        return [line for document in self.documents for line in document.source_lines()]
+
+    def write_back(self, translations):
+        """ Share the translated lines out between the documents, and save each one. """
+        start = 0
+        for document in self.documents:
+            end = start + sum(len(segment.lines) for segment in document.segments)
+            with document.timed('write_back'):
+                document.write_back(translations[start:end])
+            document.save_output()
+            start = end
+
+
 class PreserveWhitespace(object):
     # TODO: incorporate in other translators
     def __init__(self, string):
@@ -306,35 +894,322 @@ class TranslateExcel(TranslateBase):
     # TODO: [future] check not removing embedded images, once this is available in openpyxl
     # TODO: [future] preserve rich text formatting within a cell if/when this is available in openpyxl
     # Note: MergeCell formatting is not working in openpyxl 2.5.5 but does work in development code
-    def __init__(self, filepath, filename, translator, target=None, condense=False, cross_check=False):
+    def __init__(self, filepath, filename, translator, target=None, condense=False, cross_check=False, defer=False):
         super(TranslateExcel, self).__init__(filepath, filename, translator,
                                              target=target, condense=condense, cross_check=cross_check)
-        self.wb = load_workbook(os.path.join(self.filepath, self.source))
-        self.execute(self.translate)
-
-    def translate(self):
-        """ Perform the translation of each text element """
+        from openpyxl import load_workbook
+        with self.timed('load'):
+            self.wb = load_workbook(os.path.join(self.filepath, self.source))
+        if not defer:
+            self.execute(self.translate)
+
+    def extract(self):
+        """ Collect each text element for translation """
+        from openpyxl.cell import Cell
         for sheetname in self.wb.sheetnames:
             for row in self.wb[sheetname]:
                 for cell in row:
                     if isinstance(cell, Cell):
                         if cell.value and cell.data_type == 's':
-                            cell.value = self.translator.multi_line(cell.value)
+                            self.collect(cell, 'value')
 
+    def save(self):
         self.wb.save(os.path.join(self.filepath, self.target))
 
 
+class TranslatePackage(TranslateBase):
+    """
+    Translate the XML parts of an Office Open XML package (e.g. .xlsx) directly.
+
+    Only the parts that hold text are parsed, with lxml.  On saving they are written back, and every other member
+    of the zip file is copied across unchanged, so images, column widths and anything else that the python
+    libraries do not model are preserved.  Subclasses name the parts in text_parts() and walk them in extract().
+    """
+    def __init__(self, filepath, filename, translator, target=None, condense=False, cross_check=False):
+        super(TranslatePackage, self).__init__(filepath, filename, translator,
+                                               target=target, condense=condense, cross_check=cross_check)
+        self.package = os.path.join(self.filepath, self.source)
+        with self.timed('load'), zipfile.ZipFile(self.package) as archive:
+            self.parts = {name: lxml.etree.fromstring(archive.read(name)) for name in self.text_parts(archive)}
+
+    def text_parts(self, archive):
+        """ List the names of the parts to translate (implemented by each file format). """
+        raise NotImplementedError
+
+    def related_parts(self, archive, source, relationship):
+        """ List the parts that `source` ('' for the package) refers to with a type of relationship, e.g. 'styles'. """
+        folder, name = posixpath.split(source)
+        try:
+            rels = lxml.etree.fromstring(archive.read(posixpath.join(folder, '_rels', name + '.rels')))
+        except KeyError:
+            return []
+        return [posixpath.normpath(posixpath.join(folder, rel.get('Target'))).lstrip('/')
+                for rel in rels.iterfind('r:Relationship', OOXML_NAMESPACES)
+                if rel.get('Type').rsplit('/', 1)[-1] == relationship and rel.get('TargetMode') != 'External']
+
+    def save(self):
+        for segment in self.segments:
+            text = getattr(segment.element, segment.attr)
+            if lxml.etree.iselement(segment.element) and text and text != text.strip():
+                segment.element.set('{%s}space' % OOXML_NAMESPACES['xml'], 'preserve')
+
+        with zipfile.ZipFile(self.package) as source, \
+                zipfile.ZipFile(os.path.join(self.filepath, self.target), 'w') as target:
+            for info in source.infolist():
+                if info.filename in self.parts:
+                    target.writestr(info, lxml.etree.tostring(self.parts[info.filename], xml_declaration=True,
+                                                              encoding='UTF-8', standalone=True))
+                else:
+                    with source.open(info) as member, target.open(info, 'w') as copy:
+                        shutil.copyfileobj(member, copy)
+
+
+class TranslateExcelXml(TranslatePackage):
+    """
+    Translate the shared strings of an Excel (.xlsx) spreadsheet file directly.
+
+    Every text cell refers to an entry in the shared strings part, so each distinct string is translated once,
+    the worksheets are neither parsed nor rewritten, and nothing else in the file is changed.  The runs of rich
+    text are translated separately, keeping their formatting, unless `condense` is set.  Strings held inline in a
+    worksheet are left as they are.
+    """
+    def __init__(self, filepath, filename, translator, target=None, condense=False, cross_check=False, defer=False):
+        super(TranslateExcelXml, self).__init__(filepath, filename, translator,
+                                                target=target, condense=condense, cross_check=cross_check)
+        if not defer:
+            self.execute(self.translate)
+
+    def text_parts(self, archive):
+        return [part for workbook in self.related_parts(archive, '', 'officeDocument')
+                for part in self.related_parts(archive, workbook, 'sharedStrings')]
+
+    def extract(self):
+        """ Collect the text of each shared string, or of each run of a rich text string. """
+        for strings in self.parts.values():
+            for item in strings.iterfind('s:si', OOXML_NAMESPACES):
+                texts = item.findall('s:r/s:t', OOXML_NAMESPACES) or item.findall('s:t', OOXML_NAMESPACES)
+                if self.condense and len(texts) > 1:
+                    texts[0].text = ''.join(text.text or '' for text in texts)
+                    for text in texts[1:]:
+                        text.text = ''
+                for text in texts:
+                    if text.text:
+                        # the spaces between runs of rich text are kept where they were
+                        self.collect(text, 'text', preserve_whitespace=len(texts) > 1)
+
+
+def word_tag(name):
+    return '{%s}%s' % (OOXML_NAMESPACES['w'], name)
+
+
+class WordRun(object):
+    """ The text of a w:r element, read and written as python-docx does for Run.text. """
+    __slots__ = ('element',)
+
+    def __init__(self, element):
+        self.element = element
+
+    @property
+    def text(self):
+        text = []
+        for child in self.element:
+            name = lxml.etree.QName(child).localname if isinstance(child.tag, str) else None
+            if name == 't':
+                text.append(child.text or '')
+            elif name in ('tab', 'ptab'):
+                text.append('\t')
+            elif name == 'cr' or (name == 'br' and child.get(word_tag('type'), 'textWrapping') == 'textWrapping'):
+                text.append('\n')
+            elif name == 'noBreakHyphen':
+                text.append('-')
+        return ''.join(text)
+
+    @text.setter
+    def text(self, text):
+        for child in list(self.element):
+            if child.tag != word_tag('rPr'):
+                self.element.remove(child)
+        for part in re.split('([\t\r\n])', text):
+            if part == '\t':
+                lxml.etree.SubElement(self.element, word_tag('tab'))
+            elif part in ('\r', '\n'):
+                lxml.etree.SubElement(self.element, word_tag('br'))
+            elif part:
+                t = lxml.etree.SubElement(self.element, word_tag('t'))
+                t.text = part
+                if part != part.strip():
+                    t.set('{%s}space' % OOXML_NAMESPACES['xml'], 'preserve')
+
+
+def docx_run_style(rPr, style_rPr=None):
+    """ A hashable summary of the font properties (w:rPr) of a Word run, falling back to those of its style. """
+    style = {}
+    for properties in (style_rPr, rPr):
+        for child in (properties if properties is not None else []):
+            name = lxml.etree.QName(child).localname if isinstance(child.tag, str) else None
+            if name in DOCX_RUN_PROPERTIES:
+                if DOCX_RUN_PROPERTIES[name] is None:
+                    style[name] = child.get(word_tag('val'), 'true') not in ('0', 'false', 'off')
+                else:
+                    style[name] = tuple(child.get(word_tag(attr)) for attr in DOCX_RUN_PROPERTIES[name])
+    return tuple(sorted(style.items()))
+
+
+def pptx_run_style(rPr, paragraph_rPr=None):
+    """ A hashable summary of the font properties (a:rPr) of a PowerPoint run, falling back to its paragraph's. """
+    style = {}
+    for properties in (paragraph_rPr, rPr):
+        if properties is None:
+            continue
+        for attr in PPTX_RUN_PROPERTIES:
+            if properties.get(attr) is not None:
+                style[attr] = properties.get(attr) in ('1', 'true') if attr in ('b', 'i') else properties.get(attr)
+        latin = properties.find('a:latin', OOXML_NAMESPACES)
+        if latin is not None:
+            style['latin'] = latin.get('typeface')
+        fill = properties.find('a:solidFill', OOXML_NAMESPACES)
+        if fill is not None and len(fill):
+            style['color'] = (lxml.etree.QName(fill[0]).localname, fill[0].get('val'))
+    return tuple(sorted(style.items()))
+
+
+class TranslateDocxXml(TranslatePackage):
+    """
+    Translate text in a Word (.docx) document file directly in its XML.
+
+    Every paragraph (w:p) of the main document and of its headers and footers is found with lxml, including those
+    in nested tables, text boxes and content controls, which python-docx does not reach.  The runs (w:r) of each
+    paragraph, including those in hyperlinks, are read, condensed and written as TranslateDocx does, and paragraphs
+    in the styles listed in TRANSLATION_RULES['ignore_styles'] are left alone.
+    """
+    def __init__(self, filepath, filename, translator, target=None, condense=False, cross_check=False, defer=False):
+        super(TranslateDocxXml, self).__init__(filepath, filename, translator,
+                                               target=target, condense=condense, cross_check=cross_check)
+        if not defer:
+            self.execute(self.translate)
+
+    def text_parts(self, archive):
+        main = self.related_parts(archive, '', 'officeDocument')
+        self.text_part_names = main + [part for name in main for relationship in ['header', 'footer']
+                                       for part in self.related_parts(archive, name, relationship)]
+        self.styles_part = next(iter(self.related_parts(archive, main[0], 'styles') if main else []), None)
+        self.core_part = next(iter(self.related_parts(archive, '', 'core-properties')), None)
+        return self.text_part_names + [part for part in [self.styles_part, self.core_part] if part]
+
+    def extract(self):
+        """ Collect the text of the runs of each paragraph, in every part that holds text. """
+        styles = self.paragraph_styles()
+        for name in self.text_part_names:
+            for paragraph in self.parts[name].iter(word_tag('p')):
+                style = paragraph.find('w:pPr/w:pStyle', OOXML_NAMESPACES)
+                style_name, style_rPr = styles.get(style.get(word_tag('val')) if style is not None else None,
+                                                   styles.get(None, (None, None)))
+                if style_name in TRANSLATION_RULES['ignore_styles']:
+                    continue
+                runs = [WordRun(run) for run in self.paragraph_runs(paragraph)]
+                if self.condense:
+                    self.condense_word_runs(runs, style_rPr)
+                for run in runs:
+                    if run.text:
+                        self.collect(run, 'text')
+
+    def paragraph_runs(self, element):
+        """ The runs of a paragraph, but not those of a paragraph inside it (in a text box). """
+        for child in element:
+            if child.tag == word_tag('r'):
+                yield child
+            elif child.tag != word_tag('p'):
+                yield from self.paragraph_runs(child)
+
+    def condense_word_runs(self, runs, style_rPr):
+        """ Join the text of successive runs that have the same parent and font properties, as condense_runs(). """
+        styles = [docx_run_style(run.element.find('w:rPr', OOXML_NAMESPACES), style_rPr) for run in runs]
+        previous, previous_style = (runs[0], styles[0]) if runs else (None, None)
+        for run, style in zip(runs[1:], styles[1:]):
+            text = run.text
+            if all((previous.text, text, previous.element.getparent() is run.element.getparent(),
+                    previous_style == style)):
+                previous.text += text
+                run.text = ''
+            else:
+                previous, previous_style = run, style
+
+    def paragraph_styles(self):
+        """ Map the id of each paragraph style to its name and w:rPr, with the default style under None. """
+        from docx.styles import BabelFish
+        styles = {}
+        if self.styles_part:
+            for style in self.parts[self.styles_part].iterfind('w:style', OOXML_NAMESPACES):
+                if style.get(word_tag('type')) == 'paragraph':
+                    name = style.find('w:name', OOXML_NAMESPACES)
+                    name = BabelFish.internal2ui(name.get(word_tag('val'))) if name is not None else None
+                    styles[style.get(word_tag('styleId'))] = (name, style.find('w:rPr', OOXML_NAMESPACES))
+                    if style.get(word_tag('default')) in ('1', 'true', 'on'):
+                        styles[None] = styles[style.get(word_tag('styleId'))]
+        return styles
+
+    def save(self):
+        settings = self.language_settings(lambda: {'lang': self.core_language(), 'font': self.normal_font()})
+        if 'lang' in settings and self.core_part:
+            self.core_language(settings['lang'])
+        if 'font' in settings and self.styles_part:
+            self.normal_font(settings['font'])
+        super(TranslateDocxXml, self).save()
+
+    def core_language(self, *value):
+        """ Read the language in the document properties, or set it if a value is given. """
+        if not self.core_part:
+            return ''
+        core = self.parts[self.core_part]
+        language = core.find('dc:language', OOXML_NAMESPACES)
+        if value:
+            if language is None:
+                language = lxml.etree.SubElement(core, '{%s}language' % OOXML_NAMESPACES['dc'])
+            language.text = value[0]
+        return (language.text or '') if language is not None else ''
+
+    def normal_font(self, *value):
+        """ Read the font name of the Normal style, or set it if a value is given. """
+        styles = self.parts[self.styles_part] if self.styles_part else None
+        normal = styles.xpath('w:style[w:name/@w:val="Normal"]', namespaces={'w': OOXML_NAMESPACES['w']}) if (
+            styles is not None) else []
+        if not normal:
+            return None
+        normal = normal[0]
+        fonts = normal.find('w:rPr/w:rFonts', OOXML_NAMESPACES)
+        if value and value[0] is None and fonts is not None:
+            for attr in ['ascii', 'hAnsi']:
+                fonts.attrib.pop(word_tag(attr), None)
+        elif value and value[0] is not None:
+            if fonts is None:
+                rPr = normal.find('w:rPr', OOXML_NAMESPACES)
+                if rPr is None:
+                    rPr = lxml.etree.Element(word_tag('rPr'))
+                    pPr = normal.find('w:pPr', OOXML_NAMESPACES)
+                    if pPr is not None:
+                        pPr.addnext(rPr)
+                    else:
+                        normal.append(rPr)
+                fonts = lxml.etree.Element(word_tag('rFonts'))
+                rPr.insert(0, fonts)
+            for attr in ['ascii', 'hAnsi']:
+                fonts.set(word_tag(attr), value[0])
+        return fonts.get(word_tag('ascii')) if fonts is not None else None
+
+
 class TranslateDocx(TranslateBase):
     """ Translate text in a Word (.docx) document file """
-    def __init__(self, filepath, filename, translator, target=None, condense=False, cross_check=False):
+    def __init__(self, filepath, filename, translator, target=None, condense=False, cross_check=False, defer=False):
         super(TranslateDocx, self).__init__(filepath, filename, translator,
                                             target=target, condense=condense, cross_check=cross_check)
-        self.document = Document(os.path.join(self.filepath, self.source))
-        self.execute(self.translate)
+        from docx import Document
+        with self.timed('load'):
+            self.document = Document(os.path.join(self.filepath, self.source))
+        if not defer:
+            self.execute(self.translate)
 
-    def translate(self):
+    def extract(self):
         """ Break the document up into text elements for translation """
-        self.set_language(self.document)
         self.translate_paragraphs(self.document.paragraphs)
         for table in self.document.tables:
             for row in table.rows:
@@ -346,21 +1221,24 @@ class TranslateDocx(TranslateBase):
         #     # print(document.sections[section].footer)
         #     print(section._sectPr)
 
+    def save(self):
+        self.set_language(self.document)
         self.document.save(os.path.join(self.filepath, self.target))
 
 
 class TranslatePptx(TranslateBase):
     """ Translate text in a PowerPoint (.pptx) presentation file """
-    def __init__(self, filepath, filename, translator, target=None, condense=False, cross_check=False):
+    def __init__(self, filepath, filename, translator, target=None, condense=False, cross_check=False, defer=False):
         super(TranslatePptx, self).__init__(filepath, filename, translator,
                                             target=target, condense=condense, cross_check=cross_check)
-        self.prs = Presentation(os.path.join(self.filepath, self.source))
-        self.execute(self.translate)
-
-    def translate(self):
-        """ Perform the translation of each text element """
-        self.set_language(self.prs)
-
+        from pptx import Presentation
+        with self.timed('load'):
+            self.prs = Presentation(os.path.join(self.filepath, self.source))
+        if not defer:
+            self.execute(self.translate)
+
+    def extract(self):
+        """ Collect each text element for translation """
         for slide in self.prs.slides:
             for shape in slide.shapes:
                 if shape.has_text_frame:
@@ -373,10 +1251,13 @@ class TranslatePptx(TranslateBase):
 
                 # TODO: [future] add SmartArt text translation if/when supported by python-pptx
 
+    def save(self):
+        self.set_language(self.prs)
         self.prs.save(os.path.join(self.filepath, self.target))
 
     def break_runs(self, paragraph):
         if len(paragraph.runs) > 1:
+            from pptx.oxml import CT_TextLineBreak
             breaks = [isinstance(each, CT_TextLineBreak)
                       for each in paragraph._element.content_children]
             return [br for br in self.break_at_run(breaks)]
@@ -395,44 +1276,318 @@ class TranslateHtml(TranslateBase):
     # TODO: change lang attr e.g. <html class="no-js" lang="en-US">
     #  how does this appear in multi-language web sites so the browser can auto-select?
     """ Translate text in an HMTL (.html) file """
-    def __init__(self, filepath, filename, translator, target=None, condense=False, cross_check=False):
+    ignore_tags = ['html', 'head', 'meta', 'style', 'script']  # , 'a']
+
+    def __init__(self, filepath, filename, translator, target=None, condense=False, cross_check=False, defer=False):
         super(TranslateHtml, self).__init__(filepath, filename, translator,
                                             target=target, condense=condense, cross_check=cross_check)
-        self.web_page = lxml.html.parse(os.path.join(self.filepath, self.source)).getroot()
-        self.execute(self.translate)
-
-    def translate(self):
-        """ Translate method for html files to translate each element with text. """
+        import lxml.html
+        with self.timed('load'):
+            self.web_page = lxml.html.parse(os.path.join(self.filepath, self.source)).getroot()
+        if not defer:
+            self.execute(self.translate)
+
+    def extract(self):
+        """ Collect each element with text, or a tail, for translation. """
+        import lxml.html
         for attr in ['text', 'tail']:
             text = [
                 element for element in self.web_page.iter()
                 if not isinstance(element, lxml.html.HtmlComment)
-                if element.tag not in ['html', 'head', 'meta', 'style', 'script']  #, 'a']
+                if element.tag not in self.ignore_tags
                 if getattr(element, attr) is not None
                 if getattr(element, attr).strip()
             ]
             for element in text:
-                trimmed_text = PreserveWhitespace(getattr(element, attr))
-                setattr(element, attr, trimmed_text.replace(self.translator.translate(trimmed_text.body)))
+                self.collect(element, attr, multi_line=False, preserve_whitespace=True)
+
+    def save(self):
         with open(os.path.join(self.filepath, self.target), 'wb') as f:
             f.write(lxml.etree.tostring(self.web_page, method='html'))
-            pass
 
 
 class TranslateText(TranslateBase):
     """ Translate text in a plain text (e.g. .txt) file """
-    def __init__(self, filepath, filename, translator, target=None, condense=False, cross_check=False):
+    def __init__(self, filepath, filename, translator, target=None, condense=False, cross_check=False, defer=False):
         super(TranslateText, self).__init__(filepath, filename, translator,
                                             target=target, condense=condense, cross_check=cross_check)
-        with open(os.path.join(self.filepath, self.source), 'r') as f:
+        with self.timed('load'), open(os.path.join(self.filepath, self.source), 'r') as f:
             self.text = [line for line in f]
-        self.execute(self.translate)
+        if not defer:
+            self.execute(self.translate)
 
-    def translate(self):
-        """ Translate method for text files to translate each line of text. """
+    def extract(self):
+        """ Collect each line of text for translation. """
+        for i in range(len(self.text)):
+            self.collect(self.text, i, multi_line=False, preserve_whitespace=True)
+
+    def save(self):
         with open(os.path.join(self.filepath, self.target), 'w') as f:
-            for line in self.text:
-                trimmed_text = PreserveWhitespace(line)
-                f.write(trimmed_text.replace(self.translator.translate(trimmed_text.body)))
+            f.writelines(self.text)
+
+
+class StreamMixin(object):
+    """
+    Translate a document as it is read, for the TranslateXxxxStream classes, which implement stream().
+
+    stream(translators, targets) reads the source a window at a time and writes each window, translated by each
+    translator, to the matching target.  With several target languages the source is read only once.  With a
+    cross-check, each window is also translated back and written to a further target for each language, in the
+    same pass, rather than reading the output again afterwards.  The phases of a streamed document are
+    interleaved, so the metrics time the whole of it as a 'stream' phase.
+    """
+    reverse = ()
+
+    def translate(self):
+        self.stream_output([self.translator], [self.target])
+
+    def revise(self, previous, previous_targets=None):
+        # a window of the source cannot be aligned with the whole of a previous version
+        warnings.warn('A streamed document cannot be revised - translating %s in full' % self.source)
+
+    def estimate_cost(self):
+        """ Read the source a window at a time, as it would be translated, discarding the output. """
+        self.reverse = self.reverse_translators(self.translators)
+        outputs = len(self.translators) * (2 if self.cross_check else 1)
+        try:
+            self.stream(self.translators, [os.devnull] * outputs)
+        finally:
+            self.reverse = ()
+
+    def translate_languages(self):
+        """ Read the source once for all the languages and their cross-checks, then save the history of each. """
+        self.reverse = self.reverse_translators(self.translators)
+        checks = [self.cross_check_target(target, translator) for translator, target in
+                  zip(self.translators, self.targets) if self.cross_check]
+        try:
+            with history_saved_on_error([each for each in self.reverse if each is not None]):
+                self.stream_output(self.translators, self.targets + checks)
+            for translator in self.translators + [each for each in self.reverse if each is not None]:
+                self.translator = translator
+                self.finish_language()
+        finally:
+            self.reverse = ()
+
+    def stream_output(self, translators, targets):
+        """ Stream the document to the targets, timing it and counting the bytes written. """
+        with self.timed('stream'):
+            self.stream(translators, targets)
+        if self.metrics is not None:
+            for target in targets:
+                self.metrics.record_output(os.path.join(self.filepath, target))
+
+    def translate_window(self, executor, translators):
+        """
+        Translate the lines of the segments collected so far into each language concurrently, followed, for a
+        cross-check, by the translations back into the source language.
+        """
+        lines = self.source_lines()
+        reverse = self.reverse or [None] * len(translators)
+        translations = list(executor.map(lambda pair: self.translate_both_ways(lines, *pair),
+                                         zip(translators, reverse)))
+        return [translated for translated, _ in translations] + [
+            checked for _, checked in translations if checked is not None]
+
 
+class TranslateTextStream(StreamMixin, TranslateText):
+    """
+    Translate a plain text file of any size, holding only a window of lines in memory.
 
+    Each window of lines is read ahead, translated in bulk (so that full batches can be sent concurrently), and
+    written out in order before the next is read.  A cross-check is written in the same pass.
+    """
+    def __init__(self, filepath, filename, translator, target=None, condense=False, cross_check=False, defer=False,
+                 window=STREAM_WINDOW):
+        TranslateBase.__init__(self, filepath, filename, translator,
+                               target=target, condense=condense, cross_check=cross_check)
+        self.window = max(1, window)
+        self.text = []
+        if not defer:
+            self.execute(self.translate)
+
+    def stream(self, translators, targets):
+        outputs = [open(os.path.join(self.filepath, target), 'w') for target in targets]
+        try:
+            with open(os.path.join(self.filepath, self.source), 'r') as f, \
+                    ThreadPoolExecutor(max_workers=len(translators)) as executor:
+                for self.text in iter(lambda: list(itertools.islice(f, self.window)), []):
+                    self.segments = []
+                    self.extract()
+                    for translated, output in zip(self.translate_window(executor, translators), outputs):
+                        # every line is overwritten, so each language starts from the source window
+                        self.write_back(translated)
+                        output.writelines(self.text)
+        finally:
+            for output in outputs:
+                output.close()
+            self.text = []
+
+
+class TranslateHtmlStream(StreamMixin, TranslateHtml):
+    """
+    Translate a large HTML file as it is parsed, writing the output as it goes.
+
+    The children of an element, at any depth, are taken from the tree as soon as they (and their tails) have been
+    parsed, so only a window of segments, and the elements open around them, is held in memory - a page wrapped in
+    a single <div> or <table> streams as well as a flat one.  The text and tail of each element are collected in a
+    single pass, translated in bulk and written out in document order.
+    """
+    def __init__(self, filepath, filename, translator, target=None, condense=False, cross_check=False, defer=False,
+                 window=STREAM_WINDOW):
+        TranslateBase.__init__(self, filepath, filename, translator,
+                               target=target, condense=condense, cross_check=cross_check)
+        self.window = max(1, window)
+        self.pending = []
+        if not defer:
+            self.execute(self.translate)
+
+    def stream(self, translators, targets):
+        with contextlib.ExitStack() as stack:
+            executor = stack.enter_context(ThreadPoolExecutor(max_workers=len(translators)))
+            outputs = [(stack.enter_context(lxml.etree.htmlfile(os.path.join(self.filepath, target))), [])
+                       for target in targets]
+            # the elements whose opening tag has been queued but not their closing tag, outermost first
+            self.segments, self.pending, self.opened = [], [], []
+            for event, element in lxml.etree.iterparse(os.path.join(self.filepath, self.source),
+                                                       events=('start', 'end'), html=True):
+                parent = element.getparent()
+                if event == 'start':
+                    if parent is not None:
+                        # the earlier children of the parent are complete, tails included
+                        self.take_children(parent, keep=element)
+                elif parent is None:
+                    self.take_children(element)
+                    self.opened.pop()
+                    self.queue('close', element)
+                elif any(element is each for each in self.opened):
+                    # its close is queued when it is taken from its parent, once its tail has been parsed
+                    self.take_children(element)
+
+                if len(self.segments) >= self.window:
+                    self.write_window(executor, translators, outputs)
+            self.write_window(executor, translators, outputs)
+        self.opened = []
+
+    def take_children(self, container, keep=None):
+        """ Queue the opening of a container, and its children up to `keep`, taking them out of the tree. """
+        if not any(container is each for each in self.opened):
+            self.opened.append(container)
+            self.queue('open', container)
+        for child in list(container):
+            if child is keep:
+                break
+            container.remove(child)
+            if child is self.opened[-1]:
+                self.opened.pop()
+                self.queue('close', child)
+            else:
+                self.queue('element', child)
+
+    def queue(self, kind, element):
+        """ Hold an element to be written, collecting its text for translation. """
+        self.pending.append((kind, element))
+        if kind == 'open':
+            items = [(element, 'text')]
+        elif kind == 'close':
+            items = [(element, 'tail')]
+        else:
+            items = [(each, attr) for each in element.iter() for attr in ['text', 'tail']]
+        for each, attr in items:
+            text = getattr(each, attr)
+            if isinstance(each.tag, str) and each.tag not in self.ignore_tags and text and text.strip():
+                self.collect(each, attr, multi_line=False, preserve_whitespace=True)
+
+    def write_window(self, executor, translators, outputs):
+        """ Translate the segments held, and write the elements held to every output, in order. """
+        if self.segments:
+            translations = self.translate_window(executor, translators)
+        else:
+            translations = [[] for _ in outputs]
+        for translated, (xf, contexts) in zip(translations, outputs):
+            # every segment is overwritten, so each language starts from the source text
+            self.write_back(translated)
+            for kind, element in self.pending:
+                if kind == 'open':
+                    contexts.append(xf.element(element.tag, dict(element.attrib)))
+                    contexts[-1].__enter__()
+                    if element.text:
+                        xf.write(element.text)
+                elif kind == 'close':
+                    contexts.pop().__exit__(None, None, None)
+                    if element.tail:
+                        xf.write(element.tail)
+                else:
+                    xf.write(element)
+        self.segments, self.pending = [], []
+
+
+class TranslateExcelStream(StreamMixin, TranslateExcel):
+    """
+    Translate a very large Excel (.xlsx) spreadsheet file a window of rows at a time.
+
+    The workbook is read in openpyxl's read-only mode, which parses rows lazily, and written in write-only mode,
+    which serializes rows as they are appended, so only a window of rows (and of the strings in them) is held in
+    memory.  Cell values and styles are copied, but a write-only workbook cannot keep merged cells, column widths,
+    images or comments.
+    """
+    def __init__(self, filepath, filename, translator, target=None, condense=False, cross_check=False, defer=False,
+                 window=STREAM_WINDOW):
+        TranslateBase.__init__(self, filepath, filename, translator,
+                               target=target, condense=condense, cross_check=cross_check)
+        self.window = max(1, window)
+        self.rows = []
+        if not defer:
+            self.execute(self.translate)
+
+    def stream(self, translators, targets):
+        from openpyxl import Workbook, load_workbook
+        source = load_workbook(os.path.join(self.filepath, self.source), read_only=True)
+        outputs = [Workbook(write_only=True) for _ in targets]
+        try:
+            with ThreadPoolExecutor(max_workers=len(translators)) as executor:
+                for worksheet in source.worksheets:
+                    sheets = [output.create_sheet(worksheet.title) for output in outputs]
+                    self.segments, self.rows = [], []
+                    # start from A1, as a read-only sheet otherwise starts at the first cell in use
+                    for row in worksheet.iter_rows(min_row=1, min_col=1):
+                        values = [cell.value for cell in row]
+                        for i, cell in enumerate(row):
+                            if cell.value and cell.data_type == 's':
+                                self.collect(values, i)
+                        self.rows.append((row, values))
+                        # rows of numbers hold no segments, but still count towards the window
+                        if len(self.segments) >= self.window or len(self.rows) >= self.window:
+                            self.write_window(executor, translators, sheets)
+                    self.write_window(executor, translators, sheets)
+            for output, target in zip(outputs, targets):
+                output.save(os.path.join(self.filepath, target))
+        finally:
+            if hasattr(source, 'close'):
+                # a read-only workbook keeps its file open until it is closed
+                source.close()
+            self.rows = []
+
+    def write_window(self, executor, translators, sheets):
+        """ Translate the string cells of the rows held, and append the rows to the sheet for each language. """
+        if self.segments:
+            translations = self.translate_window(executor, translators)
+        else:
+            translations = [[] for _ in sheets]
+        for translated, sheet in zip(translations, sheets):
+            # every string cell is overwritten, so each language starts from the source values
+            self.write_back(translated)
+            for row, values in self.rows:
+                sheet.append([self.copy_cell(sheet, cell, value) for cell, value in zip(row, values)])
+        self.segments, self.rows = [], []
+
+    @staticmethod
+    def copy_cell(sheet, cell, value):
+        """ Carry the style of a read-only cell across to the new sheet, along with its (translated) value. """
+        if not getattr(cell, 'has_style', False):
+            return value
+        from openpyxl.cell import WriteOnlyCell
+        new_cell = WriteOnlyCell(sheet, value)
+        for style in ['font', 'fill', 'border', 'alignment', 'protection']:
+            setattr(new_cell, style, copy.copy(getattr(cell, style)))
+        new_cell.number_format = cell.number_format
+        return new_cell
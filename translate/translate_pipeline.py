@@ -0,0 +1,168 @@
+# coding: UTF-8
+import inspect
+import multiprocessing
+import os
+import queue
+import threading
+import traceback
+import warnings
+
+from translate.metrics import Metrics
+
+QUEUE_SIZE = 4  # documents waiting for the network stage, per worker process
+
+
+class TranslationChannel(object):
+    """ The connection from a worker process to the translators in the main process. """
+    def __init__(self, worker_id, requests, replies):
+        self.worker_id = worker_id
+        self.requests = requests
+        self.replies = replies
+        self.lock = threading.Lock()
+
+    def translate(self, job_id, index, source_lang, target_lang, strings):
+        # the translators of a multi-language document are called from several threads, but share one reply queue
+        with self.lock:
+            self.requests.put(('translate', self.worker_id, job_id, (index, source_lang, target_lang, strings)))
+            return self.replies.get()
+
+
+class TranslationProxy(object):
+    """
+    Stand in for a GoogleTranslate in a worker process, passing the text to be translated to the main process.
+
+    The history and stats are kept by the translator in the main process, so those methods do nothing here.  The
+    phases of the document are timed by `metrics`, which is sent back to the main process with the result.
+    """
+    def __init__(self, channel, job_id, index, target_lang, source_lang=None, metrics=None):
+        self.channel = channel
+        self.job_id = job_id
+        self.index = index
+        self.target_lang = target_lang
+        self.source_lang = source_lang
+        self.history = None
+        self.memory = None
+        self.metrics = metrics
+
+    def translate_many(self, strings):
+        return self.channel.translate(self.job_id, self.index, self.source_lang, self.target_lang, list(strings))
+
+    def reverse_translator(self):
+        # the main process picks the translator for the reverse language pair when the strings arrive
+        return TranslationProxy(self.channel, self.job_id, self.index, self.source_lang, self.target_lang,
+                                self.metrics)
+
+    def prepare_translation(self):
+        pass
+
+    def save_history(self):
+        pass
+
+    def update_stats(self):
+        pass
+
+
+def run_worker(worker_id, jobs, requests, replies, languages, kwargs):
+    """ Load, translate and save each document taken from the job queue, until None is received. """
+    channel = TranslationChannel(worker_id, requests, replies)
+    for job_id, translate_class, filepath, filename in iter(jobs.get, None):
+        metrics = Metrics()
+        translators = [TranslationProxy(channel, job_id, i, target_lang, source_lang, metrics)
+                       for i, (target_lang, source_lang) in enumerate(languages)]
+        try:
+            document = translate_class(filepath, filename, translators if len(translators) > 1 else translators[0],
+                                       defer=True, **kwargs)
+            document.execute(document.translate)
+        except Exception:
+            requests.put(('failed', worker_id, job_id, traceback.format_exc()))
+        else:
+            requests.put(('saved', worker_id, job_id, (document.targets, metrics.as_dict(latencies=True))))
+
+
+class TranslatePipeline(object):
+    """
+    Translate many documents with the parsing, translation and saving of successive documents overlapped.
+
+    A pool of worker processes loads each document, extracts its segments and, once they have been translated,
+    writes them back and saves the output.  The translation itself is done in this process, where the translators
+    keep their dictionary, history and stats for the whole run, so a string repeated across the documents is still
+    only requested once.  While one document is being translated the workers go on parsing and saving others, and
+    the queue between the stages is bounded so that the workers wait rather than parse far ahead of the network.
+
+    `files` is a list of (translate_class, filepath, filename), and kwargs are passed to each translate_class.
+    """
+    def __init__(self, files, translator, processes=None, queue_size=QUEUE_SIZE, **kwargs):
+        self.files = list(files)
+        self.translators = list(translator) if isinstance(translator, (list, tuple)) else [translator]
+        self.processes = max(1, min(processes or os.cpu_count() or 1, len(self.files) or 1))
+        self.queue_size = max(1, queue_size) * self.processes
+        self.kwargs = kwargs
+        self.reverse = {}
+        self.targets = {}
+        self.failed = {}
+
+    def execute(self):
+        context = multiprocessing.get_context()
+        jobs = context.Queue()
+        requests = context.Queue(maxsize=self.queue_size)
+        replies = [context.Queue() for _ in range(self.processes)]
+        for job_id, file in enumerate(self.files):
+            jobs.put((job_id,) + tuple(file))
+        for _ in range(self.processes):
+            jobs.put(None)
+
+        languages = [(translator.target_lang, translator.source_lang) for translator in self.translators]
+        workers = [context.Process(target=run_worker, args=(i, jobs, requests, replies[i], languages, self.kwargs))
+                   for i in range(self.processes)]
+        for worker in workers:
+            worker.start()
+
+        try:
+            pending = len(self.files)
+            while pending:
+                try:
+                    kind, worker_id, job_id, payload = requests.get(timeout=1)
+                except queue.Empty:
+                    if not any(worker.is_alive() for worker in workers):
+                        warnings.warn('The worker processes stopped with %d documents unfinished' % pending)
+                        break
+                    continue
+
+                if kind == 'translate':
+                    replies[worker_id].put(self.translate(*payload))
+                else:
+                    pending -= 1
+                    if kind == 'saved':
+                        self.targets[job_id], metrics = payload
+                        if getattr(self.translators[0], 'metrics', None) is not None:
+                            # the time each worker spent loading, extracting, writing back and saving
+                            self.translators[0].metrics.merge(metrics)
+                    else:
+                        self.failed[job_id] = payload
+                        warnings.warn('Unable to translate %s:\n%s' % (self.files[job_id][2], payload))
+        finally:
+            for worker in workers:
+                worker.join(timeout=1)
+                if worker.is_alive():
+                    worker.terminate()
+            # the translations received so far are kept even if the run stops with an error
+            for translator in self.translators + list(self.reverse.values()):
+                translator.save_history()
+
+        for translator in self.translators + list(self.reverse.values()):
+            translator.update_stats()
+
+    def translate(self, index, source_lang, target_lang, strings):
+        translator = self.translators[index]
+        if (source_lang, target_lang) != (translator.source_lang, translator.target_lang):
+            translator = self.reverse_translator(index)
+        translations = translator.translate_many(strings)
+        if inspect.isawaitable(translations):
+            translations = translator.run(translations)
+        return translations
+
+    def reverse_translator(self, index):
+        """ A translator from the target language back to the source, for the cross-check. """
+        if index not in self.reverse:
+            self.reverse[index] = self.translators[index].reverse_translator()
+        return self.reverse[index]
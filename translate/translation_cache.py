@@ -0,0 +1,120 @@
+# coding: UTF-8
+import hashlib
+import sys
+from collections import OrderedDict
+
+
+ENTRY_BYTES = 100  # approximate cost of an entry in an OrderedDict, its node and the key's hash slot
+DIGEST_SIZE = 16  # bytes of BLAKE2b digest used as the key, when the sources need not be kept
+LOW_WATER = 0.75  # an overflowing cache is trimmed to this fraction of its budget, so spills come in batches
+
+
+def digest(segment):
+    return hashlib.blake2b(segment.encode('utf-8'), digest_size=DIGEST_SIZE).digest()
+
+
+class TranslationCache(object):
+    """
+    A dictionary of translations held within a budget of `max_bytes`, evicting the least recently used.
+
+    The evicted (segment, translation) pairs are passed to `spill`, if given.  Each distinct translation is held
+    once, however many segments it is the translation of.  With `digest_keys`, a segment is held only as a 16-byte
+    digest, for when its translation is also kept in a TranslationMemory, as GoogleTranslate requires: the cache
+    can then be looked up, but not listed, and nothing needs to be spilled.
+
+    The usage is estimated from the sizes of the strings, so it is a guide to the memory used rather than exact.
+    The cache is not locked: GoogleTranslate only uses it while holding its own lock.
+    """
+    def __init__(self, max_bytes, spill=None, digest_keys=False, items=()):
+        self.max_bytes = max(0, max_bytes)
+        self.spill = spill
+        self.digest_keys = digest_keys
+        self.entries = OrderedDict()
+        self.values = {}  # translation -> [the translation held, number of entries referring to it]
+        self.bytes = 0
+        self.evictions = 0
+        # the history that a cache starts with is already saved, so any of it that does not fit is not spilled
+        self.update(items, spill=False)
+
+    def key(self, segment):
+        return digest(segment) if self.digest_keys else segment
+
+    def __contains__(self, segment):
+        return self.key(segment) in self.entries
+
+    def __getitem__(self, segment):
+        key = self.key(segment)
+        translation = self.entries[key]
+        self.entries.move_to_end(key)
+        return translation
+
+    def get(self, segment, default=None):
+        try:
+            return self[segment]
+        except KeyError:
+            return default
+
+    def __setitem__(self, segment, translation):
+        self.update([(segment, translation)])
+
+    def update(self, items, spill=True):
+        """ Add (segment, translation) pairs, or a dictionary, then evict whatever is over the budget. """
+        if hasattr(items, 'items'):
+            items = items.items()
+        for segment, translation in items:
+            key = self.key(segment)
+            if key in self.entries:
+                self.discard(key)
+            self.entries[key] = self.intern(translation)
+            self.bytes += ENTRY_BYTES + sys.getsizeof(key)
+        if self.bytes > self.max_bytes:
+            self.evict(spill)
+
+    def pop(self, segment, default=None):
+        key = self.key(segment)
+        if key not in self.entries:
+            return default
+        translation = self.entries[key]
+        self.discard(key)
+        return translation
+
+    def intern(self, translation):
+        """ The one copy of a translation held, counting the entries that refer to it. """
+        held = self.values.get(translation)
+        if held is None:
+            held = self.values[translation] = [translation, 0]
+            self.bytes += ENTRY_BYTES + sys.getsizeof(translation)
+        held[1] += 1
+        return held[0]
+
+    def discard(self, key):
+        """ Remove an entry, and the translation held for it if no other entry refers to it. """
+        translation = self.entries.pop(key)
+        self.bytes -= ENTRY_BYTES + sys.getsizeof(key)
+        held = self.values[translation]
+        held[1] -= 1
+        if not held[1]:
+            del self.values[translation]
+            self.bytes -= ENTRY_BYTES + sys.getsizeof(translation)
+
+    def evict(self, spill=True):
+        """ Remove the least recently used entries, keeping the newest, until the cache is below its low water mark. """
+        evicted = []
+        while self.bytes > self.max_bytes * LOW_WATER and len(self.entries) > 1:
+            key = next(iter(self.entries))
+            evicted.append((key, self.entries[key]))
+            self.discard(key)
+        self.evictions += len(evicted)
+        if evicted and spill and self.spill is not None and not self.digest_keys:
+            self.spill(evicted)
+
+    def __len__(self):
+        return len(self.entries)
+
+    def __iter__(self):
+        if self.digest_keys:
+            raise TypeError('the segments of a cache with digest keys are not kept')
+        return iter(self.entries)
+
+    def items(self):
+        return [(segment, self.entries[segment]) for segment in self]
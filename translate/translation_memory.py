@@ -0,0 +1,89 @@
+# coding: UTF-8
+import json
+import sqlite3
+import threading
+
+
+MEMORY_EXTENSIONS = ('.db', '.sqlite', '.sqlite3')
+QUERY_LIMIT = 500  # number of segments looked up per SELECT, well below SQLite's limit on host parameters
+
+
+def is_memory_file(filename):
+    """ A history file with one of the MEMORY_EXTENSIONS is a translation memory rather than a JSON file. """
+    return bool(filename) and filename.lower().endswith(MEMORY_EXTENSIONS)
+
+
+def language_history(history, lang):
+    """ A JSON history file holds one language pair, so each target language needs its own. """
+    if not history or is_memory_file(history):
+        return history
+    body, dot, extn = history.rpartition('.')
+    return '%s_%s.%s' % (body, lang, extn) if dot else '%s_%s' % (history, lang)
+
+
+class TranslationMemory(object):
+    """
+    Store translations in an SQLite database, keyed by (source_lang, target_lang, segment).
+
+    Lookups use the primary key index, so only the segments in a document are read rather than the whole history,
+    and each batch of translations is committed as soon as it arrives.  The database uses write-ahead logging and
+    waits up to `timeout` seconds for a lock, so several processes can share one file.
+    """
+    def __init__(self, filename, source_lang, target_lang, timeout=30):
+        self.filename = filename
+        self.source_lang = source_lang or ''
+        self.target_lang = target_lang
+        self.lock = threading.Lock()
+        self.connection = sqlite3.connect(filename, timeout=timeout, check_same_thread=False)
+        with self.lock, self.connection:
+            self.connection.execute('PRAGMA journal_mode=WAL')
+            self.connection.execute(
+                'CREATE TABLE IF NOT EXISTS segments ('
+                'source_lang TEXT NOT NULL, target_lang TEXT NOT NULL, segment TEXT NOT NULL, '
+                'translation TEXT NOT NULL, PRIMARY KEY (source_lang, target_lang, segment)) WITHOUT ROWID'
+            )
+
+    def get(self, segment):
+        return self.get_many([segment]).get(segment)
+
+    def get_many(self, segments):
+        """ Look up a collection of segments, returning a dictionary of those that have been translated before. """
+        segments = list(segments)
+        found = {}
+        with self.lock:
+            for i in range(0, len(segments), QUERY_LIMIT):
+                chunk = segments[i:i + QUERY_LIMIT]
+                found.update(self.connection.execute(
+                    'SELECT segment, translation FROM segments WHERE source_lang = ? AND target_lang = ? '
+                    'AND segment IN (%s)' % ', '.join('?' * len(chunk)),
+                    [self.source_lang, self.target_lang] + chunk,
+                ))
+        return found
+
+    def update(self, translations):
+        """ Add (segment, translation) pairs, or a dictionary, and commit them. """
+        if isinstance(translations, dict):
+            translations = translations.items()
+        with self.lock, self.connection:
+            self.connection.executemany(
+                'INSERT OR REPLACE INTO segments (source_lang, target_lang, segment, translation) VALUES (?, ?, ?, ?)',
+                ((self.source_lang, self.target_lang, segment, translation) for (segment, translation) in translations)
+            )
+
+    def import_json(self, json_file):
+        """ One-time import of a JSON history file, as saved with -r/--reuse, for this language pair. """
+        with open(json_file, 'r') as f:
+            history = json.load(f)
+        self.update(history)
+        return len(history)
+
+    def __len__(self):
+        with self.lock:
+            return self.connection.execute(
+                'SELECT COUNT(*) FROM segments WHERE source_lang = ? AND target_lang = ?',
+                (self.source_lang, self.target_lang)
+            ).fetchone()[0]
+
+    def close(self):
+        with self.lock:
+            self.connection.close()